@@ -1,12 +1,17 @@
 """
 Chat API routes for AI Tutor chatbot
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
 from uuid import UUID
+import base64
+import json
+import time
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.schemas.chat import (
     ChatConversationCreate,
     ChatConversationOut,
@@ -17,7 +22,16 @@ from app.schemas.chat import (
     ChatMessageOut
 )
 from app.crud import chat as chat_crud
-from app.services.chatbot import get_chatbot_response, validate_message_content
+from app.services.chatbot import (
+    get_chatbot_response,
+    lookup_first_answer,
+    prepare_chatbot_request,
+    stream_chatbot_response,
+    validate_message_content,
+    CHATBOT_DISABLED_MESSAGE
+)
+from app.services.chat_summary import load_chat_history, refresh_conversation_summary
+from app.services.chat_answer_cache import store_answer
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -32,38 +46,62 @@ def create_conversation(
     return conversation
 
 
+PREVIEW_LENGTH = 60
+
+
+def _encode_cursor(conversation) -> str:
+    """Opaque keyset cursor for the conversation after which the next page starts"""
+    raw = f"{conversation.updated_at.isoformat()}|{conversation.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        updated_at, conversation_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(updated_at), UUID(conversation_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/conversations", response_model=List[ChatConversationOut])
 def list_conversations(
+    response: Response,
     student_id: str = Query(..., description="Student ID"),
     module_id: UUID = Query(..., description="Module ID"),
+    limit: int = Query(50, ge=1, le=100, description="Conversations per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db)
 ):
-    """Get all conversations for a student in a module"""
-    conversations = chat_crud.get_conversations_by_student_module(
-        db, student_id, module_id
+    """
+    Get a student's conversations in a module, most recently active first
+
+    When there are more, the X-Next-Cursor response header holds the cursor for the next page.
+    """
+    before = _decode_cursor(cursor) if cursor else None
+    rows = chat_crud.list_conversations_with_stats(
+        db, student_id, module_id, limit=limit + 1, before=before, preview_length=PREVIEW_LENGTH
     )
 
-    # Add metadata
-    result = []
-    for conv in conversations:
-        conv_dict = {
-            "id": conv.id,
-            "student_id": conv.student_id,
-            "module_id": conv.module_id,
-            "title": conv.title,
-            "created_at": conv.created_at,
-            "updated_at": conv.updated_at,
-            "message_count": chat_crud.get_message_count(db, conv.id),
-            "last_message_preview": None
-        }
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1][0])
 
-        # Get last message preview
-        last_msg = chat_crud.get_last_message(db, conv.id)
-        if last_msg:
-            preview = last_msg.content[:60] + "..." if len(last_msg.content) > 60 else last_msg.content
-            conv_dict["last_message_preview"] = preview
+    result = []
+    for conv, message_count, last_message in rows:
+        preview = None
+        if last_message:
+            preview = last_message[:PREVIEW_LENGTH] + "..." if len(last_message) > PREVIEW_LENGTH else last_message
 
-        result.append(ChatConversationOut(**conv_dict))
+        result.append(ChatConversationOut(
+            id=conv.id,
+            student_id=conv.student_id,
+            module_id=conv.module_id,
+            title=conv.title,
+            created_at=conv.created_at,
+            updated_at=conv.updated_at,
+            message_count=message_count,
+            last_message_preview=preview
+        ))
 
     return result
 
@@ -95,6 +133,7 @@ def get_conversation(
 def send_message(
     conversation_id: UUID,
     request: SendMessageRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Send a message and get AI response"""
@@ -116,8 +155,8 @@ def send_message(
     )
     student_message = chat_crud.create_message(db, student_msg_data)
 
-    # Get conversation history
-    history = chat_crud.get_conversation_messages(db, conversation_id)
+    # Get conversation summary and the messages after it (excluding the one we just added)
+    summary, history = load_chat_history(db, conversation, exclude_latest=1)
 
     # Generate AI response
     try:
@@ -125,8 +164,9 @@ def send_message(
             db=db,
             module_id=str(conversation.module_id),
             student_question=request.message,
-            conversation_history=history[:-1],  # Exclude the message we just added
-            student_id=conversation.student_id
+            conversation_history=history,
+            student_id=conversation.student_id,
+            conversation_summary=summary
         )
 
         # Save AI response
@@ -134,9 +174,11 @@ def send_message(
             conversation_id=conversation_id,
             role="assistant",
             content=ai_result['response'],
-            context_used=ai_result.get('context_used')
+            context_used=ai_result.get('context_used'),
+            prompt_tokens=ai_result.get('prompt_tokens')
         )
         assistant_message = chat_crud.create_message(db, assistant_msg_data)
+        background_tasks.add_task(refresh_conversation_summary, conversation_id)
 
         return SendMessageResponse(
             student_message=ChatMessageOut.from_orm(student_message),
@@ -162,6 +204,151 @@ def send_message(
         )
 
 
+CHAT_ERROR_MESSAGE = "I'm sorry, I encountered an error. Please try again or contact your instructor."
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _save_assistant_message(
+    conversation_id: UUID,
+    content: str,
+    context_used: Optional[Dict[str, Any]],
+    prompt_tokens: Optional[int] = None
+) -> Dict[str, Any]:
+    """Persist the assembled assistant reply with a short-lived session (the request's is gone by then)"""
+    db = SessionLocal()
+    try:
+        message = chat_crud.create_message(db, ChatMessageCreate(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=content,
+            context_used=context_used,
+            prompt_tokens=prompt_tokens
+        ))
+        return ChatMessageOut.from_orm(message).model_dump(mode="json")
+    finally:
+        db.close()
+
+
+@router.post("/conversations/{conversation_id}/message/stream")
+def send_message_stream(
+    conversation_id: UUID,
+    request: SendMessageRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Send a message and stream the AI response as Server-Sent Events
+
+    Events:
+        start - {"student_message": {...}, "context_used": {...}} (RAG sources, before the first token)
+        token - {"delta": "..."}
+        done  - {"assistant_message": {...}} once the full reply is saved
+        error - {"message": "...", "assistant_message": {...}} (the saved apology)
+
+    Older turns are folded into the conversation summary afterwards. A first
+    question answered from the module's answer cache arrives as a single token.
+    """
+    # Validate conversation exists
+    conversation = chat_crud.get_conversation(db, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # Validate message content
+    if not validate_message_content(request.message):
+        raise HTTPException(status_code=400, detail="Invalid message content")
+
+    # Save student message
+    student_message = chat_crud.create_message(db, ChatMessageCreate(
+        conversation_id=conversation_id,
+        role="student",
+        content=request.message,
+        context_used=None
+    ))
+    student_message_out = ChatMessageOut.from_orm(student_message).model_dump(mode="json")
+
+    # Build the prompt (RAG retrieval) before streaming starts
+    summary, history = load_chat_history(db, conversation, exclude_latest=1)
+    cache_lookup = lookup_first_answer(db, str(conversation.module_id), request.message, history, summary)
+    cached_answer = cache_lookup if cache_lookup and cache_lookup['hit'] else None
+    started = time.monotonic()
+    try:
+        chat_request = None if cached_answer else prepare_chatbot_request(
+            db=db,
+            module_id=str(conversation.module_id),
+            student_question=request.message,
+            conversation_history=history,
+            conversation_summary=summary
+        )
+        prepare_error = None
+    except Exception as e:
+        print(f"❌ Error preparing AI response: {str(e)}")
+        chat_request, prepare_error = None, e
+
+    # No DB connection is held while tokens stream
+    db.close()
+
+    if cached_answer:
+        context_used = cached_answer['context_used']
+    else:
+        context_used = chat_request['context_used'] if chat_request else None
+    prompt_tokens = chat_request['prompt_tokens'] if chat_request else None
+
+    def event_stream():
+        parts: List[str] = []
+        saved = False
+        try:
+            yield _sse("start", {"student_message": student_message_out, "context_used": context_used})
+
+            error = prepare_error
+            if error is None:
+                if cached_answer:
+                    deltas = iter([cached_answer['response']])
+                elif chat_request:
+                    deltas = stream_chatbot_response(chat_request)
+                else:
+                    deltas = iter([CHATBOT_DISABLED_MESSAGE])
+                try:
+                    for delta in deltas:
+                        parts.append(delta)
+                        yield _sse("token", {"delta": delta})
+                except Exception as e:
+                    print(f"❌ Error streaming AI response: {str(e)}")
+                    error = e
+
+            if error is None:
+                assistant_message = _save_assistant_message(conversation_id, "".join(parts), context_used, prompt_tokens)
+                saved = True
+                yield _sse("done", {"assistant_message": assistant_message})
+                if cache_lookup and chat_request:
+                    store_answer(cache_lookup, "".join(parts), context_used, int((time.monotonic() - started) * 1000))
+            else:
+                assistant_message = _save_assistant_message(conversation_id, CHAT_ERROR_MESSAGE, None)
+                saved = True
+                yield _sse("error", {"message": CHAT_ERROR_MESSAGE, "assistant_message": assistant_message})
+
+        except GeneratorExit:
+            # Client disconnected mid-answer: keep what it already received
+            if parts and not saved:
+                _save_assistant_message(conversation_id, "".join(parts), context_used, prompt_tokens)
+            raise
+
+    # Runs once the stream has finished
+    background_tasks.add_task(refresh_conversation_summary, conversation_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Don't let proxies buffer the stream
+        }
+    )
+
+
 @router.delete("/conversations/{conversation_id}")
 def delete_conversation(
     conversation_id: UUID,
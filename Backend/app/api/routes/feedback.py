@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from uuid import UUID
 import logging
@@ -69,6 +69,7 @@ def get_ai_feedback_by_id(
 
         # Status tracking (NEW)
         "generation_status": feedback.generation_status,
+        "generation_stage": feedback.generation_stage,
         "generation_progress": feedback.generation_progress,
         "error_message": feedback.error_message,
         "error_type": feedback.error_type,
@@ -109,6 +110,7 @@ def get_feedback_status_by_answer(
 
     return {
         "status": feedback.generation_status,
+        "stage": feedback.generation_stage,
         "progress": feedback.generation_progress,
         "error_message": feedback.error_message,
         "error_type": feedback.error_type,
@@ -126,7 +128,15 @@ def get_feedback_status_by_answer(
             "explanation": feedback.feedback_data.get("explanation") if feedback.feedback_data else None,
             "score": feedback.score,
             "is_correct": feedback.is_correct
-        } if feedback.generation_status == 'completed' and feedback.feedback_data else None
+        } if feedback.generation_status == 'completed' and feedback.feedback_data else None,
+
+        # Algorithmic grade, available before the narrative for objective questions
+        "grade": {
+            "is_correct": feedback.is_correct,
+            "score": feedback.score,
+            "points_earned": feedback.points_earned,
+            "points_possible": feedback.points_possible
+        } if feedback.generation_stage in ('graded', 'final') and feedback.points_earned is not None else None
     }
 
 
@@ -237,7 +247,6 @@ def retry_feedback_generation(
 @router.post("/retry/module/{module_id}")
 def retry_all_failed_feedback(
     module_id: UUID,
-    background_tasks: BackgroundTasks,
     student_id: str = Query(..., description="Student ID"),
     attempt: int = Query(1, description="Attempt number", ge=1),
     db: Session = Depends(get_db)
@@ -317,7 +326,7 @@ def retry_all_failed_feedback(
 
         if not feedback:
             logger.info(f"📝 Including answer {answer.id} - no feedback exists, creating pending record")
-            # Create pending feedback record so background task can work properly
+            # Create pending feedback record so the feedback job can work properly
             from app.crud.ai_feedback import create_pending_feedback
             create_pending_feedback(db=db, answer_id=answer.id, timeout_seconds=120)
             failed_answer_ids.append(str(answer.id))
@@ -393,20 +402,12 @@ def retry_all_failed_feedback(
     logger.info(f"🚀 ============ RETRYING {len(failed_answer_ids)} FAILED QUESTIONS ============")
     logger.info(f"🚀 Answer IDs to retry: {failed_answer_ids}")
 
-    # Import and run the same background task used for initial submission
-    from app.api.routes.student import generate_feedback_background
+    # Queue the same jobs used for initial submission (retries run first)
+    from app.services.feedback_worker import enqueue_answer_feedback
 
-    # Add to FastAPI background tasks
-    logger.info(f"🎯 Adding background task: generate_feedback_background(student={student_id}, module={module_id}, attempt={attempt}, answer_ids={len(failed_answer_ids)} items)")
-    background_tasks.add_task(
-        generate_feedback_background,
-        student_id=student_id,
-        module_id=str(module_id),
-        attempt=attempt,
-        answer_ids=failed_answer_ids
-    )
+    enqueue_answer_feedback(db, student_id, module_id, attempt, failed_answer_ids, priority=50)
 
-    logger.info(f"✅ Background task added successfully! Feedback generation will start shortly for {len(failed_answer_ids)} questions")
+    logger.info(f"✅ Feedback jobs queued! Feedback generation will start shortly for {len(failed_answer_ids)} questions")
 
     return {
         "success": True,
@@ -15,6 +15,7 @@ from app.crud.module import (
     get_all_modules
 )
 from app.services.module import delete_module_with_documents
+from app.services.chat_answer_cache import invalidate_module_answers, get_module_answer_cache_stats
 from app.services.rubric import (
     get_module_rubric,
     update_module_rubric,
@@ -460,9 +461,27 @@ def update_chatbot_instructions(
     db.commit()
     db.refresh(module)
 
+    # Cached tutor answers were written under the old instructions
+    invalidate_module_answers(db, module_id)
+
     return {
         "success": True,
         "message": "Chatbot instructions updated successfully",
         "module_id": str(module_id),
         "chatbot_instructions": module.chatbot_instructions
-    }
\ No newline at end of file
+    }
+# 🤖 Tutor answer cache stats for a module
+@router.get("/modules/{module_id}/chatbot-cache-stats")
+def get_chatbot_cache_stats(
+    module_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """
+    Hit rate and saved latency of the module's tutor answer cache
+    (stored entries and lifetime hits, plus this instance's counters)
+    """
+    module = get_module_by_id(db, module_id)
+    if not module:
+        raise HTTPException(status_code=404, detail="Module not found")
+
+    return get_module_answer_cache_stats(db, str(module_id))
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path, UploadFile, File, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, UploadFile, File, Body, BackgroundTasks
 from sqlalchemy.orm import Session
 from app.schemas.question import (
     QuestionCreate, QuestionUpdate, QuestionOut,
@@ -228,13 +228,20 @@ def delete_question_image(question_id: UUID, db: Session = Depends(get_db)):
 
 # ✅ Approve a single question (change status from unreviewed to active)
 @router.put("/questions/{question_id}/approve", response_model=QuestionOut)
-def approve_question_api(question_id: UUID, db: Session = Depends(get_db)):
+def approve_question_api(
+    question_id: UUID,
+    background_tasks: BackgroundTasks,
+    warm_feedback: bool = Query(False, description="Pre-generate MCQ feedback for every option"),
+    db: Session = Depends(get_db)
+):
     """
     Approve a question by changing its status from 'unreviewed' to 'active'.
     This makes the question visible to students.
 
     Args:
         question_id: UUID of the question to approve
+        warm_feedback: If true, pre-generate feedback for every option of an
+            mcq / mcq_multiple question in the background
         db: Database session
 
     Returns:
@@ -247,13 +254,20 @@ def approve_question_api(question_id: UUID, db: Session = Depends(get_db)):
     approved_question = approve_question(db, question_id)
     if not approved_question:
         raise HTTPException(status_code=404, detail="Question not found")
+
+    if warm_feedback:
+        from app.services.feedback_warmup import warm_question_feedback
+        background_tasks.add_task(warm_question_feedback, [str(question_id)])
+
     return approved_question
 
 
 # ✅ Bulk approve multiple questions
 @router.post("/questions/bulk-approve", response_model=BulkApproveResponse)
 def bulk_approve_questions_api(
+    background_tasks: BackgroundTasks,
     request: BulkApproveRequest = Body(...),
+    warm_feedback: bool = Query(False, description="Pre-generate MCQ feedback for every option"),
     db: Session = Depends(get_db)
 ):
     """
@@ -262,6 +276,8 @@ def bulk_approve_questions_api(
 
     Args:
         request: BulkApproveRequest with list of question IDs
+        warm_feedback: If true, pre-generate feedback for every option of the
+            approved mcq / mcq_multiple questions in the background
         db: Database session
 
     Returns:
@@ -273,6 +289,10 @@ def bulk_approve_questions_api(
     """
     result = bulk_approve_questions(db, request.question_ids)
 
+    if warm_feedback and result["approved_count"] > 0:
+        from app.services.feedback_warmup import warm_question_feedback
+        background_tasks.add_task(warm_question_feedback, [str(qid) for qid in request.question_ids])
+
     return BulkApproveResponse(
         approved_count=result["approved_count"],
         failed_count=result["failed_count"],
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
 from typing import List
@@ -27,187 +28,6 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-# 🎯 Background task to generate feedback asynchronously with PARALLEL processing
-def generate_feedback_background(student_id: str, module_id: str, attempt: int, answer_ids: List[str]):
-    """
-    Background task to generate AI feedback for multiple answers IN PARALLEL.
-    This runs asynchronously and generates feedback for all questions concurrently
-    to significantly reduce total generation time.
-    """
-    import concurrent.futures
-    import time
-    from app.database import SessionLocal
-    from app.services.ai_feedback import AIFeedbackService
-    from app.models.student_answer import StudentAnswer
-
-    def generate_single_feedback(answer_id: str):
-        """Generate feedback for a single answer (runs in thread pool)"""
-        # Each thread gets its own database session
-        db = SessionLocal()
-        try:
-            # Get the answer
-            answer = db.query(StudentAnswer).filter(StudentAnswer.id == answer_id).first()
-            if not answer:
-                logger.error(f"❌ Answer {answer_id} not found")
-                # Mark feedback as failed
-                from app.crud.ai_feedback import mark_feedback_failed
-                mark_feedback_failed(db, answer_id, "Answer not found", "data_error")
-                return {"success": False, "answer_id": answer_id, "error": "Answer not found"}
-
-            logger.info(f"🔄 Generating feedback for question {answer.question_id}, answer {answer_id}")
-
-            # Generate feedback
-            feedback_service = AIFeedbackService()
-            feedback = feedback_service.generate_instant_feedback(
-                db=db,
-                student_answer=answer,
-                question_id=str(answer.question_id),
-                module_id=module_id
-            )
-
-            logger.info(f"✅ Feedback generated for question {answer.question_id}")
-            return {"success": True, "answer_id": answer_id, "question_id": str(answer.question_id)}
-
-        except Exception as e:
-            logger.error(f"❌ Failed to generate feedback for answer {answer_id}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-
-            # CRITICAL: Mark feedback as failed so it doesn't stay stuck
-            try:
-                from app.crud.ai_feedback import mark_feedback_failed
-                mark_feedback_failed(db, answer_id, str(e), "generation_error")
-            except Exception as mark_error:
-                logger.error(f"❌ Failed to mark feedback as failed: {str(mark_error)}")
-
-            return {"success": False, "answer_id": answer_id, "error": str(e)}
-        finally:
-            db.close()
-
-    try:
-        logger.info(f"🎯 Starting PARALLEL background feedback generation for {len(answer_ids)} answers")
-        start_time = time.time()
-
-        # Use ThreadPoolExecutor to generate feedback in parallel
-        # Max workers = min(3, number of questions) to avoid database connection exhaustion
-        # IMPORTANT: Reduced from 10 to 3 to prevent Supabase connection pool exhaustion
-        max_workers = min(3, len(answer_ids))
-        logger.info(f"🚀 Using {max_workers} parallel threads for feedback generation")
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all feedback generation tasks
-            future_to_answer = {
-                executor.submit(generate_single_feedback, answer_id): answer_id
-                for answer_id in answer_ids
-            }
-
-            # Wait for all tasks to complete
-            completed = 0
-            failed = 0
-            for future in concurrent.futures.as_completed(future_to_answer):
-                answer_id = future_to_answer[future]
-                try:
-                    result = future.result()
-                    if result["success"]:
-                        completed += 1
-                        logger.info(f"✅ [{completed}/{len(answer_ids)}] Feedback completed for {result['question_id']}")
-                    else:
-                        failed += 1
-                        logger.error(f"❌ [{completed + failed}/{len(answer_ids)}] Feedback failed for {answer_id}")
-                except Exception as exc:
-                    failed += 1
-                    logger.error(f"❌ Task generated exception for {answer_id}: {exc}")
-                    # Ensure feedback is marked as failed even if future.result() crashed
-                    try:
-                        db_safety = SessionLocal()
-                        from app.crud.ai_feedback import mark_feedback_failed
-                        mark_feedback_failed(db_safety, answer_id, f"Exception: {str(exc)}", "generation_error")
-                        db_safety.close()
-                    except:
-                        pass
-
-        elapsed_time = time.time() - start_time
-        logger.info(f"✅ PARALLEL feedback generation completed for attempt {attempt}")
-        logger.info(f"📊 Results: {completed} succeeded, {failed} failed out of {len(answer_ids)} total")
-        logger.info(f"⏱️  Total time: {elapsed_time:.2f} seconds ({elapsed_time/len(answer_ids):.2f}s per question average)")
-
-        # Calculate total score for this test submission
-        logger.info(f"🔢 Calculating total score for attempt {attempt}")
-        db = SessionLocal()
-        try:
-            from app.models.ai_feedback import AIFeedback
-            from app.models.question import Question
-            from app.models.test_submission import TestSubmission
-            from uuid import UUID
-
-            # Get all answers for this attempt to get their questions
-            answers = db.query(StudentAnswer).filter(
-                StudentAnswer.student_id == student_id,
-                StudentAnswer.module_id == UUID(module_id),
-                StudentAnswer.attempt == attempt
-            ).all()
-
-            total_points_possible = 0.0
-            total_points_earned = 0.0
-
-            for answer in answers:
-                # Get the question to know points possible
-                question = db.query(Question).filter(Question.id == answer.question_id).first()
-                if question:
-                    total_points_possible += question.points
-
-                    # Get the feedback for this answer
-                    feedback = db.query(AIFeedback).filter(
-                        AIFeedback.answer_id == answer.id
-                    ).first()
-
-                    if feedback and feedback.points_earned is not None:
-                        total_points_earned += feedback.points_earned
-
-            # Calculate percentage
-            percentage_score = (total_points_earned / total_points_possible * 100) if total_points_possible > 0 else 0
-
-            # Update the test submission
-            submission = db.query(TestSubmission).filter(
-                TestSubmission.student_id == student_id,
-                TestSubmission.module_id == UUID(module_id),
-                TestSubmission.attempt == attempt
-            ).first()
-
-            if submission:
-                submission.total_points_possible = total_points_possible
-                submission.total_points_earned = total_points_earned
-                submission.percentage_score = percentage_score
-                db.commit()
-                logger.info(f"✅ Test score updated: {total_points_earned}/{total_points_possible} points ({percentage_score:.1f}%)")
-            else:
-                logger.warning(f"⚠️  Test submission not found for attempt {attempt}")
-
-        except Exception as score_error:
-            logger.error(f"❌ Failed to calculate total score: {str(score_error)}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            db.close()
-
-    except Exception as e:
-        logger.error(f"❌ Background feedback generation CRASHED: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-        # CRITICAL: Mark ALL remaining pending/generating feedback as failed
-        # This prevents UI from being stuck in loading state
-        try:
-            db_cleanup = SessionLocal()
-            from app.crud.ai_feedback import cleanup_stale_feedback
-            from uuid import UUID
-            marked = cleanup_stale_feedback(db_cleanup, UUID(module_id), student_id)
-            logger.error(f"🧹 Emergency cleanup: Marked {marked} feedback rows as failed after crash")
-            db_cleanup.close()
-        except Exception as cleanup_error:
-            logger.error(f"❌ Emergency cleanup also failed: {str(cleanup_error)}")
-
-
 # 🔍 Join module with access code
 @router.post("/join-module", response_model=ModuleOut)
 def join_module_with_code(
@@ -663,8 +483,9 @@ def get_module_feedback(
                 "graded_at": teacher_grade.graded_at.isoformat() if teacher_grade.graded_at else None
             } if teacher_grade else None,
             "is_teacher_graded": teacher_grade is not None,
-            # Generation status for polling
+            # Generation status for polling ('graded' stage: correctness/points ready, narrative pending)
             "generation_status": feedback.generation_status,
+            "generation_stage": feedback.generation_stage,
             "generation_progress": feedback.generation_progress,
             "error_message": feedback.error_message,
             "can_retry": feedback.can_retry if feedback.generation_status in ['failed', 'timeout'] else False
@@ -863,13 +684,12 @@ def submit_test(
     module_id: UUID,
     student_id: str = Query(..., description="Student ID"),
     attempt: int = Query(1, description="Attempt number", ge=1),
-    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_db)
 ):
     """
     Mark a test as submitted for a specific attempt.
-    This creates a TestSubmission record and triggers ASYNC feedback generation.
-    Returns immediately - feedback is generated in the background.
+    This creates a TestSubmission record and queues feedback generation jobs.
+    Returns immediately - feedback is generated by the feedback workers.
     """
     from app.crud.test_submission import (
         create_submission,
@@ -927,20 +747,14 @@ def submit_test(
 
     logger.info(f"✅ Test submitted - {len(answers)} questions")
 
-    # Trigger async feedback generation ONLY if not final attempt
+    # Queue feedback generation ONLY if not final attempt
     if attempt < max_attempts:
         answer_ids = [str(answer.id) for answer in answers]
-        logger.info(f"🚀 Triggering background feedback generation for {len(answer_ids)} answers")
+        logger.info(f"🚀 Queueing feedback generation for {len(answer_ids)} answers")
 
-        # Add background task
-        if background_tasks:
-            background_tasks.add_task(
-                generate_feedback_background,
-                student_id=student_id,
-                module_id=str(module_id),
-                attempt=attempt,
-                answer_ids=answer_ids
-            )
+        # Objective answers are graded now; jobs are persisted, so they survive this instance scaling down
+        from app.services.feedback_worker import enqueue_submission_feedback
+        graded_answer_ids = enqueue_submission_feedback(db, student_id, module_id, attempt, answers)
 
         return {
             "success": True,
@@ -948,6 +762,7 @@ def submit_test(
             "attempt": attempt,
             "questions_submitted": len(answers),
             "answer_ids": answer_ids,  # NEW: for frontend polling
+            "graded_answer_ids": graded_answer_ids,  # Correctness/points already available, narrative pending
             "can_retry": True,
             "max_attempts": max_attempts,
             "feedback_status": "generating",  # NEW: indicates feedback is being generated
@@ -1028,61 +843,103 @@ def get_feedback_status(
     """
     Check the status of feedback generation for a student's test submission.
     Returns which questions have feedback ready and which are still pending.
-    Used for real-time polling in the frontend.
+    Polling fallback for clients that can't use the feedback-events stream.
     """
-    from app.models.student_answer import StudentAnswer
-    from app.crud.ai_feedback import get_feedback_by_answer
+    from app.services.feedback_events import get_feedback_status_snapshot
 
-    # Get all answers for this attempt
-    answers = db.query(StudentAnswer).filter(
-        StudentAnswer.student_id == student_id,
-        StudentAnswer.module_id == module_id,
-        StudentAnswer.attempt == attempt
-    ).all()
+    return get_feedback_status_snapshot(db, student_id, module_id, attempt)
 
-    if not answers:
-        return {
-            "total_questions": 0,
-            "feedback_ready": 0,
-            "feedback_pending": 0,
-            "questions": [],
-            "all_complete": True
-        }
+# 📡 Push feedback progress (Server-Sent Events)
+@router.get("/modules/{module_id}/feedback-events")
+async def stream_feedback_events(
+    module_id: UUID,
+    request: Request,
+    student_id: str = Query(..., description="Student ID"),
+    attempt: int = Query(1, description="Attempt number", ge=1)
+):
+    """
+    Stream feedback progress for a test attempt as Server-Sent Events.
+
+    Events:
+        snapshot - same payload as feedback-status (on connect, and after a
+                   periodic resync that found changes made by other processes)
+        status   - one answer's transition: {answer_id, question_id, generation_status, is_completed, progress};
+                   objective answers also send {generation_stage: 'graded', grade: {is_correct, score,
+                   points_earned, points_possible}} as soon as they are graded, before the narrative
+        complete - every answer has completed feedback; the stream then ends
+
+    The stream also ends after FEEDBACK_EVENTS_MAX_STREAM_SECONDS; EventSource
+    clients reconnect automatically and receive a fresh snapshot.
+    """
+    import asyncio
+    import json
+    import time
+    from app.core.config import (
+        FEEDBACK_EVENTS_KEEPALIVE_SECONDS,
+        FEEDBACK_EVENTS_RESYNC_SECONDS,
+        FEEDBACK_EVENTS_MAX_STREAM_SECONDS
+    )
+    from app.database import SessionLocal
+    from app.services.feedback_events import feedback_events, attempt_key, get_feedback_status_snapshot
 
-    # Check which answers have feedback COMPLETED (not just existing)
-    feedback_status = []
-    ready_count = 0
+    def load_snapshot():
+        # Short-lived session: nothing is held open for the life of the stream
+        db = SessionLocal()
+        try:
+            return get_feedback_status_snapshot(db, student_id, module_id, attempt)
+        finally:
+            db.close()
 
-    for answer in answers:
-        feedback = get_feedback_by_answer(db, answer.id)
-        # IMPORTANT: Only count as ready if generation_status is "completed"
-        # Don't count "pending", "generating", "failed", or "timeout" as ready
-        is_completed = feedback is not None and feedback.generation_status == 'completed'
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        if is_completed:
-            ready_count += 1
+    key = attempt_key(student_id, module_id, attempt)
 
-        feedback_status.append({
-            "question_id": str(answer.question_id),
-            "answer_id": str(answer.id),
-            "has_feedback": feedback is not None,
-            "is_completed": is_completed,
-            "generation_status": feedback.generation_status if feedback else None,
-            "feedback_id": str(feedback.id) if feedback else None
-        })
+    async def event_stream():
+        # Subscribe before reading the snapshot so no transition falls in between
+        queue = feedback_events.subscribe(key)
+        try:
+            snapshot = await asyncio.to_thread(load_snapshot)
+            yield sse("snapshot", snapshot)
+            statuses = {question["answer_id"]: question["generation_status"] for question in snapshot["questions"]}
 
-    total = len(answers)
-    pending = total - ready_count
-    all_complete = ready_count == total
+            started = last_sync = time.monotonic()
+            while not snapshot["all_complete"] and time.monotonic() - started < FEEDBACK_EVENTS_MAX_STREAM_SECONDS:
+                if await request.is_disconnected():
+                    return
 
-    return {
-        "total_questions": total,
-        "feedback_ready": ready_count,
-        "feedback_pending": pending,
-        "progress_percentage": int((ready_count / total) * 100) if total > 0 else 0,
-        "all_complete": all_complete,
-        "questions": feedback_status
-    }
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=FEEDBACK_EVENTS_KEEPALIVE_SECONDS)
+                    statuses[event["answer_id"]] = event["generation_status"]
+                    yield sse("status", event)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+
+                if time.monotonic() - last_sync >= FEEDBACK_EVENTS_RESYNC_SECONDS:
+                    last_sync = time.monotonic()
+                    fresh = await asyncio.to_thread(load_snapshot)
+                    fresh_statuses = {question["answer_id"]: question["generation_status"] for question in fresh["questions"]}
+                    if fresh_statuses != statuses:
+                        statuses = fresh_statuses
+                        yield sse("snapshot", fresh)
+                    snapshot = fresh
+
+                if statuses and all(status == 'completed' for status in statuses.values()):
+                    snapshot["all_complete"] = True
+
+            if snapshot["all_complete"]:
+                yield sse("complete", {"total_questions": len(statuses)})
+        finally:
+            feedback_events.unsubscribe(key, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Don't let proxies buffer the stream
+        }
+    )
 
 # 🧹 Cleanup stale feedback (called by frontend after timeout)
 @router.post("/modules/{module_id}/cleanup-feedback")
@@ -1099,6 +956,7 @@ def cleanup_stale_module_feedback(
         Number of feedback rows marked as failed
     """
     from app.crud.ai_feedback import cleanup_stale_feedback, create_pending_feedback
+    from app.crud.feedback_job import get_live_job_answer_ids
     from app.models.student_answer import StudentAnswer
     from app.models.ai_feedback import AIFeedback
 
@@ -1112,9 +970,14 @@ def cleanup_stale_module_feedback(
 
     logger.info(f"📊 Found {len(answers)} answers for student")
 
+    # Answers still waiting in the feedback job queue aren't stale
+    queued_answer_ids = get_live_job_answer_ids(db, student_id, module_id)
+
     # Check which answers have feedback
     missing_feedback = []
     for answer in answers:
+        if answer.id in queued_answer_ids:
+            continue
         feedback = db.query(AIFeedback).filter(AIFeedback.answer_id == answer.id).first()
         if not feedback:
             missing_feedback.append(answer.id)
@@ -1176,10 +1039,8 @@ def regenerate_all_failed_feedback(
     Returns:
         Status of retry operations
     """
-    from app.crud.ai_feedback import get_feedback_by_answer
     from app.models.student_answer import StudentAnswer
     from app.models.ai_feedback import AIFeedback
-    from app.services.ai_feedback import AIFeedbackService
 
     logger.info(f"🔄 Regenerate all feedback requested for module {module_id}, student {student_id}, attempt {attempt}")
 
@@ -1231,61 +1092,16 @@ def regenerate_all_failed_feedback(
 
     logger.info(f"📊 Found {len(failed_answer_ids)} failed feedback to retry")
 
-    # Trigger regeneration for all failed feedback
-    from app.database import SessionLocal
+    # Reset the failed rows and queue them for the feedback workers
     from app.crud.ai_feedback import reset_feedback_for_retry
-    import threading
-
-    def regenerate_all():
-        """Background thread to regenerate all failed feedback"""
-        # Create a new database session for this thread
-        thread_db = SessionLocal()
-        feedback_service = AIFeedbackService()
-
-        try:
-            for answer_id_str in failed_answer_ids:
-                try:
-                    answer_id = UUID(answer_id_str)
-                    logger.info(f"🔄 Retrying feedback for answer {answer_id}")
-
-                    # Reset feedback for retry
-                    feedback = reset_feedback_for_retry(thread_db, answer_id)
-
-                    if not feedback:
-                        logger.error(f"❌ Failed to reset feedback for answer {answer_id}")
-                        continue
-
-                    # Get the student answer
-                    answer = thread_db.query(StudentAnswer).filter(StudentAnswer.id == answer_id).first()
-
-                    if not answer:
-                        logger.error(f"❌ Answer {answer_id} not found")
-                        continue
+    from app.services.feedback_worker import enqueue_answer_feedback
 
-                    # Trigger regeneration
-                    result = feedback_service.generate_instant_feedback(
-                        db=thread_db,
-                        student_answer=answer,
-                        question_id=str(answer.question_id),
-                        module_id=str(answer.module_id)
-                    )
-
-                    logger.info(f"✅ Retry queued for answer {answer_id}")
-
-                except Exception as e:
-                    logger.error(f"❌ Error retrying feedback for answer {answer_id_str}: {e}")
-                    continue
-
-        except Exception as e:
-            logger.error(f"❌ Error in bulk regeneration: {e}")
-        finally:
-            thread_db.close()
-            logger.info(f"🏁 Bulk regeneration completed for {len(failed_answer_ids)} answers")
+    for answer_id_str in failed_answer_ids:
+        if not reset_feedback_for_retry(db, UUID(answer_id_str)):
+            logger.error(f"❌ Failed to reset feedback for answer {answer_id_str}")
 
-    # Start background thread
-    thread = threading.Thread(target=regenerate_all)
-    thread.daemon = True
-    thread.start()
+    # Retries jump ahead of fresh submissions
+    enqueue_answer_feedback(db, student_id, module_id, attempt, failed_answer_ids, priority=50)
 
     return {
         "success": True,
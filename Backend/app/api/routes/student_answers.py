@@ -385,20 +385,37 @@ def generate_batch_feedback(
 
 # ==================== TEACHER GRADING ENDPOINTS ====================
 
+# IDs per IN (...) when loading grading data
+GRADING_IN_BATCH_SIZE = 1000
+
+
+def _in_batches(ids: list, size: int = GRADING_IN_BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
 @router.get("/module/{module_id}/final-submissions")
 def get_final_submissions_for_grading(
     module_id: UUID,
+    student_id: Optional[str] = Query(None, description="Only this student's submissions"),
+    graded: Optional[bool] = Query(None, description="Only graded (true) or ungraded (false) submissions"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Submissions per page (default: all)"),
+    offset: int = Query(0, ge=0, description="Submissions to skip"),
     db: Session = Depends(get_db)
 ):
     """
     Get all LAST attempt submissions for a module that need teacher grading.
     Returns the most recent attempt for each student per question, regardless of max_attempts setting.
+
+    Submissions are ordered by student, then question order. Counts cover every
+    submission matching the filters, not just the returned page.
     """
     from app.models.student_answer import StudentAnswer
     from app.models.question import Question
-    from app.models.ai_feedback import AIFeedback
     from app.models.teacher_grade import TeacherGrade
     from app.models.module import Module
+    from app.crud.student_answer import get_final_submission_keys
+    from app.crud.ai_feedback import get_feedback_by_answers
 
     # Get module
     module = db.query(Module).filter(Module.id == module_id).first()
@@ -410,57 +427,52 @@ def get_final_submissions_for_grading(
     if module.assignment_config:
         max_attempts = module.assignment_config.get('features', {}).get('multiple_attempts', {}).get('max_attempts', 2)
 
-    # Get all answers for this module
-    all_answers = db.query(StudentAnswer).filter(
-        StudentAnswer.module_id == module_id
-    ).all()
+    # Final answers (id / student / question / attempt only) of students who completed their last attempt
+    final_keys = get_final_submission_keys(db, module_id, max_attempts, student_id=student_id)
 
-    # Group by (student_id, question_id) and keep only the highest attempt
-    answer_map = {}
-    for answer in all_answers:
-        key = (answer.student_id, str(answer.question_id))
-        if key not in answer_map or answer.attempt > answer_map[key].attempt:
-            answer_map[key] = answer
-
-    # Group answers by student to check completeness and max attempts
-    student_answers = {}
-    for key, answer in answer_map.items():
-        student_id, question_id = key
-        if student_id not in student_answers:
-            student_answers[student_id] = []
-        student_answers[student_id].append(answer)
-
-    # Filter to only include students who have:
-    # Used all their allowed attempts (attempt number == max_attempts)
-    # Note: Students don't need to answer ALL questions - just need to have completed their last attempt
-    complete_students = []
-    for student_id, answers in student_answers.items():
-        # Check if all answers are at the max attempt level
-        # (student has exhausted all their attempts)
-        all_at_max_attempt = all(ans.attempt == max_attempts for ans in answers)
-
-        if all_at_max_attempt:
-            complete_students.extend(answers)
-
-    # Get the final answers (only from students who completed their last attempt)
-    final_answers = complete_students
+    # Questions of those answers, in one query (a module has at most a few hundred)
+    questions = {}
+    for batch in _in_batches(list({key.question_id for key in final_keys})):
+        for question in db.query(Question).filter(Question.id.in_(batch)).all():
+            questions[question.id] = question
+    final_keys = [key for key in final_keys if key.question_id in questions]
 
-    results = []
-    for answer in final_answers:
-        # Get question details
-        question = db.query(Question).filter(Question.id == answer.question_id).first()
-        if not question:
-            continue
+    # Which of them are graded, in one query
+    graded_ids = {
+        answer_id for (answer_id,) in db.query(TeacherGrade.answer_id).filter(TeacherGrade.module_id == module_id)
+    }
 
-        # Get AI feedback (if exists from previous attempts)
-        ai_feedback = db.query(AIFeedback).filter(
-            AIFeedback.answer_id == answer.id
-        ).first()
+    total_submissions = len(final_keys)
+    graded_count = sum(1 for key in final_keys if key.id in graded_ids)
+    if graded is not None:
+        final_keys = [key for key in final_keys if (key.id in graded_ids) == graded]
+
+    final_keys.sort(key=lambda key: (
+        key.student_id,
+        questions[key.question_id].question_order is None,
+        questions[key.question_id].question_order or 0,
+        str(key.question_id)
+    ))
+    page = final_keys[offset:offset + limit] if limit is not None else final_keys[offset:]
+
+    # Full rows for the page only: answers, AI feedback and teacher grades, batched by ID
+    page_ids = [key.id for key in page]
+    answers, feedback, grades = {}, {}, {}
+    for batch in _in_batches(page_ids):
+        answers.update({answer.id: answer for answer in db.query(StudentAnswer).filter(StudentAnswer.id.in_(batch)).all()})
+        feedback.update(get_feedback_by_answers(db, batch))
+        graded_batch = [answer_id for answer_id in batch if answer_id in graded_ids]
+        if graded_batch:
+            grades.update({grade.answer_id: grade for grade in db.query(TeacherGrade).filter(TeacherGrade.answer_id.in_(graded_batch)).all()})
 
-        # Check if teacher has already graded this
-        teacher_grade = db.query(TeacherGrade).filter(
-            TeacherGrade.answer_id == answer.id
-        ).first()
+    results = []
+    for key in page:
+        answer = answers.get(key.id)
+        if not answer:
+            continue
+        question = questions[key.question_id]
+        ai_feedback = feedback.get(answer.id)
+        teacher_grade = grades.get(answer.id)
 
         results.append({
             "answer_id": str(answer.id),
@@ -488,9 +500,13 @@ def get_final_submissions_for_grading(
 
     return {
         "module_id": str(module_id),
-        "total_submissions": len(results),
-        "graded_count": sum(1 for r in results if r["is_graded"]),
-        "ungraded_count": sum(1 for r in results if not r["is_graded"]),
+        "total_submissions": total_submissions,
+        "graded_count": graded_count,
+        "ungraded_count": total_submissions - graded_count,
+        "matching_submissions": len(final_keys),
+        "offset": offset,
+        "limit": limit,
+        "has_more": offset + len(page) < len(final_keys),
         "submissions": results
     }
 
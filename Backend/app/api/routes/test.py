@@ -1,5 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
 from app.core.config import OPENAI_API_KEY, UPLOAD_DIR
+from app.database import get_db
 
 router = APIRouter()
 
@@ -9,4 +11,44 @@ def test_env():
         "OPENAI_API_KEY": OPENAI_API_KEY[:5] + "*****",  # Don't return full key
         "UPLOAD_DIR": UPLOAD_DIR,
        
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters for the in-process retrieval caches"""
+    from app.services.embedding_cache import get_embedding_cache_stats
+    from app.services.vector_index import get_index_cache_stats
+    from app.services.rag_retriever import get_question_context_cache_stats
+    from app.services.feedback_cache import get_feedback_cache_stats
+    from app.utils.answer_matching import get_answer_matching_stats
+    from app.services.prompt_builder import get_prompt_prefix_cache_stats
+    from app.services.openai_client import get_prompt_cache_stats
+    from app.services.chat_answer_cache import get_chat_answer_cache_stats
+
+    return {
+        "embedding_cache": get_embedding_cache_stats(),
+        "vector_index": get_index_cache_stats(),
+        "question_context": get_question_context_cache_stats(),
+        "feedback_cache": get_feedback_cache_stats(),
+        "fill_blank_matching": get_answer_matching_stats(),
+        "prompt_prefix": get_prompt_prefix_cache_stats(),
+        "openai_prompt_cache": get_prompt_cache_stats(),
+        "chat_answer_cache": get_chat_answer_cache_stats()
+    }
+
+
+@router.get("/openai-scheduler/stats")
+def openai_scheduler_stats():
+    """Rate-limit budget, queue length and waits of this process's OpenAI schedulers"""
+    from app.services.openai_scheduler import get_scheduler_stats
+
+    return get_scheduler_stats()
+
+
+@router.get("/feedback-jobs/stats")
+def feedback_job_stats(db: Session = Depends(get_db)):
+    """Feedback job queue depth per status"""
+    from app.crud.feedback_job import get_job_queue_stats
+
+    return get_job_queue_stats(db)
@@ -23,6 +23,88 @@ ENV = os.getenv("ENV", "development")
 JWT_SECRET = os.getenv("JWT_SECRET")
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
 
+# === RAG Retrieval Configuration ===
+VECTOR_INDEX_MAX_MODULES = int(os.getenv("VECTOR_INDEX_MAX_MODULES", "32"))  # Module indexes kept in memory
+VECTOR_INDEX_TTL_SECONDS = int(os.getenv("VECTOR_INDEX_TTL_SECONDS", "900"))  # Rebuild after this age so other instances pick up changes
+QUESTION_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("QUESTION_CONTEXT_CACHE_MAX_ENTRIES", "1024"))  # Per-question RAG contexts kept in memory
+QUESTION_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("QUESTION_CONTEXT_CACHE_TTL_SECONDS", "900"))
+PGVECTOR_ENABLED = os.getenv("PGVECTOR_ENABLED", "false").lower() == "true"  # Search in Postgres (needs migration 005)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DB_ENABLED = os.getenv("EMBEDDING_CACHE_DB_ENABLED", "true").lower() == "true"  # Persist cached embeddings in Postgres
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))  # In-memory entries (~12KB each)
+
+# === Feedback Warm-up Configuration ===
+FEEDBACK_WARMUP_CONCURRENCY = int(os.getenv("FEEDBACK_WARMUP_CONCURRENCY", "4"))  # Parallel LLM calls while warming
+MCQ_MULTIPLE_WARMUP_MAX_SUBSETS = int(os.getenv("MCQ_MULTIPLE_WARMUP_MAX_SUBSETS", "32"))  # Selections pre-generated per question
+
+# === Feedback Job Queue Configuration ===
+FEEDBACK_WORKER_CONCURRENCY = int(os.getenv("FEEDBACK_WORKER_CONCURRENCY", "32"))  # Jobs in flight per worker process
+FEEDBACK_LLM_CONCURRENCY = int(os.getenv("FEEDBACK_LLM_CONCURRENCY", "16"))  # Concurrent OpenAI calls per worker process
+FEEDBACK_CONTEXT_CONCURRENCY = int(os.getenv("FEEDBACK_CONTEXT_CONCURRENCY", "4"))  # Questions of a batch whose RAG context is retrieved at once (each holds a DB connection)
+FEEDBACK_WORKER_POLL_SECONDS = float(os.getenv("FEEDBACK_WORKER_POLL_SECONDS", "2"))  # Idle wait between claims
+FEEDBACK_JOB_LEASE_SECONDS = int(os.getenv("FEEDBACK_JOB_LEASE_SECONDS", "180"))  # Job is re-claimable if not heartbeated for this long
+FEEDBACK_JOB_MAX_ATTEMPTS = int(os.getenv("FEEDBACK_JOB_MAX_ATTEMPTS", "3"))
+FEEDBACK_JOB_RETRY_DELAY_SECONDS = int(os.getenv("FEEDBACK_JOB_RETRY_DELAY_SECONDS", "10"))  # Doubles on each retry
+FEEDBACK_GRADE_FIRST = os.getenv("FEEDBACK_GRADE_FIRST", "true").lower() == "true"  # Store objective grades at submit, narrative later
+FEEDBACK_NARRATIVE_JOB_PRIORITY = int(os.getenv("FEEDBACK_NARRATIVE_JOB_PRIORITY", "150"))  # Queue priority of already-graded answers (default jobs are 100)
+FEEDBACK_EMBEDDED_WORKER = os.getenv("FEEDBACK_EMBEDDED_WORKER", "true").lower() == "true"  # Run a worker inside each API instance
+
+# === Feedback Progress Events (SSE) ===
+FEEDBACK_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("FEEDBACK_EVENTS_KEEPALIVE_SECONDS", "15"))
+FEEDBACK_EVENTS_RESYNC_SECONDS = float(os.getenv("FEEDBACK_EVENTS_RESYNC_SECONDS", "20"))  # Re-read status (catches other processes' workers)
+FEEDBACK_EVENTS_MAX_STREAM_SECONDS = float(os.getenv("FEEDBACK_EVENTS_MAX_STREAM_SECONDS", "600"))  # Clients reconnect after this
+
+# === Fill-blank / Multi-part Grading ===
+GRADING_BATCH_ENABLED = os.getenv("GRADING_BATCH_ENABLED", "true").lower() == "true"  # Grade all blanks / sub-answers of an answer in one LLM request
+GRADING_FANOUT_CONCURRENCY = int(os.getenv("GRADING_FANOUT_CONCURRENCY", "8"))  # Parallel per-item requests when batching is off (or a batch reply is incomplete)
+FILL_BLANK_LOCAL_MATCHING = os.getenv("FILL_BLANK_LOCAL_MATCHING", "true").lower() == "true"  # Decide typos/plurals/numbers locally before the LLM check
+FILL_BLANK_MATCHER_CACHE_MAX_ENTRIES = int(os.getenv("FILL_BLANK_MATCHER_CACHE_MAX_ENTRIES", "4096"))  # Compiled blank matchers kept in memory
+
+# === Short/Long Answer Pre-grading (embedding similarity) ===
+TEXT_PREGRADE_MODE = os.getenv("TEXT_PREGRADE_MODE", "off").lower()  # off | provisional (score pushed before LLM feedback) | gate (clearly correct short answers skip the LLM)
+TEXT_PREGRADE_HIGH_SIMILARITY = float(os.getenv("TEXT_PREGRADE_HIGH_SIMILARITY", "0.9"))  # At or above: likely correct
+TEXT_PREGRADE_LOW_SIMILARITY = float(os.getenv("TEXT_PREGRADE_LOW_SIMILARITY", "0.5"))  # At or below: likely incorrect
+
+# === Short/Long Answer De-duplication ===
+TEXT_FEEDBACK_DEDUP_ENABLED = os.getenv("TEXT_FEEDBACK_DEDUP_ENABLED", "true").lower() == "true"  # Reuse feedback for identical (normalized) answers to the same question
+
+# === Cross-student Feedback Cache ===
+FEEDBACK_CACHE_HIT_FLUSH_SECONDS = float(os.getenv("FEEDBACK_CACHE_HIT_FLUSH_SECONDS", "60"))  # Hits are counted in memory and written at most this often per process
+
+# === Prompt Caching ===
+PROMPT_PREFIX_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_PREFIX_CACHE_MAX_ENTRIES", "2048"))  # Rendered per-(question, rubric) prompt prefixes kept in memory
+
+# === Prompt Token Budgets (tiktoken; 0 = unlimited) ===
+FEEDBACK_CONTEXT_TOKEN_BUDGET = int(os.getenv("FEEDBACK_CONTEXT_TOKEN_BUDGET", "1200"))  # Course material in feedback prompts
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1500"))  # Course material in tutor chat prompts
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))  # Previous messages in tutor chat prompts
+
+# === Tutor Chat Summaries ===
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "4"))  # Turns (student + tutor message) sent verbatim
+CHAT_SUMMARY_EVERY_TURNS = int(os.getenv("CHAT_SUMMARY_EVERY_TURNS", "6"))  # Fold older turns into the summary once this many are pending (0 = no summary)
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+
+# === Tutor Answer Cache (semantic, per module) ===
+CHAT_ANSWER_CACHE_ENABLED = os.getenv("CHAT_ANSWER_CACHE_ENABLED", "false").lower() == "true"  # Default for modules; chatbot_feedback.answer_cache overrides it per module
+CHAT_ANSWER_CACHE_SIMILARITY = float(os.getenv("CHAT_ANSWER_CACHE_SIMILARITY", "0.95"))  # Cosine similarity a first question needs to reuse an answer
+CHAT_ANSWER_CACHE_MAX_PER_MODULE = int(os.getenv("CHAT_ANSWER_CACHE_MAX_PER_MODULE", "500"))  # Stop storing new answers past this
+CHAT_ANSWER_CACHE_MAX_MODULES = int(os.getenv("CHAT_ANSWER_CACHE_MAX_MODULES", "32"))  # Module answer indexes kept in memory
+CHAT_ANSWER_CACHE_TTL_SECONDS = int(os.getenv("CHAT_ANSWER_CACHE_TTL_SECONDS", "300"))  # Reload after this age to pick up other instances' answers
+
+# === OpenAI Rate Limits (shared per process; 0 = unlimited) ===
+# Divide your account limits by the number of API/worker processes
+OPENAI_CHAT_RPM = int(os.getenv("OPENAI_CHAT_RPM", "500"))  # Chat completion requests per minute
+OPENAI_CHAT_TPM = int(os.getenv("OPENAI_CHAT_TPM", "200000"))  # Chat completion tokens (prompt + max_tokens) per minute
+OPENAI_EMBEDDING_RPM = int(os.getenv("OPENAI_EMBEDDING_RPM", "3000"))
+OPENAI_EMBEDDING_TPM = int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000"))
+
+# === OpenAI HTTP Connection Pool (one per process, shared by every service) ===
+OPENAI_HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100"))
+OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "32"))
+OPENAI_HTTP_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_HTTP_KEEPALIVE_SECONDS", "120"))  # httpx default is 5s, which re-handshakes between jobs
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"  # Used only if the h2 package is installed
+
 # === Supabase Configuration ===
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
@@ -89,6 +171,7 @@ def add_cors(app: FastAPI):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],  # Keyset pagination (GET /chat/conversations)
     )
     
 # making env nicer
\ No newline at end of file
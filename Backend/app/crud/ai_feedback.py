@@ -3,7 +3,7 @@ from sqlalchemy.exc import IntegrityError
 from app.models.ai_feedback import AIFeedback
 from app.models.student_answer import StudentAnswer
 from app.schemas.ai_feedback import AIFeedbackCreate
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID
 from datetime import datetime, timezone
 import logging
@@ -101,6 +101,38 @@ def get_student_module_feedback(
         StudentAnswer.module_id == module_id
     ).order_by(AIFeedback.generated_at.desc()).all()
 
+def get_attempt_feedback_status(
+    db: Session,
+    student_id: str,
+    module_id: UUID,
+    attempt: int
+) -> List[Any]:
+    """
+    Feedback status of every answer in a test attempt, in one query
+
+    Returns:
+        Rows with answer_id, question_id, feedback_id, generation_status,
+        generation_stage and the grade columns (is_correct, score, points_earned,
+        points_possible); feedback columns are None for answers without a feedback row
+    """
+    return db.query(
+        StudentAnswer.id.label('answer_id'),
+        StudentAnswer.question_id,
+        AIFeedback.id.label('feedback_id'),
+        AIFeedback.generation_status,
+        AIFeedback.generation_stage,
+        AIFeedback.is_correct,
+        AIFeedback.score,
+        AIFeedback.points_earned,
+        AIFeedback.points_possible
+    ).outerjoin(
+        AIFeedback, AIFeedback.answer_id == StudentAnswer.id
+    ).filter(
+        StudentAnswer.student_id == student_id,
+        StudentAnswer.module_id == module_id,
+        StudentAnswer.attempt == attempt
+    ).all()
+
 def delete_feedback(db: Session, feedback_id: UUID) -> bool:
     """Delete feedback"""
     db_feedback = db.query(AIFeedback).filter(AIFeedback.id == feedback_id).first()
@@ -145,6 +177,7 @@ def create_pending_feedback(
     db_feedback = AIFeedback(
         answer_id=answer_id,
         generation_status='pending',
+        generation_stage='none',
         generation_progress=0,
         feedback_data=None,  # Will be populated after generation
         is_correct=None,
@@ -236,6 +269,56 @@ def update_feedback_status(
     return feedback
 
 
+def _set_generation_duration(feedback: AIFeedback) -> None:
+    """Set generation_duration from started_at to completed_at"""
+    if feedback.started_at:
+        # Handle timezone mismatch (old data might be naive, new data is aware)
+        started_at = feedback.started_at
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        duration = (feedback.completed_at - started_at).total_seconds()
+        feedback.generation_duration = int(duration)
+
+
+def _apply_completion(
+    feedback: AIFeedback,
+    feedback_data: dict,
+    is_correct: Optional[bool],
+    score: Optional[int],
+    points_earned: Optional[float],
+    points_possible: Optional[float],
+    criterion_scores: Optional[dict],
+    confidence_level: Optional[str],
+    ai_model: Optional[str],
+    prompt_tokens: Optional[int] = None
+) -> None:
+    """Fill a feedback row with generated data and mark it completed (no commit)"""
+    feedback.generation_status = 'completed'
+    feedback.generation_stage = 'final'
+    feedback.generation_progress = 100
+    feedback.feedback_data = feedback_data
+    feedback.is_correct = is_correct
+    feedback.score = score
+    feedback.points_earned = points_earned
+    feedback.points_possible = points_possible
+    feedback.criterion_scores = criterion_scores
+    feedback.confidence_level = confidence_level
+    feedback.ai_model_used = ai_model
+    feedback.prompt_tokens = prompt_tokens
+    feedback.completed_at = datetime.now(timezone.utc)
+    _set_generation_duration(feedback)
+
+
+def _apply_failure(feedback: AIFeedback, error_message: str, error_type: str) -> None:
+    """Mark a feedback row failed (no commit)"""
+    feedback.generation_status = 'failed'
+    feedback.error_message = error_message
+    feedback.error_type = error_type
+    feedback.completed_at = datetime.now(timezone.utc)
+    feedback.can_retry = feedback.retry_count < feedback.max_retries
+    _set_generation_duration(feedback)
+
+
 def complete_feedback_generation(
     db: Session,
     answer_id: UUID,
@@ -246,7 +329,8 @@ def complete_feedback_generation(
     points_possible: Optional[float],
     criterion_scores: Optional[dict],
     confidence_level: Optional[str],
-    ai_model: Optional[str]
+    ai_model: Optional[str],
+    prompt_tokens: Optional[int] = None
 ) -> Optional[AIFeedback]:
     """
     Mark feedback as completed and save the generated data.
@@ -262,6 +346,7 @@ def complete_feedback_generation(
         criterion_scores: Rubric criterion scores
         confidence_level: Confidence level
         ai_model: AI model used
+        prompt_tokens: Prompt size of the feedback call
 
     Returns:
         Updated AIFeedback object
@@ -271,27 +356,18 @@ def complete_feedback_generation(
         logger.error(f"❌ Feedback not found for answer {answer_id}")
         return None
 
-    # Update with generated data
-    feedback.generation_status = 'completed'
-    feedback.generation_progress = 100
-    feedback.feedback_data = feedback_data
-    feedback.is_correct = is_correct
-    feedback.score = score
-    feedback.points_earned = points_earned
-    feedback.points_possible = points_possible
-    feedback.criterion_scores = criterion_scores
-    feedback.confidence_level = confidence_level
-    feedback.ai_model_used = ai_model
-    feedback.completed_at = datetime.now(timezone.utc)
-
-    # Calculate duration
-    if feedback.started_at:
-        # Handle timezone mismatch (old data might be naive, new data is aware)
-        started_at = feedback.started_at
-        if started_at.tzinfo is None:
-            started_at = started_at.replace(tzinfo=timezone.utc)
-        duration = (feedback.completed_at - started_at).total_seconds()
-        feedback.generation_duration = int(duration)
+    _apply_completion(
+        feedback,
+        feedback_data=feedback_data,
+        is_correct=is_correct,
+        score=score,
+        points_earned=points_earned,
+        points_possible=points_possible,
+        criterion_scores=criterion_scores,
+        confidence_level=confidence_level,
+        ai_model=ai_model,
+        prompt_tokens=prompt_tokens
+    )
 
     db.commit()
     db.refresh(feedback)
@@ -322,20 +398,7 @@ def mark_feedback_failed(
         logger.error(f"❌ Feedback not found for answer {answer_id}")
         return None
 
-    feedback.generation_status = 'failed'
-    feedback.error_message = error_message
-    feedback.error_type = error_type
-    feedback.completed_at = datetime.now(timezone.utc)
-    feedback.can_retry = feedback.retry_count < feedback.max_retries
-
-    # Calculate duration
-    if feedback.started_at:
-        # Handle timezone mismatch (old data might be naive, new data is aware)
-        started_at = feedback.started_at
-        if started_at.tzinfo is None:
-            started_at = started_at.replace(tzinfo=timezone.utc)
-        duration = (feedback.completed_at - started_at).total_seconds()
-        feedback.generation_duration = int(duration)
+    _apply_failure(feedback, error_message, error_type)
 
     db.commit()
     db.refresh(feedback)
@@ -399,6 +462,8 @@ def cleanup_stale_feedback(
     """
     Cleanup stale feedback that has been stuck in 'pending' or 'generating' status.
     This catches silent failures where the background task crashed.
+    Answers that still have a queued/running feedback job are left alone -
+    the job queue retries those itself.
 
     Args:
         db: Database session
@@ -409,6 +474,9 @@ def cleanup_stale_feedback(
         Number of feedback rows marked as failed
     """
     from app.models.student_answer import StudentAnswer
+    from app.crud.feedback_job import get_live_job_answer_ids
+
+    queued_answer_ids = get_live_job_answer_ids(db, student_id, module_id)
 
     # Find all feedback in pending/generating status
     stale_feedback = db.query(AIFeedback).join(
@@ -423,6 +491,9 @@ def cleanup_stale_feedback(
     current_time = datetime.now(timezone.utc)
 
     for feedback in stale_feedback:
+        if feedback.answer_id in queued_answer_ids:
+            continue
+
         should_mark_failed = False
         error_msg = ""
 
@@ -501,3 +572,174 @@ def reset_feedback_for_retry(db: Session, answer_id: UUID) -> Optional[AIFeedbac
     db.refresh(feedback)
     logger.info(f"🔄 Reset feedback for retry: answer {answer_id}, attempt {feedback.retry_count}/{feedback.max_retries}")
     return feedback
+
+
+# ==================== BATCH FUNCTIONS (async feedback engine) ====================
+
+def get_feedback_by_answers(db: Session, answer_ids: List[UUID]) -> Dict[UUID, AIFeedback]:
+    """Get feedback rows for many answers in one query, keyed by answer_id"""
+    if not answer_ids:
+        return {}
+    rows = db.query(AIFeedback).filter(AIFeedback.answer_id.in_(answer_ids)).all()
+    return {row.answer_id: row for row in rows}
+
+
+def start_feedback_generation_batch(
+    db: Session,
+    answer_ids: List[UUID],
+    timeout_seconds: int = 120
+) -> None:
+    """
+    Mark feedback for many answers as 'generating' in one transaction,
+    creating the rows that don't exist yet.
+
+    Args:
+        db: Database session
+        answer_ids: Answers about to be generated
+        timeout_seconds: Timeout for newly created rows
+    """
+    if not answer_ids:
+        return
+
+    now = datetime.now(timezone.utc)
+    existing = get_feedback_by_answers(db, answer_ids)
+
+    for answer_id in answer_ids:
+        feedback = existing.get(answer_id)
+        if feedback is None:
+            db.add(AIFeedback(
+                answer_id=answer_id,
+                generation_status='generating',
+                generation_stage='none',
+                generation_progress=50,
+                feedback_data=None,
+                timeout_seconds=timeout_seconds,
+                can_retry=True,
+                retry_count=0,
+                started_at=now
+            ))
+        else:
+            feedback.generation_status = 'generating'
+            feedback.generation_progress = 50
+            if feedback.started_at is None:
+                feedback.started_at = now
+
+    db.commit()
+
+
+def save_feedback_grades(
+    db: Session,
+    grades: Dict[UUID, Dict[str, Any]],
+    timeout_seconds: int = 120
+) -> List[UUID]:
+    """
+    Store algorithmic grades ahead of the narrative feedback (generation_stage 'graded').
+
+    Creates the feedback rows that don't exist yet (status 'pending'); rows that
+    already hold final feedback are left alone.
+
+    Args:
+        db: Database session
+        grades: answer_id -> dict with is_correct, correctness_score, points_earned,
+                points_possible, criterion_scores, confidence_level
+        timeout_seconds: Timeout for newly created rows
+
+    Returns:
+        Answer IDs whose grade was stored
+    """
+    if not grades:
+        return []
+
+    existing = get_feedback_by_answers(db, list(grades.keys()))
+    stored = []
+
+    for answer_id, grade in grades.items():
+        feedback = existing.get(answer_id)
+        if feedback is None:
+            feedback = AIFeedback(
+                answer_id=answer_id,
+                generation_status='pending',
+                generation_progress=0,
+                feedback_data=None,
+                timeout_seconds=timeout_seconds,
+                can_retry=True,
+                retry_count=0,
+                started_at=datetime.now(timezone.utc)
+            )
+            db.add(feedback)
+        elif feedback.generation_stage == 'final' and feedback.generation_status == 'completed':
+            continue
+
+        feedback.generation_stage = 'graded'
+        feedback.is_correct = grade.get("is_correct")
+        feedback.score = grade.get("correctness_score")
+        feedback.points_earned = grade.get("points_earned")
+        feedback.points_possible = grade.get("points_possible")
+        feedback.criterion_scores = grade.get("criterion_scores")
+        feedback.confidence_level = grade.get("confidence_level")
+        stored.append(answer_id)
+
+    db.commit()
+    return stored
+
+
+def finish_feedback_generation_batch(
+    db: Session,
+    completed: Dict[UUID, Dict[str, Any]],
+    failed: Dict[UUID, Tuple[str, str]]
+) -> None:
+    """
+    Save the results of a feedback batch in one transaction.
+
+    Args:
+        db: Database session
+        completed: answer_id -> keyword arguments of complete_feedback_generation
+                   (feedback_data, is_correct, score, points_earned, ...)
+        failed: answer_id -> (error_message, error_type)
+    """
+    rows = get_feedback_by_answers(db, list(completed.keys()) + list(failed.keys()))
+
+    for answer_id, fields in completed.items():
+        if answer_id in rows:
+            _apply_completion(rows[answer_id], **fields)
+        else:
+            logger.error(f"❌ Feedback not found for answer {answer_id}")
+
+    for answer_id, (error_message, error_type) in failed.items():
+        if answer_id in rows:
+            _apply_failure(rows[answer_id], error_message, error_type)
+        else:
+            logger.error(f"❌ Feedback not found for answer {answer_id}")
+
+    db.commit()
+    logger.info(f"✅ Saved feedback batch: {len(completed)} completed, {len(failed)} failed")
+
+
+def requeue_feedback_generation_batch(db: Session, answer_ids: List[UUID]) -> int:
+    """
+    Put failed feedback rows back to 'pending' while their job waits for another attempt.
+
+    Rows that completed in the meantime are left alone; an objective answer's
+    stored grade (generation_stage 'graded') is kept.
+
+    Returns:
+        Number of rows reset
+    """
+    if not answer_ids:
+        return 0
+
+    rows = get_feedback_by_answers(db, answer_ids)
+    count = 0
+    for feedback in rows.values():
+        if feedback.generation_status == 'completed':
+            continue
+        feedback.generation_status = 'pending'
+        feedback.generation_progress = 0
+        feedback.error_message = None
+        feedback.error_type = None
+        feedback.completed_at = None
+        feedback.generation_duration = None
+        count += 1
+
+    db.commit()
+    return count
@@ -2,8 +2,9 @@
 CRUD operations for chat conversations and messages
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from typing import List, Optional
+from sqlalchemy import desc, func, select, true, tuple_
+from typing import List, Optional, Tuple, Any
+from datetime import datetime
 from uuid import UUID
 
 from app.models.chat_conversation import ChatConversation
@@ -43,6 +44,58 @@ def get_conversations_by_student_module(
     ).order_by(desc(ChatConversation.updated_at)).limit(limit).all()
 
 
+def list_conversations_with_stats(
+    db: Session,
+    student_id: str,
+    module_id: UUID,
+    limit: int = 50,
+    before: Optional[Tuple[datetime, UUID]] = None,
+    preview_length: int = 60
+) -> List[Any]:
+    """
+    A page of a student's conversations in a module with message count and last message, in one query
+
+    Ordered by (updated_at, id) descending; pass the last row's (updated_at, id)
+    as `before` to get the next page (keyset pagination).
+
+    Returns:
+        Rows of (ChatConversation, message_count, last_message) where
+        last_message holds at most preview_length + 1 characters (None if empty)
+    """
+    message_stats = select(
+        func.count(ChatMessage.id).label("message_count")
+    ).where(
+        ChatMessage.conversation_id == ChatConversation.id
+    ).correlate(ChatConversation).lateral("message_stats")
+
+    last_message = select(
+        func.left(ChatMessage.content, preview_length + 1).label("content")
+    ).where(
+        ChatMessage.conversation_id == ChatConversation.id
+    ).order_by(desc(ChatMessage.created_at)).limit(1).correlate(ChatConversation).lateral("last_message")
+
+    query = db.query(
+        ChatConversation,
+        message_stats.c.message_count,
+        last_message.c.content
+    ).select_from(
+        ChatConversation
+    ).join(
+        message_stats, true()
+    ).outerjoin(
+        last_message, true()
+    ).filter(
+        ChatConversation.student_id == student_id,
+        ChatConversation.module_id == module_id
+    )
+    if before is not None:
+        query = query.filter(tuple_(ChatConversation.updated_at, ChatConversation.id) < tuple_(*before))
+
+    return query.order_by(
+        desc(ChatConversation.updated_at), desc(ChatConversation.id)
+    ).limit(limit).all()
+
+
 def delete_conversation(db: Session, conversation_id: UUID) -> bool:
     """Delete a conversation and all its messages"""
     conversation = get_conversation(db, conversation_id)
@@ -70,7 +123,8 @@ def create_message(db: Session, message_data: ChatMessageCreate) -> ChatMessage:
         conversation_id=message_data.conversation_id,
         role=message_data.role,
         content=message_data.content,
-        context_used=message_data.context_used
+        context_used=message_data.context_used,
+        prompt_tokens=message_data.prompt_tokens
     )
     db.add(message)
     db.commit()
@@ -93,6 +147,58 @@ def get_conversation_messages(
     ).order_by(ChatMessage.created_at).limit(limit).all()
 
 
+def get_recent_messages(
+    db: Session,
+    conversation_id: UUID,
+    limit: int
+) -> List[ChatMessage]:
+    """Get the last `limit` messages of a conversation, ordered chronologically"""
+    if limit <= 0:
+        return []
+    messages = db.query(ChatMessage).filter(
+        ChatMessage.conversation_id == conversation_id
+    ).order_by(desc(ChatMessage.created_at)).limit(limit).all()
+    return list(reversed(messages))
+
+
+def get_message_range(
+    db: Session,
+    conversation_id: UUID,
+    offset: int,
+    limit: int
+) -> List[ChatMessage]:
+    """Get `limit` messages of a conversation starting at position `offset` (chronological)"""
+    return db.query(ChatMessage).filter(
+        ChatMessage.conversation_id == conversation_id
+    ).order_by(ChatMessage.created_at).offset(offset).limit(limit).all()
+
+
+def save_conversation_summary(
+    db: Session,
+    conversation_id: UUID,
+    summary: str,
+    summarized_message_count: int,
+    previous_count: int
+) -> bool:
+    """
+    Store a refreshed summary unless another refresh already moved past previous_count
+
+    Returns:
+        True if stored
+    """
+    from datetime import datetime, timezone
+    updated = db.query(ChatConversation).filter(
+        ChatConversation.id == conversation_id,
+        ChatConversation.summarized_message_count == previous_count
+    ).update({
+        ChatConversation.summary: summary,
+        ChatConversation.summarized_message_count: summarized_message_count,
+        ChatConversation.summary_updated_at: datetime.now(timezone.utc)
+    }, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+
 def get_last_message(db: Session, conversation_id: UUID) -> Optional[ChatMessage]:
     """Get the last message in a conversation"""
     return db.query(ChatMessage).filter(
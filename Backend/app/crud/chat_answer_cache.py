@@ -0,0 +1,107 @@
+"""
+CRUD operations for ChatAnswerCache
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+
+from app.models.chat_answer_cache import ChatAnswerCache
+
+
+def get_module_answers(db: Session, module_id: str, module_version: str) -> List[Any]:
+    """
+    Cached answers of a module that are still current (id, question_embedding rows)
+    """
+    return db.query(
+        ChatAnswerCache.id,
+        ChatAnswerCache.question_embedding
+    ).filter(
+        ChatAnswerCache.module_id == module_id,
+        ChatAnswerCache.module_version == module_version
+    ).all()
+
+
+def get_answer(db: Session, answer_id: str) -> Optional[ChatAnswerCache]:
+    """Get a cached answer by ID"""
+    return db.query(ChatAnswerCache).filter(ChatAnswerCache.id == answer_id).first()
+
+
+def record_answer_hit(db: Session, answer_id: str) -> None:
+    """Count a reuse of a cached answer"""
+    db.query(ChatAnswerCache).filter(ChatAnswerCache.id == answer_id).update({
+        ChatAnswerCache.hit_count: ChatAnswerCache.hit_count + 1,
+        ChatAnswerCache.last_hit_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.commit()
+
+
+def count_module_answers(db: Session, module_id: str, module_version: str) -> int:
+    """Number of current cached answers for a module"""
+    return db.query(func.count(ChatAnswerCache.id)).filter(
+        ChatAnswerCache.module_id == module_id,
+        ChatAnswerCache.module_version == module_version
+    ).scalar() or 0
+
+
+def store_answer(
+    db: Session,
+    module_id: str,
+    module_version: str,
+    question: str,
+    question_embedding: List[float],
+    answer: str,
+    context_used: Optional[Dict[str, Any]],
+    generation_ms: Optional[int]
+) -> ChatAnswerCache:
+    """Save a tutor answer for reuse"""
+    entry = ChatAnswerCache(
+        module_id=module_id,
+        module_version=module_version,
+        question=question,
+        question_embedding=question_embedding,
+        answer=answer,
+        context_used=context_used,
+        generation_ms=generation_ms
+    )
+    db.add(entry)
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+
+def delete_module_answers(db: Session, module_id: str, keep_version: Optional[str] = None) -> int:
+    """
+    Delete cached answers for a module (call when its documents or chatbot instructions change)
+
+    Args:
+        keep_version: Keep entries of this module version (delete only stale ones)
+
+    Returns count of deleted entries
+    """
+    query = db.query(ChatAnswerCache).filter(ChatAnswerCache.module_id == module_id)
+    if keep_version is not None:
+        query = query.filter(ChatAnswerCache.module_version != keep_version)
+    count = query.delete(synchronize_session=False)
+    db.commit()
+    return count
+
+
+def get_module_answer_cache_summary(db: Session, module_id: str) -> Dict[str, Any]:
+    """
+    Summary of cached tutor answers for a module (all instances, since the cache was filled)
+    """
+    result = db.query(
+        func.count(ChatAnswerCache.id).label('entries'),
+        func.coalesce(func.sum(ChatAnswerCache.hit_count), 0).label('hits'),
+        func.coalesce(func.sum(ChatAnswerCache.hit_count * ChatAnswerCache.generation_ms), 0).label('saved_ms')
+    ).filter(
+        ChatAnswerCache.module_id == module_id
+    ).first()
+
+    return {
+        'module_id': module_id,
+        'entries': result.entries if result else 0,
+        'hits': int(result.hits) if result else 0,
+        'estimated_saved_ms': int(result.saved_ms) if result else 0
+    }
@@ -115,6 +115,16 @@ def delete_document(db: Session, document_id: str, delete_questions: bool = Fals
     except Exception as e:
         print(f"[WARNING] Failed to delete local file at {doc.storage_path}: {e}")
 
+    module_id = doc.module_id
     db.delete(doc)
     db.commit()
+
+    # 🧹 Drop the module's cached vector index (its chunks were cascade-deleted)
+    from app.services.vector_index import invalidate_module_index
+    invalidate_module_index(module_id)
+
+    # 🧹 Cached tutor answers may quote the deleted document
+    from app.services.chat_answer_cache import invalidate_module_answers
+    invalidate_module_answers(db, module_id)
+
     return doc
\ No newline at end of file
@@ -2,7 +2,7 @@
 CRUD operations for DocumentEmbedding
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 
@@ -138,32 +138,88 @@ def similarity_search(
     db: Session,
     query_vector: List[float],
     limit: int = 5,
-    document_id: Optional[str] = None
-) -> List[tuple]:
+    document_id: Optional[str] = None,
+    module_id: Optional[str] = None,
+    document_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
     """
-    Perform similarity search using cosine similarity
-    (Basic implementation - will be improved with pgvector)
+    Perform cosine similarity search inside Postgres using pgvector
+
+    Requires migrations/005_add_pgvector_embedding_column.sql (vector column + HNSW index).
+    Ranking happens in the database and chunk text comes back in the same query.
+
+    Unscoped searches use the HNSW index. Scoped searches (module / documents)
+    rank exactly instead: HNSW applies WHERE filters after its scan, whose
+    candidate list is capped by hnsw.ef_search, so on a table holding many
+    modules a scoped search could silently return fewer than `limit` rows or
+    none. A module's chunks are few enough to rank them all.
 
     Args:
         db: Database session
         query_vector: The query embedding vector
         limit: Number of results to return
         document_id: Optional document ID to limit search scope
+        module_id: Optional module ID to limit search scope
+        document_ids: Optional list of document IDs to limit search scope
 
     Returns:
-        List of (embedding, similarity_score) tuples
+        List of dicts with 'chunk_id', 'document_id', 'document_title', 'similarity',
+        'text', 'chunk_index', 'metadata' (highest similarity first)
     """
-    # TODO: Implement with pgvector for better performance
-    # For now, this is a placeholder that returns empty results
-    # Once pgvector is set up, use: embedding_vector <=> query_vector
-
-    query = db.query(DocumentEmbedding)
-
     if document_id:
-        query = query.filter(DocumentEmbedding.document_id == document_id)
+        document_ids = [document_id]
 
-    # Placeholder - will implement proper vector similarity with pgvector
-    embeddings = query.limit(limit).all()
+    filters = ["e.embedding IS NOT NULL"]
+    params: Dict[str, Any] = {
+        'query_vector': "[" + ",".join(str(float(value)) for value in query_vector) + "]",
+        'limit': limit
+    }
 
-    # Return with placeholder similarity scores
-    return [(emb, 0.0) for emb in embeddings]
+    if module_id is not None:
+        filters.append("d.module_id = CAST(:module_id AS uuid)")
+        params['module_id'] = str(module_id)
+    if document_ids is not None:
+        filters.append("e.document_id = ANY(CAST(:document_ids AS uuid[]))")
+        params['document_ids'] = [str(doc_id) for doc_id in document_ids]
+
+    scoped = len(filters) > 1
+    if scoped:
+        # Ordering by similarity rather than by the distance operator keeps the
+        # planner off the HNSW index: it filters by module/documents first and
+        # ranks every remaining chunk
+        order_by = "similarity DESC"
+    else:
+        # ef_search defaults to 40, which also caps how many rows a scan can return
+        order_by = "e.embedding <=> CAST(:query_vector AS vector)"
+        ef_search = max(40, limit * 2)
+        db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {'ef_search': str(ef_search)})
+
+    rows = db.execute(text(f"""
+        SELECT
+            e.chunk_id,
+            e.document_id,
+            d.title AS document_title,
+            c.chunk_text,
+            c.chunk_index,
+            c.chunk_metadata,
+            1 - (e.embedding <=> CAST(:query_vector AS vector)) AS similarity
+        FROM document_embeddings e
+        JOIN document_chunks c ON c.id = e.chunk_id
+        JOIN documents d ON d.id = e.document_id
+        WHERE {" AND ".join(filters)}
+        ORDER BY {order_by}
+        LIMIT :limit
+    """), params).fetchall()
+
+    return [
+        {
+            'chunk_id': row.chunk_id,
+            'document_id': str(row.document_id),
+            'document_title': row.document_title,
+            'similarity': float(row.similarity),
+            'text': row.chunk_text,
+            'chunk_index': row.chunk_index,
+            'metadata': row.chunk_metadata or {}
+        }
+        for row in rows
+    ]
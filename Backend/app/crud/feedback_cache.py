@@ -0,0 +1,121 @@
+"""
+CRUD operations for FeedbackCache
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from typing import Optional, Dict, Any, Tuple
+from datetime import datetime
+
+from app.models.feedback_cache import FeedbackCache
+
+
+def get_cached_feedback(db: Session, cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the cached feedback payload for a key (read only; see add_cached_feedback_hits)
+
+    Returns:
+        Payload dict, or None if the key is not cached
+    """
+    row = db.query(FeedbackCache.payload).filter(FeedbackCache.cache_key == cache_key).first()
+    return row.payload if row else None
+
+
+def add_cached_feedback_hits(db: Session, hits: Dict[str, Tuple[int, datetime]]) -> int:
+    """
+    Add counted hits to cache entries in one transaction
+
+    Args:
+        db: Database session
+        hits: cache_key -> (hits since the last flush, time of the latest hit)
+
+    Returns:
+        Number of entries updated (deleted entries are skipped)
+    """
+    updated = 0
+    # Fixed key order so concurrent flushes from several processes can't deadlock
+    for cache_key in sorted(hits):
+        count, last_hit_at = hits[cache_key]
+        updated += db.query(FeedbackCache).filter(FeedbackCache.cache_key == cache_key).update({
+            FeedbackCache.hit_count: FeedbackCache.hit_count + count,
+            FeedbackCache.last_hit_at: last_hit_at
+        }, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+def store_cached_feedback(
+    db: Session,
+    cache_key: str,
+    module_id: str,
+    question_id: str,
+    kind: str,
+    variant: Optional[str],
+    ai_model: Optional[str],
+    payload: Dict[str, Any],
+    commit: bool = True
+) -> None:
+    """
+    Save feedback under a cache key (no-op if another worker stored it first)
+
+    With commit=False the insert runs in a savepoint of the caller's transaction
+    """
+    statement = insert(FeedbackCache).values(
+        cache_key=cache_key,
+        module_id=module_id,
+        question_id=question_id,
+        kind=kind,
+        variant=variant,
+        ai_model=ai_model,
+        payload=payload,
+        hit_count=0,
+        created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['cache_key'])
+    if not commit:
+        with db.begin_nested():
+            db.execute(statement)
+        return
+    db.execute(statement)
+    db.commit()
+
+
+def delete_question_feedback_cache(db: Session, question_id: str) -> int:
+    """
+    Delete all cached feedback for a question (call when it is edited)
+    Returns count of deleted entries
+    """
+    count = db.query(FeedbackCache).filter(
+        FeedbackCache.question_id == question_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    return count
+
+
+def delete_module_feedback_cache(db: Session, module_id: str) -> int:
+    """
+    Delete all cached feedback for a module (call when its rubric changes)
+    Returns count of deleted entries
+    """
+    count = db.query(FeedbackCache).filter(
+        FeedbackCache.module_id == module_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    return count
+
+
+def get_module_feedback_cache_summary(db: Session, module_id: str) -> Dict[str, Any]:
+    """
+    Summary of cached feedback for a module
+    """
+    result = db.query(
+        func.count(FeedbackCache.cache_key).label('entries'),
+        func.coalesce(func.sum(FeedbackCache.hit_count), 0).label('hits')
+    ).filter(
+        FeedbackCache.module_id == module_id
+    ).first()
+
+    return {
+        'module_id': module_id,
+        'entries': result.entries if result else 0,
+        'hits': int(result.hits) if result else 0
+    }
@@ -0,0 +1,274 @@
+"""
+CRUD operations for FeedbackJob (durable feedback generation queue)
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Dict, Any, Optional, Set
+from datetime import timedelta
+from uuid import UUID
+
+from app.models.feedback_job import FeedbackJob, FeedbackJobStatus, FeedbackJobType
+
+LIVE_STATUSES = (FeedbackJobStatus.QUEUED, FeedbackJobStatus.RUNNING)
+
+
+def enqueue_feedback_jobs(
+    db: Session,
+    student_id: str,
+    module_id: UUID,
+    attempt: int,
+    answer_ids: List[str],
+    job_type: str = FeedbackJobType.ANSWER_FEEDBACK,
+    priority: int = 100,
+    max_attempts: int = 3
+) -> int:
+    """
+    Queue one job per answer
+
+    Answers that already have a queued or running job of the same type are
+    skipped (uq_feedback_jobs_live_answer), so repeated submits/retries are safe.
+
+    Returns:
+        Number of jobs actually queued
+    """
+    if not answer_ids:
+        return 0
+
+    statement = insert(FeedbackJob).values([
+        {
+            'job_type': job_type,
+            'answer_id': answer_id,
+            'student_id': student_id,
+            'module_id': module_id,
+            'attempt': attempt,
+            'priority': priority,
+            'max_attempts': max_attempts,
+            'status': FeedbackJobStatus.QUEUED
+        }
+        for answer_id in answer_ids
+    ]).on_conflict_do_nothing(
+        index_elements=['answer_id', 'job_type'],
+        index_where=text("status IN ('queued', 'running')")
+    )
+    result = db.execute(statement)
+    db.commit()
+    return result.rowcount or 0
+
+
+def claim_jobs(
+    db: Session,
+    worker_id: str,
+    limit: int,
+    lease_seconds: int
+) -> List[Dict[str, Any]]:
+    """
+    Claim up to `limit` runnable jobs for a worker
+
+    Runnable means queued and due, or running with an expired lease (its worker
+    died). Rows locked by another claimer are skipped rather than waited on.
+
+    Returns:
+        Plain dicts describing the claimed jobs (safe to use after the session closes)
+    """
+    now = func.now()
+    jobs = db.query(FeedbackJob).filter(
+        or_(
+            and_(FeedbackJob.status == FeedbackJobStatus.QUEUED, FeedbackJob.run_after <= now),
+            and_(
+                FeedbackJob.status == FeedbackJobStatus.RUNNING,
+                FeedbackJob.locked_until < now,
+                FeedbackJob.attempts < FeedbackJob.max_attempts
+            )
+        )
+    ).order_by(
+        FeedbackJob.priority,
+        FeedbackJob.run_after
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for job in jobs:
+        claimed.append({
+            'id': job.id,
+            'job_type': job.job_type,
+            'answer_id': job.answer_id,
+            'student_id': job.student_id,
+            'module_id': job.module_id,
+            'attempt': job.attempt,
+            'attempts': job.attempts + 1,
+            'max_attempts': job.max_attempts,
+            'payload': job.payload or {}
+        })
+        job.status = FeedbackJobStatus.RUNNING
+        job.attempts = job.attempts + 1
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=lease_seconds)
+        job.heartbeat_at = now
+        if job.started_at is None:
+            job.started_at = now
+
+    db.commit()
+    return claimed
+
+
+def heartbeat_jobs(
+    db: Session,
+    worker_id: str,
+    job_ids: List[UUID],
+    lease_seconds: int
+) -> int:
+    """
+    Extend the lease on jobs a worker is still running
+
+    Returns:
+        Number of leases extended (lower than len(job_ids) if a lease was lost)
+    """
+    if not job_ids:
+        return 0
+
+    count = db.query(FeedbackJob).filter(
+        FeedbackJob.id.in_(job_ids),
+        FeedbackJob.locked_by == worker_id,
+        FeedbackJob.status == FeedbackJobStatus.RUNNING
+    ).update({
+        FeedbackJob.locked_until: func.now() + timedelta(seconds=lease_seconds),
+        FeedbackJob.heartbeat_at: func.now()
+    }, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def complete_job(db: Session, job_id: UUID, worker_id: str) -> bool:
+    """
+    Mark a job completed
+
+    Returns:
+        False if the worker no longer holds the job's lease
+    """
+    count = db.query(FeedbackJob).filter(
+        FeedbackJob.id == job_id,
+        FeedbackJob.locked_by == worker_id,
+        FeedbackJob.status == FeedbackJobStatus.RUNNING
+    ).update({
+        FeedbackJob.status: FeedbackJobStatus.COMPLETED,
+        FeedbackJob.locked_by: None,
+        FeedbackJob.locked_until: None,
+        FeedbackJob.last_error: None,
+        FeedbackJob.finished_at: func.now()
+    }, synchronize_session=False)
+    db.commit()
+    return count > 0
+
+
+def fail_job(
+    db: Session,
+    job_id: UUID,
+    worker_id: str,
+    error: str,
+    retry_delay_seconds: int
+) -> Optional[str]:
+    """
+    Record a failed run: requeue with exponential backoff, or give up after max_attempts
+
+    Returns:
+        New job status ('queued' or 'failed'), or None if the worker lost the lease
+    """
+    job = db.query(FeedbackJob).filter(
+        FeedbackJob.id == job_id,
+        FeedbackJob.locked_by == worker_id,
+        FeedbackJob.status == FeedbackJobStatus.RUNNING
+    ).with_for_update().first()
+    if not job:
+        db.rollback()
+        return None
+
+    job.last_error = error[:2000]
+    job.locked_by = None
+    job.locked_until = None
+
+    if job.attempts < job.max_attempts:
+        delay = retry_delay_seconds * (2 ** max(job.attempts - 1, 0))
+        job.status = FeedbackJobStatus.QUEUED
+        job.run_after = func.now() + timedelta(seconds=delay)
+    else:
+        job.status = FeedbackJobStatus.FAILED
+        job.finished_at = func.now()
+
+    status = job.status
+    db.commit()
+    return status
+
+
+def fail_abandoned_jobs(db: Session) -> int:
+    """
+    Give up on running jobs whose lease expired after their last allowed attempt
+
+    (claim_jobs won't pick these up again, so without this they'd stay 'running')
+
+    Returns:
+        Number of jobs marked failed
+    """
+    count = db.query(FeedbackJob).filter(
+        FeedbackJob.status == FeedbackJobStatus.RUNNING,
+        FeedbackJob.locked_until < func.now(),
+        FeedbackJob.attempts >= FeedbackJob.max_attempts
+    ).update({
+        FeedbackJob.status: FeedbackJobStatus.FAILED,
+        FeedbackJob.last_error: "Lease expired on final attempt (worker stopped)",
+        FeedbackJob.locked_by: None,
+        FeedbackJob.locked_until: None,
+        FeedbackJob.finished_at: func.now()
+    }, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def count_live_attempt_jobs(
+    db: Session,
+    student_id: str,
+    module_id: UUID,
+    attempt: int
+) -> int:
+    """Number of queued/running jobs left for a test attempt"""
+    return db.query(FeedbackJob).filter(
+        FeedbackJob.student_id == student_id,
+        FeedbackJob.module_id == module_id,
+        FeedbackJob.attempt == attempt,
+        FeedbackJob.status.in_(LIVE_STATUSES)
+    ).count()
+
+
+def get_live_job_answer_ids(
+    db: Session,
+    student_id: str,
+    module_id: UUID
+) -> Set[UUID]:
+    """Answer IDs of a student that still have queued/running jobs in a module"""
+    rows = db.query(FeedbackJob.answer_id).filter(
+        FeedbackJob.student_id == student_id,
+        FeedbackJob.module_id == module_id,
+        FeedbackJob.status.in_(LIVE_STATUSES)
+    ).all()
+    return {row.answer_id for row in rows}
+
+
+def get_job_queue_stats(db: Session) -> Dict[str, Any]:
+    """
+    Job counts per status and the age of the oldest runnable job
+    """
+    counts = dict(
+        db.query(FeedbackJob.status, func.count(FeedbackJob.id)).group_by(FeedbackJob.status).all()
+    )
+    oldest_age = db.query(
+        func.extract('epoch', func.now() - func.min(FeedbackJob.created_at))
+    ).filter(
+        FeedbackJob.status == FeedbackJobStatus.QUEUED
+    ).scalar()
+
+    return {
+        'queued': counts.get(FeedbackJobStatus.QUEUED, 0),
+        'running': counts.get(FeedbackJobStatus.RUNNING, 0),
+        'completed': counts.get(FeedbackJobStatus.COMPLETED, 0),
+        'failed': counts.get(FeedbackJobStatus.FAILED, 0),
+        'oldest_queued_seconds': round(float(oldest_age), 1) if oldest_age is not None else None
+    }
@@ -3,6 +3,7 @@ from app.models.question import Question, QuestionStatus
 from app.schemas.question import QuestionCreate, QuestionUpdate
 from uuid import UUID, uuid4
 from typing import List, Optional, Dict, Any
+from app.crud.feedback_cache import delete_question_feedback_cache
 
 # ✅ Create a single question
 def create_question(db: Session, question_data: QuestionCreate) -> Question:
@@ -65,6 +66,8 @@ def update_question(db: Session, question_id: UUID, data: QuestionUpdate) -> Opt
         setattr(q, key, value)
     db.commit()
     db.refresh(q)
+    # Cached feedback was generated for the old text/options
+    delete_question_feedback_cache(db, question_id)
     return q
 
 # ✅ Delete question
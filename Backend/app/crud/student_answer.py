@@ -2,7 +2,7 @@ from sqlalchemy.orm import Session
 from app.models.student_answer import StudentAnswer
 from app.schemas.student_answer import StudentAnswerCreate, StudentAnswerUpdate
 from uuid import UUID
-from typing import List, Optional
+from typing import List, Optional, Any
 
 # Create a student answer
 def create_student_answer(db: Session, answer_data: StudentAnswerCreate) -> StudentAnswer:
@@ -149,6 +149,52 @@ def get_student_answers_by_module(db: Session, module_id: UUID) -> List[dict]:
 
     return answer_list
 
+# Get the final answers of students who used all their attempts (teacher grading)
+def get_final_submission_keys(
+    db: Session,
+    module_id: UUID,
+    max_attempts: int,
+    student_id: Optional[str] = None,
+    batch_size: int = 2000
+) -> List[Any]:
+    """
+    Latest attempt per (student, question), for students whose latest attempts
+    are all at max_attempts.
+
+    Only (id, student_id, question_id, attempt) are read, streamed through a
+    server-side cursor in batches of batch_size, so large modules never hold
+    every answer row in memory.
+
+    Returns:
+        Rows with id, student_id, question_id and attempt attributes
+    """
+    query = db.query(
+        StudentAnswer.id,
+        StudentAnswer.student_id,
+        StudentAnswer.question_id,
+        StudentAnswer.attempt
+    ).filter(StudentAnswer.module_id == module_id)
+    if student_id is not None:
+        query = query.filter(StudentAnswer.student_id == student_id)
+
+    latest = {}
+    for row in query.yield_per(batch_size):
+        key = (row.student_id, row.question_id)
+        if key not in latest or row.attempt > latest[key].attempt:
+            latest[key] = row
+
+    by_student = {}
+    for row in latest.values():
+        by_student.setdefault(row.student_id, []).append(row)
+
+    # Students don't need to answer every question, only to have used their last attempt
+    return [
+        row
+        for rows in by_student.values()
+        if all(row.attempt == max_attempts for row in rows)
+        for row in rows
+    ]
+
 # Delete all answers for a student in a specific module (teacher function)
 def delete_student_assignment(db: Session, student_id: str, module_id: UUID) -> int:
     """
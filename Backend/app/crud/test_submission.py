@@ -77,3 +77,44 @@ def get_submission_count(
         TestSubmission.student_id == student_id,
         TestSubmission.module_id == module_id
     ).count()
+
+def update_submission_score(
+    db: Session,
+    student_id: str,
+    module_id: UUID,
+    attempt: int
+) -> Optional[TestSubmission]:
+    """
+    Recalculate a submission's total score from the feedback of its answers.
+    Call once feedback generation for the attempt has finished.
+
+    Returns:
+        The updated submission, or None if the attempt hasn't been submitted
+    """
+    from app.models.ai_feedback import AIFeedback
+    from app.models.question import Question
+    from app.models.student_answer import StudentAnswer
+
+    submission = get_submission(db, student_id, module_id, attempt)
+    if not submission:
+        return None
+
+    rows = db.query(Question.points, AIFeedback.points_earned).select_from(StudentAnswer).join(
+        Question, Question.id == StudentAnswer.question_id
+    ).outerjoin(
+        AIFeedback, AIFeedback.answer_id == StudentAnswer.id
+    ).filter(
+        StudentAnswer.student_id == student_id,
+        StudentAnswer.module_id == module_id,
+        StudentAnswer.attempt == attempt
+    ).all()
+
+    total_points_possible = float(sum(points or 0 for points, _ in rows))
+    total_points_earned = float(sum(earned for _, earned in rows if earned is not None))
+
+    submission.total_points_possible = total_points_possible
+    submission.total_points_earned = total_points_earned
+    submission.percentage_score = (total_points_earned / total_points_possible * 100) if total_points_possible > 0 else 0
+    db.commit()
+    db.refresh(submission)
+    return submission
@@ -37,6 +37,10 @@ class AIFeedback(Base):
 
     generation_progress = Column(Integer, nullable=False, default=100, server_default='100')  # 0-100%
 
+    # What has been written so far (objective questions are graded before their narrative)
+    generation_stage = Column(String(20), nullable=False, default='final', server_default='final')
+    # Possible values: 'none' (nothing yet), 'graded' (is_correct/score/points stored, narrative pending), 'final'
+
     # Error tracking
     error_message = Column(String, nullable=True)  # Error description if generation failed
     error_type = Column(String(50), nullable=True)  # 'timeout', 'api_error', 'parse_error', 'network_error'
@@ -52,6 +56,7 @@ class AIFeedback(Base):
     # Performance tracking
     generation_duration = Column(Integer, nullable=True)  # Seconds taken to generate
     ai_model_used = Column(String(50), nullable=True)  # Track which AI model was used
+    prompt_tokens = Column(Integer, nullable=True)  # Prompt size of the feedback call (None when no LLM call was made)
 
     # Timestamp
     generated_at = Column(TIMESTAMP, default=lambda: datetime.now(timezone.utc))
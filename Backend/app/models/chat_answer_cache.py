@@ -0,0 +1,42 @@
+"""
+ChatAnswerCache model for tutor answers reused across students
+Backs the semantic answer cache in app.services.chat_answer_cache
+"""
+from sqlalchemy import Column, String, Integer, Text, TIMESTAMP, Float, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class ChatAnswerCache(Base):
+    """
+    A first-turn tutor answer, matched to new questions by embedding similarity
+
+    module_version fingerprints everything the answer depended on (the module's
+    embedded documents, chatbot instructions, chat model and embedding model);
+    only entries with the module's current version are served.
+    """
+    __tablename__ = "chat_answer_cache"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+    module_version = Column(String(64), nullable=False)
+
+    question = Column(Text, nullable=False)
+    question_embedding = Column(ARRAY(Float), nullable=False)
+    answer = Column(Text, nullable=False)
+    context_used = Column(JSONB, nullable=True)  # RAG sources shown with the answer
+
+    generation_ms = Column(Integer, nullable=True)  # How long the original answer took
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
+    last_hit_at = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        Index('ix_chat_answer_cache_module_version', 'module_id', 'module_version'),
+    )
+
+    def __repr__(self):
+        return f"<ChatAnswerCache(module={self.module_id}, hits={self.hit_count})>"
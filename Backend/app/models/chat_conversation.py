@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -16,5 +16,15 @@ class ChatConversation(Base):
     created_at = Column(TIMESTAMP, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(TIMESTAMP, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
 
+    # Rolling summary of the oldest messages (app.services.chat_summary); the rest are sent verbatim
+    summary = Column(Text, nullable=True)
+    summarized_message_count = Column(Integer, nullable=False, default=0, server_default='0')  # Messages (oldest first) folded into summary
+    summary_updated_at = Column(TIMESTAMP, nullable=True)
+
     # Relationships
     messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset-paginated conversation list (newest activity first)
+        Index('ix_chat_conversations_student_module_updated', 'student_id', 'module_id', 'updated_at', 'id'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -14,7 +14,13 @@ class ChatMessage(Base):
     role = Column(String, nullable=False)  # "student" or "assistant"
     content = Column(Text, nullable=False)
     context_used = Column(JSONB, nullable=True)  # RAG chunks used for this response (assistant messages only)
+    prompt_tokens = Column(Integer, nullable=True)  # Prompt size of the call that produced this response (assistant messages only)
     created_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
 
     # Relationships
     conversation = relationship("ChatConversation", back_populates="messages")
+
+    __table_args__ = (
+        # History, message counts and last-message previews per conversation
+        Index('ix_chat_messages_conversation_created', 'conversation_id', 'created_at'),
+    )
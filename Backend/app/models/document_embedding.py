@@ -1,6 +1,6 @@
 """
 DocumentEmbedding model for storing vector embeddings of document chunks
-Uses pgvector for similarity search
+Vectors are stored as float arrays; migration 005 adds a pgvector copy for in-database search
 """
 from sqlalchemy import Column, String, Integer, ForeignKey, TIMESTAMP, Text, Float
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
@@ -22,8 +22,10 @@ class DocumentEmbedding(Base):
     chunk_id = Column(UUID(as_uuid=True), ForeignKey("document_chunks.id", ondelete="CASCADE"), nullable=False)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
 
-    # Vector embedding - stored as ARRAY for now (will use pgvector extension later)
+    # Vector embedding - stored as ARRAY
     # OpenAI text-embedding-ada-002 produces 1536 dimensions
+    # Migration 005 adds an unmapped `embedding vector(1536)` column kept in sync by a
+    # trigger, used by crud.document_embedding.similarity_search when PGVECTOR_ENABLED
     embedding_vector = Column(ARRAY(Float), nullable=False)
 
     # Metadata
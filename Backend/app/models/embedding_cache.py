@@ -0,0 +1,29 @@
+"""
+EmbeddingCache model for storing query embeddings by text hash
+Second (persistent) tier of the embedding cache in app.services.embedding_cache
+"""
+from sqlalchemy import Column, String, Integer, TIMESTAMP, Float
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import datetime
+
+from app.database import Base
+
+
+class EmbeddingCache(Base):
+    """
+    Caches OpenAI embeddings for repeated texts (questions, answers, chat queries)
+    Keyed by (model, sha256(text)) so the text itself is never stored
+    """
+    __tablename__ = "embedding_cache"
+
+    embedding_model = Column(String, primary_key=True)
+    text_hash = Column(String(64), primary_key=True)  # sha256 hex digest of the embedded text
+
+    embedding_vector = Column(ARRAY(Float), nullable=False)
+    embedding_dimensions = Column(Integer, nullable=False)
+    token_count = Column(Integer)  # Tokens the original API call used
+
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EmbeddingCache(model={self.embedding_model}, hash={self.text_hash[:12]})>"
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, TIMESTAMP, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from app.database import Base
+from datetime import datetime
+
+
+class FeedbackCache(Base):
+    """
+    Generated feedback that can be reused across students.
+
+    For MCQs the prompt depends only on the question, the selected option, the
+    rubric, the model and the RAG context, so every student who picks the same
+    option can be served the same result. cache_key is a sha256 over all of those.
+    Short/long answers are keyed the same way by their normalized text.
+    """
+    __tablename__ = "feedback_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(UUID(as_uuid=True), ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+
+    kind = Column(String(20), nullable=False)       # mcq, mcq_multiple, short, long
+    variant = Column(String, nullable=True)         # Normalized selection or answer text the feedback is for (e.g. "B", "A,C", "photosynthesis")
+    ai_model = Column(String, nullable=True)
+
+    # Analyzer output (same dict the feedback_data/score columns are built from)
+    payload = Column(JSONB, nullable=False)
+
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
+    last_hit_at = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        Index('ix_feedback_cache_question', 'question_id'),
+        Index('ix_feedback_cache_module', 'module_id'),
+    )
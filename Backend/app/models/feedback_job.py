@@ -0,0 +1,71 @@
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, TIMESTAMP, Index, text, func
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from app.database import Base
+import uuid
+
+
+class FeedbackJobStatus:
+    """Feedback job lifecycle"""
+    QUEUED = "queued"        # Waiting for a worker (or for run_after on a retry)
+    RUNNING = "running"      # Claimed by a worker holding a lease (locked_until)
+    COMPLETED = "completed"
+    FAILED = "failed"        # Gave up after max_attempts
+
+
+class FeedbackJobType:
+    """What a job does"""
+    ANSWER_FEEDBACK = "answer_feedback"  # Generate AI feedback for one student answer
+
+
+class FeedbackJob(Base):
+    """
+    Durable queue of feedback generation work.
+
+    Workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+    worker processes can drain the queue without handing the same job out twice.
+    A claimed job holds a lease (locked_until) that the worker keeps extending
+    while it runs; if the worker dies the lease expires and another worker
+    picks the job up again.
+    """
+    __tablename__ = "feedback_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    job_type = Column(String(30), nullable=False, default=FeedbackJobType.ANSWER_FEEDBACK)
+    answer_id = Column(UUID(as_uuid=True), ForeignKey("student_answers.id", ondelete="CASCADE"), nullable=False)
+    student_id = Column(String, nullable=False)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+    attempt = Column(Integer, nullable=False, default=1)
+
+    # Lower runs first
+    priority = Column(Integer, nullable=False, default=100, server_default='100')
+
+    status = Column(String(20), nullable=False, default=FeedbackJobStatus.QUEUED, server_default=FeedbackJobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    max_attempts = Column(Integer, nullable=False, default=3, server_default='3')
+    run_after = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    # Lease held by the worker running the job
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(TIMESTAMP(timezone=True), nullable=True)
+    heartbeat_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    last_error = Column(Text, nullable=True)
+    payload = Column(JSONB, nullable=True)
+
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Claim query: next runnable job by priority
+        Index('ix_feedback_jobs_claim', 'status', 'priority', 'run_after'),
+        Index('ix_feedback_jobs_attempt', 'student_id', 'module_id', 'attempt'),
+        # At most one live job per answer, so double submits / repeated retries don't duplicate work
+        Index(
+            'uq_feedback_jobs_live_answer',
+            'answer_id', 'job_type',
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')")
+        ),
+    )
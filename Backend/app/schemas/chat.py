@@ -13,6 +13,7 @@ class ChatMessageBase(BaseModel):
 class ChatMessageCreate(ChatMessageBase):
     conversation_id: UUID = Field(..., description="Conversation ID")
     context_used: Optional[Dict[str, Any]] = Field(None, description="RAG context used (for assistant messages)")
+    prompt_tokens: Optional[int] = Field(None, description="Prompt size of the call that produced the message (for assistant messages)")
 
 
 class ChatMessageOut(ChatMessageBase):
@@ -11,6 +11,8 @@ class BlankConfig(BaseModel):
     correct_answers: List[str] = Field(..., description="List of acceptable answers")
     points: float = Field(default=1.0, description="Points for this blank")
     case_sensitive: bool = Field(default=False, description="Whether answer matching is case-sensitive")
+    numeric_tolerance: Optional[float] = Field(None, description="Largest accepted difference for numeric answers (default: exact)")
+    typo_tolerance: bool = Field(default=True, description="Accept swapped or doubled letters in long words without the AI check")
 
 class FillBlankConfig(BaseModel):
     """Extended config for fill_blank question type"""
@@ -1,19 +1,32 @@
 import openai
 import json
 import logging
-from typing import Dict, Any, Optional, List
+from functools import partial
+from typing import Dict, Any, Optional, List, Tuple
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.orm import Session
-from app.core.config import OPENAI_API_KEY, LLM_MODEL
+from app.core.config import LLM_MODEL, FEEDBACK_CONTEXT_TOKEN_BUDGET
 from app.models.question import Question
 from app.models.student_answer import StudentAnswer
 from app.models.module import Module
 from app.crud.question import get_question_by_id
 from app.services.embedding import search_similar_chunks
 from app.services.rubric import get_module_rubric
-from app.services.rag_retriever import get_context_for_feedback
+from app.services.rag_retriever import get_question_context
+from app.services.feedback_cache import (
+    build_option_cache_key,
+    build_text_cache_key,
+    normalize_mcq_option,
+    normalize_mcq_selection,
+    normalize_text_answer,
+    text_dedup_enabled,
+    feedback_flights,
+    lookup_feedback,
+    save_feedback
+)
 from app.services.prompt_builder import (
-    build_mcq_feedback_prompt,
-    build_text_feedback_prompt,
+    build_mcq_feedback_messages,
+    build_text_feedback_messages,
     should_include_context
 )
 from app.crud.ai_feedback import (
@@ -22,19 +35,52 @@ from app.crud.ai_feedback import (
     create_pending_feedback,
     update_feedback_status,
     complete_feedback_generation,
-    mark_feedback_failed
+    mark_feedback_failed,
+    save_feedback_grades
 )
 from app.schemas.ai_feedback import AIFeedbackCreate
-from app.services.openai_client import OpenAIClientWithRetry
+from app.services.feedback_events import publish_answer_status
+from app.services.context_packer import pack_rag_context, count_prompt_tokens
+from app.services.text_pregrade import pregrade_enabled, pregrade_text_answer, provisional_event
+from app.services.openai_client import (
+    get_openai_client,
+    ChatCompletionRequest,
+    ChatSteps,
+    run_chat_steps,
+    parse_json_reply
+)
 
 logger = logging.getLogger(__name__)
 
+
+def detach_question(question: Question) -> Question:
+    """
+    Plain (transient) copy of a question's columns
+
+    Reading it never touches the database, so it stays usable after its session
+    commits or releases its connection (e.g. while waiting on the LLM).
+    """
+    return Question(**{attr.key: getattr(question, attr.key) for attr in sa_inspect(Question).column_attrs})
+
+
+# Question types whose correctness is computed without the LLM, so their grade
+# can be stored before the narrative feedback is generated
+OBJECTIVE_QUESTION_TYPES = ('mcq', 'mcq_multiple', 'fill_blank')
+
+
 class AIFeedbackService:
-    """Service for generating AI-powered feedback on student answers"""
+    """
+    Service for generating AI-powered feedback on student answers
+
+    The _analyze_* methods never call OpenAI themselves: they are generators that
+    yield ChatCompletionRequest objects and receive the reply text, so the same
+    analyzer runs with blocking calls here (run_chat_steps) and concurrently in
+    the async batch engine (app.services.feedback_engine).
+    """
 
     def __init__(self):
-        # Use the new OpenAI client with retry logic
-        self.client = OpenAIClientWithRetry(api_key=OPENAI_API_KEY, default_model=LLM_MODEL)
+        # Shared OpenAI client with retry logic (process-wide connection pool)
+        self.client = get_openai_client()
         self.default_model = LLM_MODEL
 
     def generate_instant_feedback(
@@ -56,6 +102,16 @@ class AIFeedbackService:
         Returns:
             Dict with feedback data
         """
+        # Progress goes to feedback-events subscribers, not the database
+        publish_status = partial(
+            publish_answer_status,
+            student_answer.student_id,
+            student_answer.module_id,
+            student_answer.attempt,
+            student_answer.id,
+            question_id
+        )
+
         try:
             # ========== STEP 1: Check if feedback already exists ==========
             existing_feedback = get_feedback_by_answer(db, student_answer.id)
@@ -108,6 +164,7 @@ class AIFeedbackService:
                 status='generating',
                 progress=10
             )
+            publish_status('generating', progress=10)
 
             # ========== STEP 4: Load question and module data ==========
             question = get_question_by_id(db, question_id)
@@ -118,9 +175,10 @@ class AIFeedbackService:
                     error_message="Question not found",
                     error_type="data_error"
                 )
+                publish_status('failed')
                 return self._error_response("Question not found")
 
-            update_feedback_status(db, student_answer.id, 'generating', 20)
+            publish_status('generating', progress=20)
 
             # Get module configuration
             module = db.query(Module).filter(Module.id == module_id).first()
@@ -131,6 +189,7 @@ class AIFeedbackService:
                     error_message="Module not found",
                     error_type="data_error"
                 )
+                publish_status('failed')
                 return self._error_response("Module not found")
 
             # Get rubric configuration (merges with defaults)
@@ -139,118 +198,74 @@ class AIFeedbackService:
             # Get AI model from rubric or use default
             ai_model = self._get_ai_model_from_rubric(rubric)
 
-            update_feedback_status(db, student_answer.id, 'generating', 30)
+            publish_status('generating', progress=30)
 
             # Extract student's answer based on format
             student_answer_text = self._extract_answer_text(student_answer.answer)
             logger.info(f"📝 Extracted answer text: '{student_answer_text}' from raw answer: {student_answer.answer}")
 
             # Get RAG context if enabled in rubric
-            rag_context = None
-            should_use_rag = should_include_context(rubric, question.type)
-            logger.info(f"🔍 RAG CHECK: should_include_context={should_use_rag}, question_type={question.type}")
-            logger.info(f"🔍 RAG SETTINGS: {rubric.get('rag_settings', {})}")
-
-            if should_use_rag:
-                rag_settings = rubric.get("rag_settings", {})
-                logger.info(f"🔍 ATTEMPTING RAG RETRIEVAL for module_id={module_id}")
-                logger.info(f"   max_chunks={rag_settings.get('max_context_chunks', 3)}")
-                logger.info(f"   similarity_threshold={rag_settings.get('similarity_threshold', 0.7)}")
-                try:
-                    rag_context = get_context_for_feedback(
-                        db=db,
-                        question_text=question.text,
-                        student_answer=student_answer_text,
-                        module_id=module_id,
-                        max_chunks=rag_settings.get("max_context_chunks", 3),
-                        similarity_threshold=rag_settings.get("similarity_threshold", 0.7),
-                        include_document_locations=rag_settings.get("include_document_locations", True)
+            rag_context = self._retrieve_rag_context(db, question, student_answer_text, module_id, rubric)
+
+            # Option feedback and identical text answers are shared by every student giving the same answer
+            feedback = None
+            from_cache = False
+            cache_key, variant = self._feedback_cache_key(question, student_answer.answer, ai_model, rubric, rag_context)
+            if cache_key is not None:
+                feedback = lookup_feedback(db, cache_key)
+                if feedback is not None:
+                    logger.info(f"♻️ Reusing cached {question.type} feedback for question {question.id}, answer {variant[:60]!r}")
+                    from_cache = True
+
+            # Objective answers get their grade stored before the narrative is generated
+            grade = None
+            if feedback is None and question.type in OBJECTIVE_QUESTION_TYPES:
+                grade = self.deterministic_grade(question, student_answer.answer, rubric)
+                if grade is not None and not save_feedback_grades(db, {student_answer.id: grade}):
+                    grade = None
+
+            publish_status('generating', progress=50, grade=grade)
+
+            # Everything the LLM phase reads, as plain values (ORM objects expire on commit)
+            answer_id = student_answer.id
+            answer_data = student_answer.answer
+            attempt_number = student_answer.attempt
+            submitted_at = student_answer.submitted_at
+            question = detach_question(question)
+            self._release_connection(db)
+
+            # ========== STEP 5: Generate feedback (no DB connection held) ==========
+            if feedback is None:
+                def generate() -> Dict[str, Any]:
+                    pregrade = self._pregrade(question, answer_data, rubric)
+                    if pregrade is not None:
+                        publish_status('generating', progress=60, provisional=provisional_event(pregrade, question.points))
+
+                    return run_chat_steps(
+                        self._analysis_steps(question, answer_data, ai_model, rubric, rag_context, pregrade),
+                        self.client
                     )
-                    logger.info(f"✅ RAG context retrieved: has_context={rag_context.get('has_context', False)}")
-                    if rag_context and rag_context.get('has_context'):
-                        logger.info(f"   📚 Sources: {rag_context.get('sources', [])}")
-                        logger.info(f"   📄 Chunks: {len(rag_context.get('chunks', []))}")
-                    else:
-                        logger.warning(f"⚠️  RAG returned no context")
-                except Exception as rag_error:
-                    logger.error(f"❌ RAG retrieval failed: {str(rag_error)}")
-                    logger.exception("Full RAG error traceback:")
-                    rag_context = None
-            else:
-                logger.info(f"⏭️  Skipping RAG (should_include_context=False)")
-
-            update_feedback_status(db, student_answer.id, 'generating', 50)
 
-            # ========== STEP 5: Generate feedback based on question type ==========
-            if question.type == 'mcq':
-                feedback = self._analyze_mcq_answer(
-                    student_answer=student_answer_text,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
-                )
-            elif question.type == 'fill_blank':
-                feedback = self._analyze_fill_blank_answer(
-                    student_answer=student_answer.answer,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
-                )
-            elif question.type == 'mcq_multiple':
-                feedback = self._analyze_mcq_multiple_answer(
-                    student_answer=student_answer.answer,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
-                )
-            elif question.type == 'multi_part':
-                feedback = self._analyze_multi_part_answer(
-                    student_answer=student_answer.answer,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
-                )
-            else:
-                # Default to text answer for short/long types
-                feedback = self._analyze_text_answer(
-                    student_answer=student_answer_text,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
-                )
+                if cache_key is not None:
+                    # Identical answers being generated right now wait for that result instead
+                    feedback, from_cache = feedback_flights.do(cache_key, generate)
+                else:
+                    feedback = generate()
 
             # Prepare feedback data for storage
-            feedback_data = {
-                "explanation": feedback.get("explanation", ""),
-                "improvement_hint": feedback.get("improvement_hint"),
-                "concept_explanation": feedback.get("concept_explanation"),
-                "strengths": feedback.get("strengths"),
-                "weaknesses": feedback.get("weaknesses"),
-                "selected_option": feedback.get("selected_option"),
-                "correct_option": feedback.get("correct_option"),
-                "available_options": feedback.get("available_options"),
-                "model_used": ai_model,
-                "confidence_level": feedback.get("confidence_level", "medium"),
-                "feedback_type": feedback.get("feedback_type"),
-                "used_rag": rag_context is not None and rag_context.get("has_context", False),
-                "rag_sources": rag_context.get("sources", []) if rag_context and rag_context.get("has_context") else None
-            }
-
-            update_feedback_status(db, student_answer.id, 'generating', 90)
+            feedback_data = self._build_feedback_data(feedback, ai_model, rag_context, from_cache)
 
             # ========== STEP 6: Save completed feedback to database ==========
             try:
-                logger.info(f"💾 Saving completed feedback for answer_id: {student_answer.id}")
+                logger.info(f"💾 Saving completed feedback for answer_id: {answer_id}")
                 logger.info(f"💾 Feedback data: is_correct={feedback.get('is_correct')}, score={feedback.get('correctness_score')}")
 
+                if cache_key and not from_cache:
+                    save_feedback(db, cache_key, question, question.type, variant, ai_model, feedback)
+
                 db_feedback = complete_feedback_generation(
                     db=db,
-                    answer_id=student_answer.id,
+                    answer_id=answer_id,
                     feedback_data=feedback_data,
                     is_correct=feedback.get("is_correct"),
                     score=feedback.get("correctness_score"),
@@ -258,9 +273,11 @@ class AIFeedbackService:
                     points_possible=feedback.get("points_possible"),
                     criterion_scores=feedback.get("criterion_scores"),
                     confidence_level=feedback.get("confidence_level"),
-                    ai_model=ai_model
+                    ai_model=ai_model,
+                    prompt_tokens=None if from_cache else feedback.get("prompt_tokens")
                 )
                 logger.info(f"✅ Feedback completed successfully with ID: {db_feedback.id}")
+                publish_status('completed', progress=100)
 
             except Exception as db_error:
                 logger.error(f"❌ Failed to save feedback to database: {str(db_error)}")
@@ -268,7 +285,7 @@ class AIFeedbackService:
                 # Mark as failed
                 mark_feedback_failed(
                     db=db,
-                    answer_id=student_answer.id,
+                    answer_id=answer_id,
                     error_message=f"Database error: {str(db_error)}",
                     error_type="database_error"
                 )
@@ -277,10 +294,10 @@ class AIFeedbackService:
             # Return complete feedback for API response
             return {
                 **feedback,
-                "feedback_id": str(student_answer.id),
+                "feedback_id": str(answer_id),
                 "question_id": question_id,
-                "attempt_number": student_answer.attempt,
-                "generated_at": student_answer.submitted_at.isoformat(),
+                "attempt_number": attempt_number,
+                "generated_at": submitted_at.isoformat(),
                 "model_used": ai_model
             }
 
@@ -298,9 +315,346 @@ class AIFeedbackService:
                 )
             except:
                 logger.error("Failed to mark feedback as failed")
+            publish_status('failed')
 
             return self._error_response(f"Failed to generate feedback: {str(e)}")
     
+    def _retrieve_rag_context(
+        self,
+        db: Session,
+        question: Question,
+        student_answer_text: str,
+        module_id: str,
+        rubric: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Retrieve course material context for a question if the rubric enables RAG"""
+        rag_context = None
+        should_use_rag = should_include_context(rubric, question.type)
+        logger.info(f"🔍 RAG CHECK: should_include_context={should_use_rag}, question_type={question.type}")
+        logger.info(f"🔍 RAG SETTINGS: {rubric.get('rag_settings', {})}")
+
+        if should_use_rag:
+            rag_settings = rubric.get("rag_settings", {})
+            logger.info(f"🔍 ATTEMPTING RAG RETRIEVAL for module_id={module_id}")
+            logger.info(f"   max_chunks={rag_settings.get('max_context_chunks', 3)}")
+            logger.info(f"   similarity_threshold={rag_settings.get('similarity_threshold', 0.7)}")
+            try:
+                # Context is retrieved per question and shared across students
+                rag_context = get_question_context(
+                    db=db,
+                    question_id=str(question.id),
+                    question_text=question.text,
+                    student_answer=student_answer_text,
+                    module_id=module_id,
+                    question_type=question.type,
+                    max_chunks=rag_settings.get("max_context_chunks", 3),
+                    similarity_threshold=rag_settings.get("similarity_threshold", 0.7),
+                    include_document_locations=rag_settings.get("include_document_locations", True),
+                    per_document_search=rag_settings.get("per_document_search", False),
+                    answer_rerank_weight=rag_settings.get("answer_rerank_weight", 0.2)
+                )
+                rag_context = pack_rag_context(
+                    rag_context,
+                    FEEDBACK_CONTEXT_TOKEN_BUDGET,
+                    include_document_locations=rag_settings.get("include_document_locations", True)
+                )
+                logger.info(f"✅ RAG context retrieved: has_context={rag_context.get('has_context', False)}")
+                if rag_context and rag_context.get('has_context'):
+                    logger.info(f"   📚 Sources: {rag_context.get('sources', [])}")
+                    logger.info(f"   📄 Chunks: {len(rag_context.get('chunks', []))}")
+                else:
+                    logger.warning(f"⚠️  RAG returned no context")
+            except Exception as rag_error:
+                logger.error(f"❌ RAG retrieval failed: {str(rag_error)}")
+                logger.exception("Full RAG error traceback:")
+                rag_context = None
+        else:
+            logger.info(f"⏭️  Skipping RAG (should_include_context=False)")
+
+        return rag_context
+
+    def _analysis_steps(
+        self,
+        question: Question,
+        answer_data: Any,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None,
+        pregrade: Optional[Dict[str, Any]] = None
+    ) -> ChatSteps:
+        """Analyzer generator for an answer, picked by question type (`pregrade` from _pregrade, short/long only)"""
+        if question.type == 'mcq':
+            return self._analyze_mcq_answer(
+                student_answer=self._extract_answer_text(answer_data),
+                question=question,
+                ai_model=ai_model,
+                rubric=rubric,
+                rag_context=rag_context
+            )
+        if question.type == 'mcq_multiple':
+            return self._analyze_mcq_multiple_answer(
+                student_answer=answer_data if isinstance(answer_data, dict) else {},
+                question=question,
+                ai_model=ai_model,
+                rubric=rubric,
+                rag_context=rag_context
+            )
+        if question.type == 'fill_blank':
+            return self._analyze_fill_blank_answer(
+                student_answer=answer_data,
+                question=question,
+                ai_model=ai_model,
+                rubric=rubric,
+                rag_context=rag_context
+            )
+        if question.type == 'multi_part':
+            return self._analyze_multi_part_answer(
+                student_answer=answer_data,
+                question=question,
+                ai_model=ai_model,
+                rubric=rubric,
+                rag_context=rag_context
+            )
+        # Default to text answer for short/long types
+        return self._analyze_text_answer(
+            student_answer=self._extract_answer_text(answer_data),
+            question=question,
+            ai_model=ai_model,
+            rubric=rubric,
+            rag_context=rag_context,
+            pregrade=pregrade
+        )
+
+    def deterministic_grade(self, question: Question, answer_data: Any, rubric: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Grade of an objective answer computed without any LLM call
+
+        Returns:
+            Dict with is_correct, correctness_score, points_earned, points_possible,
+            criterion_scores and confidence_level (same values the full feedback
+            will carry), or None if the answer can't be graded locally - not an
+            objective type, no correct answer configured, or fill-blank answers
+            that need the AI semantic check
+        """
+        from app.services.question_grading import QuestionGradingService
+
+        if question.type == 'mcq':
+            is_correct = self._mcq_is_correct(self._extract_answer_text(answer_data), question)
+            if is_correct is None:
+                return None
+            percentage = 100 if is_correct else 0
+        elif question.type == 'mcq_multiple':
+            grading_result = self._grade_mcq_multiple(answer_data if isinstance(answer_data, dict) else {}, question, rubric)
+            if grading_result is None:
+                return None
+            is_correct, percentage = grading_result['is_correct'], grading_result['score']
+        elif question.type == 'fill_blank':
+            blank_configs = (question.extended_config or {}).get('blanks', [])
+            if not blank_configs or not isinstance(answer_data, dict):
+                return None
+            steps = QuestionGradingService().fill_blank_grading_steps(self._fill_blank_answers(answer_data), blank_configs)
+            try:
+                next(steps)
+            except StopIteration as done:
+                grading_result = done.value
+            else:
+                # Some blanks need the AI semantic check
+                steps.close()
+                return None
+            is_correct, percentage = grading_result['is_correct'], grading_result['percentage']
+        else:
+            return None
+
+        return {
+            "is_correct": is_correct,
+            "correctness_score": int(percentage),
+            "points_earned": round((percentage / 100.0) * question.points, 2),
+            "points_possible": question.points,
+            "criterion_scores": {},
+            "confidence_level": "high"
+        }
+
+    def store_deterministic_grades(self, db: Session, answers: List[StudentAnswer]) -> List[Any]:
+        """
+        Store the grade of every objective answer in a submission before its feedback is generated
+
+        The feedback rows move to generation_stage 'graded' (narrative pending),
+        so students see correctness and points immediately.
+
+        Returns:
+            IDs of the answers that were graded
+        """
+        if not answers:
+            return []
+
+        questions = {
+            question.id: question
+            for question in db.query(Question).filter(
+                Question.id.in_({answer.question_id for answer in answers}),
+                Question.type.in_(OBJECTIVE_QUESTION_TYPES)
+            ).all()
+        }
+
+        rubrics: Dict[str, Dict[str, Any]] = {}
+        grades: Dict[Any, Dict[str, Any]] = {}
+        for answer in answers:
+            question = questions.get(answer.question_id)
+            if question is None:
+                continue
+            module_id = str(answer.module_id)
+            if module_id not in rubrics:
+                rubrics[module_id] = get_module_rubric(db, module_id)
+            grade = self.deterministic_grade(question, answer.answer, rubrics[module_id])
+            if grade is not None:
+                grades[answer.id] = grade
+
+        graded = save_feedback_grades(db, grades)
+        for answer in answers:
+            if answer.id in graded:
+                publish_answer_status(
+                    answer.student_id, answer.module_id, answer.attempt, answer.id, answer.question_id,
+                    'pending', grade=grades[answer.id]
+                )
+
+        logger.info(f"⚡ Stored {len(graded)} deterministic grades ahead of narrative feedback")
+        return graded
+
+    def _pregrade(self, question: Question, answer_data: Any, rubric: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Embedding pre-grade of a short/long answer (see app.services.text_pregrade), or None"""
+        if not pregrade_enabled(question.type):
+            return None
+        return pregrade_text_answer(question.type, question.correct_answer, self._extract_answer_text(answer_data), rubric)
+
+    def _feedback_cache_key(
+        self,
+        question: Question,
+        answer_data: Any,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Feedback cache key for answers whose feedback can be shared across students
+
+        Returns:
+            (cache key, normalized answer), or (None, None) for answers that aren't cached
+        """
+        if question.type in ('mcq', 'mcq_multiple'):
+            return self._option_cache_key(question, answer_data, ai_model, rubric, rag_context)
+        if text_dedup_enabled(question.type):
+            return self._text_cache_key(question, answer_data, ai_model, rubric, rag_context)
+        return None, None
+
+    def _text_cache_key(
+        self,
+        question: Question,
+        answer_data: Any,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Feedback cache key for a short / long answer
+
+        Returns:
+            (cache key, normalized answer), or (None, None) for blank answers
+        """
+        normalized = normalize_text_answer(self._extract_answer_text(answer_data))
+        if not normalized:
+            return None, None
+        return build_text_cache_key(question, normalized, rubric, ai_model, rag_context), normalized
+
+    def _option_cache_key(
+        self,
+        question: Question,
+        answer_data: Any,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
+        """
+        Feedback cache key for an mcq / mcq_multiple answer
+
+        Returns:
+            (cache key, normalized selection)
+        """
+        if question.type == 'mcq':
+            variant = normalize_mcq_option(self._extract_answer_text(answer_data), question.options)
+        else:
+            selected = answer_data.get('selected_options', []) if isinstance(answer_data, dict) else []
+            variant = normalize_mcq_selection(selected)
+
+        return build_option_cache_key(question.type, question, variant, rubric, ai_model, rag_context), variant
+
+    def _generate_option_feedback(
+        self,
+        db: Session,
+        question: Question,
+        answer_data: Any,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Feedback for mcq / mcq_multiple answers, served from the feedback cache when possible
+
+        The prompt for these types depends only on the selection (not on the student),
+        so results are cached per (question, selection, rubric, model, context).
+
+        Returns:
+            (feedback dict, whether it came from the cache)
+        """
+        cache_key, variant = self._option_cache_key(question, answer_data, ai_model, rubric, rag_context)
+        feedback = lookup_feedback(db, cache_key)
+        if feedback is not None:
+            logger.info(f"♻️ Reusing cached {question.type} feedback for question {question.id}, selection {variant}")
+            return feedback, True
+
+        question = detach_question(question)
+        self._release_connection(db)
+
+        feedback = run_chat_steps(
+            self._analysis_steps(question, answer_data, ai_model, rubric, rag_context),
+            self.client
+        )
+
+        save_feedback(db, cache_key, question, question.type, variant, ai_model, feedback)
+        return feedback, False
+
+    @staticmethod
+    def _release_connection(db: Session) -> None:
+        """
+        End the session's transaction so its pooled connection is returned
+        before a slow LLM call (the next query checks one out again)
+        """
+        db.commit()
+
+    def _build_feedback_data(
+        self,
+        feedback: Dict[str, Any],
+        ai_model: str,
+        rag_context: Optional[Dict[str, Any]],
+        from_cache: bool
+    ) -> Dict[str, Any]:
+        """feedback_data column contents for an analyzer result"""
+        return {
+            "explanation": feedback.get("explanation", ""),
+            "improvement_hint": feedback.get("improvement_hint"),
+            "concept_explanation": feedback.get("concept_explanation"),
+            "strengths": feedback.get("strengths"),
+            "weaknesses": feedback.get("weaknesses"),
+            "selected_option": feedback.get("selected_option"),
+            "correct_option": feedback.get("correct_option"),
+            "available_options": feedback.get("available_options"),
+            "model_used": ai_model,
+            "confidence_level": feedback.get("confidence_level", "medium"),
+            "feedback_type": feedback.get("feedback_type"),
+            "used_rag": rag_context is not None and rag_context.get("has_context", False),
+            "rag_sources": rag_context.get("sources", []) if rag_context and rag_context.get("has_context") else None,
+            "from_cache": from_cache,
+            "pregrade": feedback.get("pregrade")
+        }
+
     def _get_ai_model_from_module(self, module: Optional[Module]) -> str:
         """Extract AI model from module configuration or use default"""
         if not module or not module.assignment_config:
@@ -331,6 +685,25 @@ class AIFeedbackService:
 
         return str(answer_data)
     
+    def _mcq_is_correct(self, student_answer: str, question: Question) -> Optional[bool]:
+        """Whether an MCQ answer is correct (None when the question has no correct answer set)"""
+        correct_answer = question.correct_option_id or question.correct_answer
+        options = question.options or {}
+        if not correct_answer:
+            return None
+
+        # Handle both cases: student_answer could be the option letter (e.g., "A")
+        # or the option text (e.g., "one") due to legacy data
+        if student_answer and student_answer.upper() == correct_answer.upper():
+            # Direct match with option letter
+            return True
+        if options and student_answer:
+            # Check if student_answer matches the text of the correct option
+            correct_option_text = options.get(correct_answer, "").strip().lower()
+            if student_answer.strip().lower() == correct_option_text:
+                return True
+        return False
+
     def _analyze_mcq_answer(
         self,
         student_answer: str,
@@ -338,40 +711,20 @@ class AIFeedbackService:
         ai_model: str,
         rubric: Dict[str, Any],
         rag_context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Analyze multiple choice question answer with rubric and RAG support"""
+    ) -> ChatSteps:
+        """Analyze multiple choice question answer with rubric and RAG support (analyzer generator)"""
 
         # Get correct answer - check both fields (new correct_option_id and legacy correct_answer)
         correct_answer = question.correct_option_id or question.correct_answer
         options = question.options or {}
 
         # Handle missing correct answer - still provide feedback, just without correctness evaluation
-        has_correct_answer = bool(correct_answer)
-        if not has_correct_answer:
+        if not correct_answer:
             logger.warning(f"⚠️  Question {question.id} has no correct answer set - will provide general feedback only")
-            is_correct = None  # Unknown correctness
-        else:
-            # Check if answer is correct
-            # Handle both cases: student_answer could be the option letter (e.g., "A")
-            # or the option text (e.g., "one") due to legacy data
-            is_correct = False
-            if student_answer and student_answer.upper() == correct_answer.upper():
-                # Direct match with option letter
-                is_correct = True
-            elif options and student_answer:
-                # Check if student_answer matches the text of the correct option
-                correct_option_text = options.get(correct_answer, "").strip().lower()
-                if student_answer.strip().lower() == correct_option_text:
-                    is_correct = True
-                # Also check if the correct_answer matches any option key that has this text
-                for key, value in options.items():
-                    if (student_answer.upper() == key.upper() and
-                        correct_answer.upper() == key.upper()):
-                        is_correct = True
-                        break
-
-        # Build dynamic prompt using rubric and RAG context
-        prompt = build_mcq_feedback_prompt(
+        is_correct = self._mcq_is_correct(student_answer, question)
+
+        # Build dynamic prompt using rubric and RAG context (static prefix + this student's answer)
+        messages = build_mcq_feedback_messages(
             question_text=question.text,
             options=options,
             student_answer=student_answer,
@@ -380,6 +733,7 @@ class AIFeedbackService:
             rubric=rubric,
             rag_context=rag_context
         )
+        prompt_tokens = count_prompt_tokens(messages)
 
         # 🎯 LOG: OpenAI API call details
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -388,27 +742,25 @@ class AIFeedbackService:
         logger.info(f"📤 Temperature: 0.3")
         logger.info(f"📤 Max Tokens: 800")
         logger.info(f"📤 Question ID: {question.id}")
+        logger.info(f"📤 Prompt Tokens: {prompt_tokens}")
         logger.info(f"📤 Student Answer: {student_answer}")
         logger.info(f"📤 Correct Answer: {correct_answer}")
         logger.info(f"📤 Is Correct: {is_correct}")
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
         logger.info("📤 FULL PROMPT SENT TO OPENAI:")
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        logger.info(prompt)
+        for message in messages:
+            logger.info(f"[{message['role']}]\n{message['content']}")
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
 
         try:
-            # Use the new retry-enabled client
-            response = self.client.create_chat_completion(
-                messages=[{"role": "user", "content": prompt}],
+            feedback_text = yield ChatCompletionRequest(
+                messages=messages,
                 model=ai_model,
                 temperature=0.3,
                 max_tokens=800  # Increased for RAG-enhanced feedback
             )
 
-            # Parse JSON response
-            feedback_text = response.choices[0].message.content.strip()
-
             # 🎯 LOG: OpenAI response
             logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
             logger.info("✅ OPENAI RESPONSE RECEIVED")
@@ -417,14 +769,7 @@ class AIFeedbackService:
             logger.info(feedback_text)
             logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
 
-            # Handle markdown code blocks if present
-            if feedback_text.startswith("```"):
-                feedback_text = feedback_text.split("```")[1]
-                if feedback_text.startswith("json"):
-                    feedback_text = feedback_text[4:]
-                feedback_text = feedback_text.strip()
-
-            feedback = json.loads(feedback_text)
+            feedback = self._parse_json_reply(feedback_text)
 
             # For MCQ, score is binary: correct=100% or incorrect=0%
             # Don't use rubric-based criterion scores for MCQ
@@ -449,7 +794,8 @@ class AIFeedbackService:
                 "points_possible": question.points,
                 "criterion_scores": {},  # MCQ uses binary grading, not rubric
                 "confidence_level": confidence,
-                "correctness_score": correctness_score
+                "correctness_score": correctness_score,
+                "prompt_tokens": prompt_tokens
             })
 
             # 🎯 LOG: Parsed feedback
@@ -457,7 +803,7 @@ class AIFeedbackService:
             logger.info("💾 PARSED FEEDBACK DATA:")
             logger.info(f"   ✓ is_correct: {feedback.get('is_correct')}")
             logger.info(f"   ✓ correctness_score: {correctness_score}%")
-            logger.info(f"   ✓ points_earned: {points_earned:.2f if points_earned else 0} / {question.points}")
+            logger.info(f"   ✓ points_earned: {(points_earned or 0):.2f} / {question.points}")
             logger.info(f"   ✓ confidence: {confidence}")
             logger.info(f"   ✓ explanation: {feedback.get('explanation', '')[:100]}...")
             logger.info(f"   ✓ improvement_hint: {feedback.get('improvement_hint', '')[:100]}...")
@@ -484,20 +830,26 @@ class AIFeedbackService:
         question: Question,
         ai_model: str,
         rubric: Dict[str, Any],
-        rag_context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Analyze text-based (short/essay) question answer with rubric and RAG support"""
+        rag_context: Optional[Dict[str, Any]] = None,
+        pregrade: Optional[Dict[str, Any]] = None
+    ) -> ChatSteps:
+        """Analyze text-based (short/essay) question answer with rubric and RAG support (analyzer generator)"""
 
         correct_answer = question.correct_answer or "No reference answer provided"
         question_type = question.type
 
+        # A clear pre-grade result stands on its own; anything else gets the full analysis
+        if pregrade is not None and not pregrade['escalate']:
+            logger.info(f"📏 Question {question.id}: pre-grade is final ({pregrade['band']}), skipping LLM analysis")
+            return self._pregraded_text_feedback(student_answer, correct_answer, question, pregrade)
+
         # Check if we have a reference answer to compare against
         has_reference = question.correct_answer and question.correct_answer.strip()
         if not has_reference:
             logger.warning(f"⚠️  Question {question.id} has no reference answer set - will provide general feedback only")
 
-        # Build dynamic prompt using rubric and RAG context
-        prompt = build_text_feedback_prompt(
+        # Build dynamic prompt using rubric and RAG context (static prefix + this student's answer)
+        messages = build_text_feedback_messages(
             question_text=question.text,
             question_type=question_type,
             student_answer=student_answer,
@@ -505,6 +857,7 @@ class AIFeedbackService:
             rubric=rubric,
             rag_context=rag_context
         )
+        prompt_tokens = count_prompt_tokens(messages)
 
         # 🎯 LOG: OpenAI API call details
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -513,25 +866,23 @@ class AIFeedbackService:
         logger.info(f"📤 Temperature: 0.3")
         logger.info(f"📤 Max Tokens: 1200")
         logger.info(f"📤 Question ID: {question.id}")
+        logger.info(f"📤 Prompt Tokens: {prompt_tokens}")
         logger.info(f"📤 Student Answer Length: {len(student_answer)} chars")
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
         logger.info("📤 FULL PROMPT SENT TO OPENAI:")
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        logger.info(prompt)
+        for message in messages:
+            logger.info(f"[{message['role']}]\n{message['content']}")
         logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
 
         try:
-            # Use the new retry-enabled client
-            response = self.client.create_chat_completion(
-                messages=[{"role": "user", "content": prompt}],
+            feedback_text = yield ChatCompletionRequest(
+                messages=messages,
                 model=ai_model,
                 temperature=0.3,
                 max_tokens=1200  # Increased for detailed RAG-enhanced feedback
             )
 
-            # Parse JSON response
-            feedback_text = response.choices[0].message.content.strip()
-
             # 🎯 LOG: OpenAI response
             logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
             logger.info("✅ OPENAI RESPONSE RECEIVED")
@@ -540,14 +891,7 @@ class AIFeedbackService:
             logger.info(feedback_text)
             logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
 
-            # Handle markdown code blocks if present
-            if feedback_text.startswith("```"):
-                feedback_text = feedback_text.split("```")[1]
-                if feedback_text.startswith("json"):
-                    feedback_text = feedback_text[4:]
-                feedback_text = feedback_text.strip()
-
-            feedback = json.loads(feedback_text)
+            feedback = self._parse_json_reply(feedback_text)
 
             # ⭐ NEW: Extract criterion scores and calculate points
             criterion_scores = feedback.get('criterion_scores', {})
@@ -573,9 +917,13 @@ class AIFeedbackService:
                 "points_possible": question.points,
                 "criterion_scores": criterion_scores,
                 "confidence_level": confidence,
-                "correctness_score": int(total_percentage) if total_percentage is not None else None
+                "correctness_score": int(total_percentage) if total_percentage is not None else None,
+                "prompt_tokens": prompt_tokens
             })
 
+            if pregrade is not None:
+                feedback["pregrade"] = pregrade
+
             # 🎯 LOG: Parsed feedback
             logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
             logger.info("💾 PARSED FEEDBACK DATA:")
@@ -604,6 +952,11 @@ class AIFeedbackService:
             logger.error(f"OpenAI API error: {str(e)}")
             return self._fallback_text_feedback(student_answer, correct_answer, question.type, question.points)
     
+    @staticmethod
+    def _parse_json_reply(reply_text: str) -> Dict[str, Any]:
+        """Parse a JSON reply, stripping a markdown code fence if the model added one"""
+        return parse_json_reply(reply_text)
+
     def _format_options(self, options: Dict[str, str]) -> str:
         """Format MCQ options for prompt"""
         formatted = []
@@ -675,6 +1028,36 @@ class AIFeedbackService:
             "fallback": True
         }
     
+    def _pregraded_text_feedback(
+        self,
+        student_answer: str,
+        correct_answer: str,
+        question: Question,
+        pregrade: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Feedback for a text answer the embedding pre-grade found clearly correct"""
+        correctness_score = pregrade['provisional_score']
+        points_earned = (correctness_score / 100.0) * question.points
+
+        return {
+            "is_correct": True,
+            "correctness_score": correctness_score,
+            "points_earned": round(points_earned, 2),
+            "points_possible": question.points,
+            "criterion_scores": {},  # Pre-grade is similarity-based, not criterion-based
+            "confidence_level": "medium",
+            "feedback_type": question.type,
+            "explanation": "Your answer closely matches the expected answer and covers the key idea.",
+            "strengths": ["Answer matches the expected answer"],
+            "weaknesses": [],
+            "improvement_hint": None,
+            "concept_explanation": "",
+            "missing_concepts": [],
+            "answer_length": len(student_answer),
+            "reference_answer": correct_answer,
+            "pregrade": pregrade
+        }
+
     def _error_response(self, message: str) -> Dict[str, Any]:
         """Generate error response"""
         return {
@@ -688,6 +1071,11 @@ class AIFeedbackService:
             "confidence_level": "low"
         }
 
+    @staticmethod
+    def _fill_blank_answers(student_answer: Dict[str, Any]) -> Dict[int, str]:
+        """Blank position -> answer (positions arrive as string keys from JSON)"""
+        return {int(key): value for key, value in student_answer.get('blanks', {}).items()}
+
     def _analyze_fill_blank_answer(
         self,
         student_answer: Dict[str, Any],
@@ -695,8 +1083,8 @@ class AIFeedbackService:
         ai_model: str,
         rubric: Dict[str, Any],
         rag_context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Analyze fill-in-the-blank question answer with AI semantic matching"""
+    ) -> ChatSteps:
+        """Analyze fill-in-the-blank question answer with AI semantic matching (analyzer generator)"""
         from app.services.question_grading import QuestionGradingService
 
         # Get extended config with blank configurations
@@ -709,16 +1097,11 @@ class AIFeedbackService:
 
         # Extract student answers from answer data
         # Format: {"blanks": {0: "answer1", 1: "answer2", ...}}
-        student_blanks = student_answer.get('blanks', {})
+        student_blanks_int = self._fill_blank_answers(student_answer)
 
-        # Convert string keys to int if needed
-        student_blanks_int = {}
-        for key, value in student_blanks.items():
-            student_blanks_int[int(key)] = value
-
-        # Grade using the grading service
+        # Grade using the grading service (non-exact blanks are checked in one batched request)
         grading_service = QuestionGradingService()
-        grading_result = grading_service.grade_fill_blank(
+        grading_result = yield from grading_service.fill_blank_grading_steps(
             student_answers=student_blanks_int,
             blank_configs=blank_configs,
             use_ai_semantic_matching=True
@@ -777,24 +1160,14 @@ Example of BAD feedback (too generic - AVOID THIS):
 Make your feedback detailed, contextual, and helpful!"""
 
         try:
-            response = self.client.chat.completions.create(
-                model=ai_model,
+            feedback_text = yield ChatCompletionRequest(
                 messages=[{"role": "user", "content": prompt}],
+                model=ai_model,
                 temperature=0.4,
                 max_tokens=600
             )
 
-            # Parse JSON response
-            feedback_text = response.choices[0].message.content.strip()
-
-            # Handle markdown code blocks if present
-            if feedback_text.startswith("```"):
-                feedback_text = feedback_text.split("```")[1]
-                if feedback_text.startswith("json"):
-                    feedback_text = feedback_text[4:]
-                feedback_text = feedback_text.strip()
-
-            feedback_json = json.loads(feedback_text)
+            feedback_json = self._parse_json_reply(feedback_text)
 
             # Calculate points from percentage score
             percentage_score = grading_result['percentage']
@@ -856,20 +1229,20 @@ Make your feedback detailed, contextual, and helpful!"""
                 "fallback": True
             }
 
-    def _analyze_mcq_multiple_answer(
+    def _grade_mcq_multiple(
         self,
         student_answer: Dict[str, Any],
         question: Question,
-        ai_model: str,
-        rubric: Dict[str, Any],
-        rag_context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Analyze multiple-correct MCQ answer"""
+        rubric: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Algorithmic grade of a multiple-correct MCQ answer (None if no correct options are configured)"""
         from app.services.question_grading import QuestionGradingService
 
         # Get extended config
         extended_config = question.extended_config or {}
         correct_option_ids = extended_config.get('correct_option_ids', [])
+        if not correct_option_ids:
+            return None
 
         # Get grading settings from rubric first, then fall back to question config
         question_type_settings = rubric.get('question_type_settings', {}).get('mcq_multiple', {})
@@ -878,6 +1251,26 @@ Make your feedback detailed, contextual, and helpful!"""
         # Teacher controls whether wrong answers are penalized
         penalty_for_wrong = question_type_settings.get('penalty_for_wrong', extended_config.get('penalty_for_wrong', True))
 
+        # Grade using the grading service
+        grading_service = QuestionGradingService()
+        return grading_service.grade_mcq_multiple(
+            selected_options=student_answer.get('selected_options', []),
+            correct_option_ids=correct_option_ids,
+            total_options=len(question.options or {}),
+            partial_credit=partial_credit,
+            penalty_for_wrong=penalty_for_wrong
+        )
+
+    def _analyze_mcq_multiple_answer(
+        self,
+        student_answer: Dict[str, Any],
+        question: Question,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None
+    ) -> ChatSteps:
+        """Analyze multiple-correct MCQ answer (analyzer generator)"""
+        correct_option_ids = (question.extended_config or {}).get('correct_option_ids', [])
         if not correct_option_ids:
             logger.error(f"MCQ-multiple question {question.id} has no correct options configured")
             return self._error_response("Question configuration error")
@@ -887,15 +1280,7 @@ Make your feedback detailed, contextual, and helpful!"""
         selected_options = student_answer.get('selected_options', [])
         options = question.options or {}
 
-        # Grade using the grading service
-        grading_service = QuestionGradingService()
-        grading_result = grading_service.grade_mcq_multiple(
-            selected_options=selected_options,
-            correct_option_ids=correct_option_ids,
-            total_options=len(options),
-            partial_credit=partial_credit,
-            penalty_for_wrong=penalty_for_wrong
-        )
+        grading_result = self._grade_mcq_multiple(student_answer, question, rubric)
 
         # Build feedback prompt (no rubric for MCQ - just correctness)
         selected_text = ", ".join([f"{opt}: {options.get(opt, '')}" for opt in selected_options])
@@ -948,24 +1333,14 @@ Example of BAD feedback (too generic - AVOID THIS):
 Make your feedback detailed, contextual, and helpful!"""
 
         try:
-            response = self.client.chat.completions.create(
-                model=ai_model,
+            feedback_text = yield ChatCompletionRequest(
                 messages=[{"role": "user", "content": prompt}],
+                model=ai_model,
                 temperature=0.4,
                 max_tokens=700
             )
 
-            # Parse JSON response
-            feedback_text = response.choices[0].message.content.strip()
-
-            # Handle markdown code blocks if present
-            if feedback_text.startswith("```"):
-                feedback_text = feedback_text.split("```")[1]
-                if feedback_text.startswith("json"):
-                    feedback_text = feedback_text[4:]
-                feedback_text = feedback_text.strip()
-
-            feedback_json = json.loads(feedback_text)
+            feedback_json = self._parse_json_reply(feedback_text)
 
             # Use algorithmic grading score (no rubric for MCQ)
             percentage_score = grading_result['score']
@@ -1061,8 +1436,10 @@ Make your feedback detailed, contextual, and helpful!"""
         ai_model: str,
         rubric: Dict[str, Any],
         rag_context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Analyze multi-part question answer"""
+    ) -> ChatSteps:
+        """Analyze multi-part question answer (analyzer generator)"""
+        from app.services.question_grading import QuestionGradingService
+
         # Get extended config with sub-questions
         extended_config = question.extended_config or {}
         sub_questions = extended_config.get('sub_questions', [])
@@ -1075,6 +1452,26 @@ Make your feedback detailed, contextual, and helpful!"""
         # Format: {"sub_answers": {"1a": "answer", "1b": {"selected_option": "A"}, ...}}
         sub_answers = student_answer.get('sub_answers', {})
 
+        # Text sub-questions are graded by the AI against their correct answer,
+        # all in one batched request before the feedback narrative
+        text_sub_answers = {}
+        for sub_q in sub_questions:
+            if sub_q['type'] not in ['short', 'long']:
+                continue
+            correct_answer = sub_q.get('correct_answer', '')
+            student_sub_answer = sub_answers.get(sub_q['id'], "")
+            student_text = student_sub_answer if isinstance(student_sub_answer, str) else str(student_sub_answer)
+            if correct_answer and student_text:
+                text_sub_answers[sub_q['id']] = {
+                    "question": sub_q.get('text', ''),
+                    "correct_answer": correct_answer,
+                    "student_answer": student_text
+                }
+
+        grading_replies = {}
+        if text_sub_answers:
+            grading_replies = yield from QuestionGradingService().text_sub_answer_grading_steps(text_sub_answers, ai_model)
+
         # Grade each sub-question
         sub_results = []
         total_points = 0.0
@@ -1096,44 +1493,16 @@ Make your feedback detailed, contextual, and helpful!"""
                 is_correct = selected.upper() == correct_option.upper() if selected and correct_option else False
                 sub_earned = sub_points if is_correct else 0.0
             elif sub_type in ['short', 'long']:
-                # Text sub-question - use AI to grade against correct answer
+                # Text sub-question - graded by AI against correct answer
                 correct_answer = sub_q.get('correct_answer', '')
                 student_text = student_sub_answer if isinstance(student_sub_answer, str) else str(student_sub_answer)
 
-                if correct_answer and student_text:
-                    # Use AI to grade text answer
+                if sub_id in grading_replies:
                     try:
-                        grade_prompt = f"""Compare the student's answer to the correct answer and determine correctness.
+                        grade_result = grading_replies[sub_id]
+                        if isinstance(grade_result, Exception):
+                            raise grade_result
 
-Question: {sub_q.get('text', '')}
-Correct Answer: {correct_answer}
-Student Answer: {student_text}
-
-Respond in JSON format:
-{{
-    "is_correct": true/false,
-    "similarity_score": 0-100,
-    "reasoning": "brief explanation"
-}}"""
-
-                        response = self.client.chat.completions.create(
-                            model=ai_model,
-                            messages=[{"role": "user", "content": grade_prompt}],
-                            temperature=0.3,
-                            max_tokens=300
-                        )
-
-                        # Parse JSON response
-                        grade_text = response.choices[0].message.content.strip()
-
-                        # Handle markdown code blocks if present
-                        if grade_text.startswith("```"):
-                            grade_text = grade_text.split("```")[1]
-                            if grade_text.startswith("json"):
-                                grade_text = grade_text[4:]
-                            grade_text = grade_text.strip()
-
-                        grade_result = json.loads(grade_text)
                         is_correct = grade_result.get('is_correct', False)
                         similarity = grade_result.get('similarity_score', 0) / 100
 
@@ -1220,24 +1589,14 @@ Example of BAD feedback (too generic - AVOID THIS):
 Make your feedback detailed, contextual, and helpful!"""
 
         try:
-            response = self.client.chat.completions.create(
-                model=ai_model,
+            feedback_text = yield ChatCompletionRequest(
                 messages=[{"role": "user", "content": prompt}],
+                model=ai_model,
                 temperature=0.4,
                 max_tokens=700
             )
 
-            # Parse JSON response
-            feedback_text = response.choices[0].message.content.strip()
-
-            # Handle markdown code blocks if present
-            if feedback_text.startswith("```"):
-                feedback_text = feedback_text.split("```")[1]
-                if feedback_text.startswith("json"):
-                    feedback_text = feedback_text[4:]
-                feedback_text = feedback_text.strip()
-
-            feedback_json = json.loads(feedback_text)
+            feedback_json = self._parse_json_reply(feedback_text)
 
             # Calculate question-level points from percentage score
             question_points_earned = (score / 100.0) * question.points
@@ -1305,6 +1664,8 @@ Make your feedback detailed, contextual, and helpful!"""
             # Feedback content (may be None if still generating)
             "is_correct": feedback_model.is_correct,
             "correctness_score": feedback_model.score,
+            "points_earned": feedback_model.points_earned,
+            "points_possible": feedback_model.points_possible,
             "explanation": data.get("explanation", ""),
             "improvement_hint": data.get("improvement_hint"),
             "concept_explanation": data.get("concept_explanation"),
@@ -1321,6 +1682,7 @@ Make your feedback detailed, contextual, and helpful!"""
 
             # Status tracking (NEW)
             "generation_status": feedback_model.generation_status,
+            "generation_stage": feedback_model.generation_stage,
             "generation_progress": feedback_model.generation_progress,
             "error_message": feedback_model.error_message,
             "error_type": feedback_model.error_type,
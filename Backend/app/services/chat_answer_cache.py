@@ -0,0 +1,251 @@
+"""
+Semantic answer cache for the AI tutor
+Students in a module keep asking the tutor the same things. When a module opts
+in (chatbot_feedback.answer_cache, default CHAT_ANSWER_CACHE_ENABLED), the
+first question of a conversation is embedded and compared with earlier first
+questions of the module; above CHAT_ANSWER_CACHE_SIMILARITY the stored answer
+and its sources are returned without calling the model.
+
+Entries are stored under a module version (embedded documents, chatbot
+instructions, chat and embedding model), so editing any of those stops old
+answers from being served on every instance. Lookups search an in-process
+matrix of the module's question embeddings, like app.services.vector_index.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+from typing import Dict, Any, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    EMBED_MODEL,
+    CHAT_ANSWER_CACHE_ENABLED,
+    CHAT_ANSWER_CACHE_SIMILARITY,
+    CHAT_ANSWER_CACHE_MAX_PER_MODULE,
+    CHAT_ANSWER_CACHE_MAX_MODULES,
+    CHAT_ANSWER_CACHE_TTL_SECONDS
+)
+from app.crud import chat_answer_cache as answer_crud
+from app.database import SessionLocal
+from app.models.module import Module
+from app.services.embedding import generate_embedding
+from app.services.rag_retriever import get_document_set_version
+from app.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# (module_id, module_version) -> (normalized question matrix, entry ids)
+_answer_indexes = LRUCache(max_entries=CHAT_ANSWER_CACHE_MAX_MODULES, ttl_seconds=CHAT_ANSWER_CACHE_TTL_SECONDS)
+
+_COUNTER_NAMES = ('lookups', 'hits', 'misses', 'stores', 'errors', 'saved_ms')
+_counters_lock = threading.Lock()
+_module_counters: Dict[str, Dict[str, int]] = {}
+
+
+def _count(module_id: str, name: str, amount: int = 1) -> None:
+    with _counters_lock:
+        counters = _module_counters.setdefault(module_id, dict.fromkeys(_COUNTER_NAMES, 0))
+        counters[name] += amount
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize a vector or each row of a matrix"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def normalize_question(question: str) -> str:
+    """NFKC with whitespace collapsed, so trivial variations embed identically"""
+    return " ".join(unicodedata.normalize("NFKC", question or "").split())
+
+
+def answer_cache_enabled(module: Module) -> bool:
+    chatbot_config = (module.assignment_config or {}).get("features", {}).get("chatbot_feedback", {})
+    return chatbot_config.get("enabled", True) and bool(chatbot_config.get("answer_cache", CHAT_ANSWER_CACHE_ENABLED))
+
+
+def get_module_version(db: Session, module: Module, ai_model: str) -> str:
+    """Fingerprint of everything a module's tutor answers depend on"""
+    return hashlib.sha256(json.dumps([
+        get_document_set_version(db, str(module.id)),
+        module.chatbot_instructions or "",
+        ai_model,
+        EMBED_MODEL
+    ]).encode("utf-8")).hexdigest()
+
+
+def _get_index(db: Session, module_id: str, module_version: str) -> tuple:
+    key = (module_id, module_version)
+    index = _answer_indexes.get(key)
+    if index is None:
+        rows = answer_crud.get_module_answers(db, module_id, module_version)
+        if rows:
+            matrix = _normalize(np.asarray([row.question_embedding for row in rows], dtype=np.float32))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        index = (matrix, [row.id for row in rows])
+        _answer_indexes.set(key, index)
+    return index
+
+
+def lookup_answer(db: Session, module_id: str, question: str) -> Optional[Dict[str, Any]]:
+    """
+    Look for a cached answer to the first question of a conversation
+
+    Returns:
+        None if the module doesn't use the cache (or the lookup failed), else
+        a hit: {'hit': True, 'response', 'context_used', 'similarity', 'saved_ms'}
+        or a miss to pass to store_answer() once the answer is generated:
+        {'hit': False, 'module_id', 'module_version', 'question', 'embedding'}
+    """
+    module_key = str(module_id)
+    started = time.monotonic()
+    try:
+        module = db.query(Module).filter(Module.id == module_id).first()
+        if module is None or not answer_cache_enabled(module):
+            return None
+
+        chatbot_config = module.assignment_config.get("features", {}).get("chatbot_feedback", {})
+        module_version = get_module_version(db, module, chatbot_config.get("ai_model", "gpt-4"))
+        normalized = normalize_question(question)
+        embedding = generate_embedding(normalized)['embedding']
+
+        matrix, entry_ids = _get_index(db, module_key, module_version)
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        entry = None
+        similarity = 0.0
+        if entry_ids and matrix.shape[1] == query.shape[0]:
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity >= CHAT_ANSWER_CACHE_SIMILARITY:
+                entry = answer_crud.get_answer(db, entry_ids[best])
+
+        _count(module_key, 'lookups')
+        if entry is None:
+            _count(module_key, 'misses')
+            return {
+                'hit': False,
+                'module_id': module_key,
+                'module_version': module_version,
+                'question': normalized,
+                'embedding': embedding
+            }
+
+        answer_crud.record_answer_hit(db, entry.id)
+        saved_ms = max(0, (entry.generation_ms or 0) - int((time.monotonic() - started) * 1000))
+        _count(module_key, 'hits')
+        _count(module_key, 'saved_ms', saved_ms)
+        logger.info(f"💬 Tutor answer cache hit for module {module_key} (similarity {similarity:.3f}, ~{saved_ms}ms saved)")
+        return {
+            'hit': True,
+            'response': entry.answer,
+            'context_used': entry.context_used,
+            'similarity': similarity,
+            'saved_ms': saved_ms
+        }
+
+    except Exception as e:
+        db.rollback()
+        _count(module_key, 'errors')
+        logger.warning(f"⚠️ Tutor answer cache lookup failed: {str(e)}")
+        return None
+
+
+def store_answer(
+    miss: Dict[str, Any],
+    response: str,
+    context_used: Optional[Dict[str, Any]],
+    generation_ms: int
+) -> None:
+    """
+    Save a freshly generated first answer under the miss returned by lookup_answer()
+
+    Uses its own session so it also works after a streamed reply. Never raises.
+    """
+    module_id = miss['module_id']
+    db = SessionLocal()
+    try:
+        if answer_crud.count_module_answers(db, module_id, miss['module_version']) >= CHAT_ANSWER_CACHE_MAX_PER_MODULE:
+            return
+
+        entry = answer_crud.store_answer(
+            db,
+            module_id=module_id,
+            module_version=miss['module_version'],
+            question=miss['question'],
+            question_embedding=miss['embedding'],
+            answer=response,
+            context_used=context_used,
+            generation_ms=generation_ms
+        )
+        _count(module_id, 'stores')
+
+        # Add it to this process's index (other instances pick it up on reload)
+        key = (module_id, miss['module_version'])
+        index = _answer_indexes.get(key)
+        if index is not None:
+            matrix, entry_ids = index
+            row = _normalize(np.asarray([miss['embedding']], dtype=np.float32))
+            matrix = np.vstack([matrix, row]) if entry_ids else row
+            _answer_indexes.set(key, (matrix, entry_ids + [entry.id]))
+
+    except Exception as e:
+        db.rollback()
+        _count(module_id, 'errors')
+        logger.warning(f"⚠️ Tutor answer cache write failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def invalidate_module_answers(db: Session, module_id: str) -> int:
+    """
+    Delete a module's cached answers (call when its documents or chatbot instructions change)
+
+    Returns count of deleted entries; failures are logged, not raised.
+    """
+    _answer_indexes.discard_where(lambda key: key[0] == str(module_id))
+    try:
+        deleted = answer_crud.delete_module_answers(db, module_id)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ Failed to clear tutor answer cache for module {module_id}: {str(e)}")
+        return 0
+    if deleted:
+        logger.info(f"🧹 Cleared {deleted} cached tutor answers for module {module_id}")
+    return deleted
+
+
+def _with_rates(counters: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        **counters,
+        'hit_rate': round(counters['hits'] / counters['lookups'], 4) if counters['lookups'] else 0.0
+    }
+
+
+def get_chat_answer_cache_stats() -> Dict[str, Any]:
+    """Per-module hit rate and saved latency for this process"""
+    with _counters_lock:
+        modules = {module_id: dict(counters) for module_id, counters in _module_counters.items()}
+    return {
+        'default_enabled': CHAT_ANSWER_CACHE_ENABLED,
+        'similarity_threshold': CHAT_ANSWER_CACHE_SIMILARITY,
+        'modules': {module_id: _with_rates(counters) for module_id, counters in modules.items()},
+        'indexes': _answer_indexes.stats()
+    }
+
+
+def get_module_answer_cache_stats(db: Session, module_id: str) -> Dict[str, Any]:
+    """Stored entries and lifetime hits of a module plus this process's counters"""
+    with _counters_lock:
+        counters = dict(_module_counters.get(str(module_id)) or dict.fromkeys(_COUNTER_NAMES, 0))
+    return {
+        **answer_crud.get_module_answer_cache_summary(db, str(module_id)),
+        'process': _with_rates(counters)
+    }
@@ -0,0 +1,140 @@
+"""
+Rolling summaries of tutor conversations
+The tutor prompt carries a summary of the oldest messages plus the last
+CHAT_RECENT_TURNS turns verbatim, so prompt size stays flat however long a
+conversation gets. Once CHAT_SUMMARY_EVERY_TURNS turns have piled up between
+the summary and the verbatim tail, they are folded into the summary in the
+background after the reply is sent.
+"""
+import logging
+import threading
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    CHAT_RECENT_TURNS,
+    CHAT_SUMMARY_EVERY_TURNS,
+    CHAT_SUMMARY_MODEL,
+    CHAT_SUMMARY_MAX_TOKENS
+)
+from app.crud import chat as chat_crud
+from app.database import SessionLocal
+from app.models.chat_conversation import ChatConversation
+from app.models.chat_message import ChatMessage
+from app.services.openai_client import get_openai_client
+from app.services.openai_scheduler import openai_priority, OpenAIPriority
+
+logger = logging.getLogger(__name__)
+
+# Conversations being summarized in this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def summaries_enabled() -> bool:
+    return CHAT_SUMMARY_EVERY_TURNS > 0
+
+
+def load_chat_history(
+    db: Session,
+    conversation: ChatConversation,
+    exclude_latest: int = 0
+) -> Tuple[Optional[str], List[ChatMessage]]:
+    """
+    Summary and verbatim messages for the tutor prompt, with one bounded query
+
+    Args:
+        db: Database session
+        conversation: The conversation
+        exclude_latest: Newest messages to leave out (the question just saved)
+
+    Returns:
+        (summary or None, messages not covered by the summary, oldest first)
+    """
+    if not summaries_enabled():
+        recent = chat_crud.get_recent_messages(db, conversation.id, CHAT_RECENT_TURNS * 2 + exclude_latest)
+        return None, recent[:len(recent) - exclude_latest]
+
+    # Between refreshes up to CHAT_SUMMARY_EVERY_TURNS turns sit between the summary and the tail
+    unsummarized = chat_crud.get_message_count(db, conversation.id) - (conversation.summarized_message_count or 0)
+    limit = min(unsummarized, (CHAT_RECENT_TURNS + CHAT_SUMMARY_EVERY_TURNS) * 2 + exclude_latest)
+    recent = chat_crud.get_recent_messages(db, conversation.id, limit)
+    return conversation.summary, recent[:len(recent) - exclude_latest]
+
+
+def _summary_messages(previous_summary: Optional[str], messages: List[ChatMessage]) -> List[dict]:
+    transcript = "\n".join(
+        f"{'Student' if message.role == 'student' else 'Tutor'}: {message.content}"
+        for message in messages
+    )
+    prompt = (
+        "Update the running summary of a tutoring conversation with the new messages below.\n"
+        "Keep what the student asked, what was explained, what they still struggle with and any "
+        "commitments the tutor made. Write plain prose, at most 200 words, no preamble.\n\n"
+        f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    return [{"role": "user", "content": prompt}]
+
+
+def refresh_conversation_summary(conversation_id: UUID) -> bool:
+    """
+    Fold turns that have left the verbatim window into the conversation summary
+
+    Runs as a background task after a reply is saved; does nothing until
+    CHAT_SUMMARY_EVERY_TURNS turns are pending. Never raises.
+
+    Returns:
+        True if the summary was updated
+    """
+    if not summaries_enabled():
+        return False
+
+    key = str(conversation_id)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+
+    db = SessionLocal()
+    try:
+        conversation = chat_crud.get_conversation(db, conversation_id)
+        if conversation is None:
+            return False
+
+        previous_count = conversation.summarized_message_count or 0
+        foldable = chat_crud.get_message_count(db, conversation_id) - CHAT_RECENT_TURNS * 2 - previous_count
+        if foldable < CHAT_SUMMARY_EVERY_TURNS * 2:
+            return False
+
+        messages = chat_crud.get_message_range(db, conversation_id, previous_count, foldable)
+        previous_summary = conversation.summary
+        # Don't hold a connection while the summary is generated
+        db.commit()
+
+        with openai_priority(OpenAIPriority.BULK):
+            response = get_openai_client().create_chat_completion(
+                messages=_summary_messages(previous_summary, messages),
+                model=CHAT_SUMMARY_MODEL,
+                temperature=0.2,
+                max_tokens=CHAT_SUMMARY_MAX_TOKENS
+            )
+        summary = response.choices[0].message.content.strip()
+
+        stored = chat_crud.save_conversation_summary(
+            db, conversation_id, summary, previous_count + len(messages), previous_count
+        )
+        if stored:
+            logger.info(f"📝 Conversation {conversation_id} summary now covers {previous_count + len(messages)} messages")
+        return stored
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Failed to refresh summary of conversation {conversation_id}: {str(e)}")
+        return False
+    finally:
+        db.close()
+        with _refreshing_lock:
+            _refreshing.discard(key)
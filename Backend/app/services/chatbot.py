@@ -2,38 +2,75 @@
 AI Tutor Chatbot Service
 Provides context-aware responses using RAG (Retrieval-Augmented Generation)
 """
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy.orm import Session
-import openai
-import os
-
 from app.models.module import Module
 from app.models.chat_message import ChatMessage
+from app.core.config import CHAT_CONTEXT_TOKEN_BUDGET, CHAT_HISTORY_TOKEN_BUDGET
 from app.services.rag_retriever import get_context_for_feedback
+from app.services.openai_client import get_openai_client
+from app.services.context_packer import pack_rag_context, pack_history, count_prompt_tokens
+from app.services.chat_answer_cache import lookup_answer, store_answer
 
 
-def get_chatbot_response(
+# Shared client: retries, the process-wide rate-limit scheduler and connection pool
+client = get_openai_client()
+
+CHAT_TEMPERATURE = 0.7
+CHAT_MAX_TOKENS = 1000
+
+CHATBOT_DISABLED_MESSAGE = "The chatbot feature is currently disabled for this module. Please contact your instructor."
+CHATBOT_ERROR_MESSAGE = "I'm sorry, I encountered an error while processing your question. Please try again or contact your instructor if the problem persists."
+
+
+def lookup_first_answer(
     db: Session,
     module_id: str,
     student_question: str,
     conversation_history: List[ChatMessage],
-    student_id: str
-) -> Dict[str, Any]:
+    conversation_summary: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
     """
-    Generate AI tutor response using RAG and conversation history
+    Semantic answer cache lookup (see app.services.chat_answer_cache)
+
+    Only the first question of a conversation is answered from or stored in
+    the cache, since later answers depend on what was said before.
+    """
+    if conversation_history or conversation_summary:
+        return None
+    return lookup_answer(db, module_id, student_question)
+
+
+def prepare_chatbot_request(
+    db: Session,
+    module_id: str,
+    student_question: str,
+    conversation_history: List[ChatMessage],
+    conversation_summary: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Build the tutor prompt (module instructions, RAG context, summary, recent history)
+
+    Everything that needs the database happens here, so the completion itself
+    (blocking or streamed) can run without a session. Course material and
+    history are packed into CHAT_CONTEXT_TOKEN_BUDGET / CHAT_HISTORY_TOKEN_BUDGET.
 
     Args:
         db: Database session
         module_id: Module ID for context retrieval
         student_question: Student's question
-        conversation_history: Previous messages in conversation
-        student_id: Student ID
+        conversation_history: Messages not covered by the summary (see chat_summary.load_chat_history)
+        conversation_summary: Rolling summary of older messages, if any
 
     Returns:
         {
-            'response': str,  # AI response
-            'context_used': dict  # RAG context metadata
+            'ai_model': str,
+            'messages': list,  # OpenAI chat messages
+            'context_used': dict,  # RAG context metadata (None without context)
+            'prompt_tokens': int  # Size of the assembled prompt
         }
+        or None if the chatbot is disabled for the module
     """
     # Get module info
     module = db.query(Module).filter(Module.id == module_id).first()
@@ -46,10 +83,7 @@ def get_chatbot_response(
     chatbot_enabled = chatbot_config.get("enabled", True)
 
     if not chatbot_enabled:
-        return {
-            'response': "The chatbot feature is currently disabled for this module. Please contact your instructor.",
-            'context_used': None
-        }
+        return None
 
     # Get RAG context
     rag_context = get_context_for_feedback(
@@ -61,14 +95,16 @@ def get_chatbot_response(
         similarity_threshold=0.4,
         include_document_locations=True
     )
+    rag_context = pack_rag_context(rag_context, CHAT_CONTEXT_TOKEN_BUDGET)
 
     # Build conversation history for context
     history_messages = []
-    for msg in conversation_history[-10:]:  # Last 10 messages for context
+    for msg in conversation_history:
         history_messages.append({
             "role": "user" if msg.role == "student" else "assistant",
             "content": msg.content
         })
+    history_messages = pack_history(history_messages, CHAT_HISTORY_TOKEN_BUDGET)
 
     # Build system prompt - use teacher's custom instructions if available
     if module.chatbot_instructions and module.chatbot_instructions.strip():
@@ -100,11 +136,18 @@ Guidelines:
         system_prompt += f"\n\n{rag_context['formatted_context']}"
 
     # Prepare messages for OpenAI
-    messages = [
-        {"role": "system", "content": system_prompt},
+    messages = [{"role": "system", "content": system_prompt}]
+    if conversation_summary:
+        # Separate message so the system prompt stays a stable cacheable prefix
+        messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation with this student:\n{conversation_summary}"
+        })
+    messages += [
         *history_messages,
         {"role": "user", "content": student_question}
     ]
+    prompt_tokens = count_prompt_tokens(messages)
 
     # 🔍 LOG THE PROMPT BEING SENT TO AI
     print("\n" + "="*80)
@@ -113,6 +156,7 @@ Guidelines:
     print(f"📚 Module: {module_name}")
     print(f"🔧 Model: {ai_model}")
     print(f"👤 Student Question: {student_question}")
+    print(f"🔢 Prompt Tokens: {prompt_tokens}")
     print(f"\n📝 SYSTEM PROMPT:")
     print("-" * 80)
     print(system_prompt)
@@ -136,15 +180,84 @@ Guidelines:
         print(f"  [{i}] {msg['role']}: {msg['content'][:200]}...")
     print("="*80 + "\n")
 
+    # Prepare context metadata
+    context_metadata = None
+    if rag_context['has_context']:
+        context_metadata = {
+            'sources': rag_context['sources'],
+            'chunk_count': len(rag_context['chunks']),
+            'chunks': [
+                {
+                    'text_preview': chunk['text'][:100] + "..." if len(chunk['text']) > 100 else chunk['text'],
+                    'similarity': chunk['similarity'],
+                    'document_title': chunk.get('document_title', 'Unknown')
+                }
+                for chunk in rag_context['chunks']
+            ]
+        }
+
+    return {
+        'ai_model': ai_model,
+        'messages': messages,
+        'context_used': context_metadata,
+        'prompt_tokens': prompt_tokens
+    }
+
+
+def get_chatbot_response(
+    db: Session,
+    module_id: str,
+    student_question: str,
+    conversation_history: List[ChatMessage],
+    student_id: str,
+    conversation_summary: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Generate AI tutor response using RAG and conversation history
+
+    A module using the answer cache gets near-duplicate first questions
+    answered from it, without a model call.
+
+    Args:
+        db: Database session
+        module_id: Module ID for context retrieval
+        student_question: Student's question
+        conversation_history: Messages not covered by the summary
+        student_id: Student ID
+        conversation_summary: Rolling summary of older messages, if any
+
+    Returns:
+        {
+            'response': str,  # AI response
+            'context_used': dict,  # RAG context metadata
+            'prompt_tokens': int  # Prompt size (None if no call was made)
+        }
+    """
+    cache_lookup = lookup_first_answer(db, module_id, student_question, conversation_history, conversation_summary)
+    if cache_lookup and cache_lookup['hit']:
+        return {
+            'response': cache_lookup['response'],
+            'context_used': cache_lookup['context_used'],
+            'prompt_tokens': None
+        }
+
+    started = time.monotonic()
+    chat_request = prepare_chatbot_request(
+        db, module_id, student_question, conversation_history, conversation_summary
+    )
+    if chat_request is None:
+        return {
+            'response': CHATBOT_DISABLED_MESSAGE,
+            'context_used': None
+        }
+
     # Call OpenAI API
     try:
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-
-        response = openai.chat.completions.create(
-            model=ai_model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000
+        response = client.create_chat_completion(
+            model=chat_request['ai_model'],
+            messages=chat_request['messages'],
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=CHAT_MAX_TOKENS
         )
 
         ai_response = response.choices[0].message.content
@@ -154,35 +267,44 @@ Guidelines:
         print(f"{ai_response}")
         print("="*80 + "\n")
 
-        # Prepare context metadata
-        context_metadata = None
-        if rag_context['has_context']:
-            context_metadata = {
-                'sources': rag_context['sources'],
-                'chunk_count': len(rag_context['chunks']),
-                'chunks': [
-                    {
-                        'text_preview': chunk['text'][:100] + "..." if len(chunk['text']) > 100 else chunk['text'],
-                        'similarity': chunk['similarity'],
-                        'document_title': chunk.get('document_title', 'Unknown')
-                    }
-                    for chunk in rag_context['chunks']
-                ]
-            }
+        if cache_lookup:
+            store_answer(
+                cache_lookup, ai_response, chat_request['context_used'],
+                int((time.monotonic() - started) * 1000)
+            )
 
         return {
             'response': ai_response,
-            'context_used': context_metadata
+            'context_used': chat_request['context_used'],
+            'prompt_tokens': chat_request['prompt_tokens']
         }
 
     except Exception as e:
         print(f"❌ Chatbot error: {str(e)}")
         return {
-            'response': "I'm sorry, I encountered an error while processing your question. Please try again or contact your instructor if the problem persists.",
+            'response': CHATBOT_ERROR_MESSAGE,
             'context_used': None
         }
 
 
+def stream_chatbot_response(chat_request: Dict[str, Any]) -> Iterator[str]:
+    """
+    Stream the tutor's answer for a prepared request (see prepare_chatbot_request)
+
+    Yields:
+        Text deltas as they arrive from OpenAI
+
+    Raises:
+        Any OpenAI error (before or during the stream)
+    """
+    yield from client.stream_chat_completion(
+        model=chat_request['ai_model'],
+        messages=chat_request['messages'],
+        temperature=CHAT_TEMPERATURE,
+        max_tokens=CHAT_MAX_TOKENS
+    )
+
+
 def validate_message_content(content: str) -> bool:
     """Validate message content"""
     if not content or not content.strip():
@@ -0,0 +1,161 @@
+"""
+Token-budgeted prompt assembly
+Fits retrieved course material and chat history into a per-feature token
+budget (counted with tiktoken, see app.services.openai_scheduler) before a
+prompt is built:
+- adjacent chunks of the same document are merged, dropping the text they
+  share (documents are chunked with a 200-character overlap)
+- chunks are added most relevant first until the budget is spent; the first
+  one that doesn't fit is cut to the remaining budget
+- chat history keeps the most recent messages that fit
+"""
+import logging
+from typing import Dict, Any, List, Optional
+
+from app.services.openai_scheduler import estimate_tokens, estimate_chat_tokens, truncate_to_tokens
+from app.services.rag_retriever import format_context_for_prompt
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared text treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+# Longest overlap searched for (chunk_text uses 200; stripping can shift it slightly)
+MAX_OVERLAP_CHARS = 400
+# A chunk cut shorter than this isn't worth including
+MIN_CHUNK_TOKENS = 40
+
+
+def count_tokens(text: str) -> int:
+    return estimate_tokens(text)
+
+
+def count_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Prompt tokens of a chat request (message framing included)"""
+    return estimate_chat_tokens(messages, 0)
+
+
+def _overlap_length(first: str, second: str) -> int:
+    """Length of the longest end of `first` that `second` starts with"""
+    longest = min(len(first), len(second), MAX_OVERLAP_CHARS)
+    for length in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def merge_adjacent_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge chunks that follow each other in the same document, without their overlap
+
+    A merged chunk keeps the metadata of its first part and the best
+    similarity of its parts. Order follows each group's best chunk.
+    """
+    by_position = {}
+    for position, chunk in enumerate(chunks):
+        by_position[(chunk.get('document_id'), chunk.get('chunk_index'))] = position
+
+    merged: List[Dict[str, Any]] = []
+    consumed = set()
+    for position, chunk in enumerate(chunks):
+        if position in consumed:
+            continue
+        document_id, chunk_index = chunk.get('document_id'), chunk.get('chunk_index')
+        if document_id is None or chunk_index is None:
+            merged.append(chunk)
+            continue
+
+        # Walk back to the first chunk of the run, then forward to its end
+        start = chunk_index
+        while (document_id, start - 1) in by_position and by_position[(document_id, start - 1)] not in consumed:
+            start -= 1
+
+        group = dict(chunks[by_position[(document_id, start)]])
+        consumed.add(by_position[(document_id, start)])
+        index = start + 1
+        while (document_id, index) in by_position and by_position[(document_id, index)] not in consumed:
+            following = chunks[by_position[(document_id, index)]]
+            consumed.add(by_position[(document_id, index)])
+            text = following['text']
+            group['text'] = group['text'] + text[_overlap_length(group['text'], text):]
+            group['similarity'] = max(group['similarity'], following['similarity'])
+            index += 1
+        merged.append(group)
+
+    merged.sort(key=lambda item: item['similarity'], reverse=True)
+    return merged
+
+
+def pack_rag_context(
+    rag_context: Optional[Dict[str, Any]],
+    budget_tokens: int,
+    include_document_locations: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    Fit a retrieved context (see rag_retriever.get_context_for_feedback) into a token budget
+
+    Returns:
+        Context of the same shape, with merged/trimmed chunks, a rebuilt
+        formatted_context and 'context_tokens'; unchanged if there is none.
+        A budget <= 0 only merges overlapping chunks.
+    """
+    if not rag_context or not rag_context.get('has_context'):
+        return rag_context
+
+    candidates = merge_adjacent_chunks(rag_context['chunks'])
+    # Headers, source lines and citation instructions around the chunks
+    overhead = count_tokens(format_context_for_prompt([{**candidates[0], 'text': ''}], include_document_locations))
+
+    packed: List[Dict[str, Any]] = []
+    used = overhead
+    for chunk in candidates:
+        tokens = count_tokens(chunk['text']) + 15  # Source line
+        if budget_tokens <= 0 or used + tokens <= budget_tokens:
+            packed.append(chunk)
+            used += tokens
+            continue
+
+        remaining = budget_tokens - used - 15
+        if remaining >= MIN_CHUNK_TOKENS:
+            packed.append({**chunk, 'text': truncate_to_tokens(chunk['text'], remaining) + " …"})
+            used += remaining + 15
+        break
+
+    if not packed:
+        return {**rag_context, 'has_context': False, 'chunks': [], 'formatted_context': '', 'sources': [], 'context_tokens': 0}
+
+    formatted_context = format_context_for_prompt(packed, include_document_locations)
+    context_tokens = count_tokens(formatted_context)
+    original_tokens = count_tokens(rag_context.get('formatted_context', ''))
+    if context_tokens < original_tokens:
+        logger.info(f"📦 Packed RAG context: {len(rag_context['chunks'])} → {len(packed)} chunks, {original_tokens} → {context_tokens} tokens")
+
+    return {
+        **rag_context,
+        'chunks': packed,
+        'formatted_context': formatted_context,
+        'sources': list({chunk['document_title'] for chunk in packed}),
+        'context_tokens': context_tokens
+    }
+
+
+def pack_history(messages: List[Dict[str, str]], budget_tokens: int) -> List[Dict[str, str]]:
+    """
+    Most recent chat messages that fit in a token budget (oldest first)
+
+    A budget <= 0 keeps every message.
+    """
+    if budget_tokens <= 0:
+        return list(messages)
+
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for message in reversed(messages):
+        tokens = count_tokens(message['content']) + 4
+        if used + tokens > budget_tokens:
+            break
+        kept.append(message)
+        used += tokens
+
+    if len(kept) < len(messages):
+        logger.info(f"📦 Packed chat history: {len(messages)} → {len(kept)} messages ({used} tokens)")
+    return list(reversed(kept))
@@ -4,21 +4,31 @@ Generates vector embeddings for text chunks
 """
 import os
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
 from sqlalchemy.orm import Session
 
+from app.models.document import Document
 from app.models.document_chunk import DocumentChunk
-from app.crud.document_embedding import bulk_create_embeddings
-from app.core.config import OPENAI_API_KEY, EMBED_MODEL
+from app.crud.document_embedding import bulk_create_embeddings, similarity_search
+from app.services.embedding_cache import get_cached_embeddings, store_embeddings
+from app.services.vector_index import (
+    get_module_index,
+    build_index_from_rows,
+    load_embedding_rows,
+    invalidate_module_index
+)
+from app.services.openai_client import get_openai_client
+from app.services.openai_scheduler import openai_priority, OpenAIPriority
+from app.core.config import EMBED_MODEL, PGVECTOR_ENABLED
 
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Shared OpenAI client (retries, rate-limit scheduler, connection pool)
+client = get_openai_client()
 
 
 def generate_embedding(
     text: str,
-    model: str = None
+    model: str = None,
+    use_cache: bool = True
 ) -> Dict[str, Any]:
     """
     Generate embedding for a single text string
@@ -26,6 +36,7 @@ def generate_embedding(
     Args:
         text: Text to embed
         model: OpenAI embedding model (default: from EMBED_MODEL config)
+        use_cache: Check/populate the embedding cache (see app.services.embedding_cache)
 
     Returns:
         {
@@ -34,39 +45,25 @@ def generate_embedding(
             'tokens': int              # Tokens used
         }
     """
-    if model is None:
-        model = EMBED_MODEL
-
-    try:
-        response = client.embeddings.create(
-            input=text,
-            model=model
-        )
-
-        embedding_data = response.data[0]
-
-        return {
-            'embedding': embedding_data.embedding,
-            'dimensions': len(embedding_data.embedding),
-            'tokens': response.usage.total_tokens
-        }
-
-    except Exception as e:
-        print(f"❌ Error generating embedding: {str(e)}")
-        raise
+    return generate_embeddings_batch([text], model=model, use_cache=use_cache)[0]
 
 
 def generate_embeddings_batch(
     texts: List[str],
-    model: str = None
+    model: str = None,
+    use_cache: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Generate embeddings for multiple texts in a single API call
     More efficient than generating one at a time
 
+    When use_cache is True, texts already in the embedding cache are not sent
+    to the API, and duplicate texts in the batch are embedded only once.
+
     Args:
         texts: List of text strings to embed
         model: OpenAI embedding model (default: from EMBED_MODEL config)
+        use_cache: Check/populate the embedding cache
 
     Returns:
         List of embedding dicts with 'embedding', 'dimensions', 'tokens'
@@ -74,26 +71,51 @@ def generate_embeddings_batch(
     if model is None:
         model = EMBED_MODEL
 
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+    if use_cache:
+        for position, cached in get_cached_embeddings(model, texts).items():
+            results[position] = cached
+
+    # Texts still needing the API, de-duplicated
+    pending: Dict[str, List[int]] = {}
+    for position, text in enumerate(texts):
+        if results[position] is None:
+            pending.setdefault(text, []).append(position)
+
+    if not pending:
+        return results
+
+    pending_texts = list(pending.keys()) if use_cache else list(texts)
+
     try:
-        response = client.embeddings.create(
-            input=texts,
+        response = client.create_embeddings(
+            input=pending_texts,
             model=model
         )
 
-        results = []
+        generated = []
         for embedding_data in response.data:
-            results.append({
+            generated.append({
                 'embedding': embedding_data.embedding,
                 'dimensions': len(embedding_data.embedding),
-                'tokens': response.usage.total_tokens // len(texts)  # Approximate per-text tokens
+                'tokens': response.usage.total_tokens // len(pending_texts)  # Approximate per-text tokens
             })
 
-        return results
-
     except Exception as e:
-        print(f"❌ Error generating batch embeddings: {str(e)}")
+        print(f"❌ Error generating embeddings: {str(e)}")
         raise
 
+    if not use_cache:
+        return generated
+
+    for text, embedding_info in zip(pending_texts, generated):
+        for position in pending[text]:
+            results[position] = embedding_info
+
+    store_embeddings(model, pending_texts, generated)
+    return results
+
 
 def generate_embeddings_for_document(
     db: Session,
@@ -138,7 +160,10 @@ def generate_embeddings_for_document(
 
         try:
             # Generate embeddings for batch
-            embeddings_data = generate_embeddings_batch(batch_texts, model=model)
+            # Chunk text is embedded once per document, so skip the query cache.
+            # Document processing yields to live student requests for API budget.
+            with openai_priority(OpenAIPriority.BULK):
+                embeddings_data = generate_embeddings_batch(batch_texts, model=model, use_cache=False)
 
             # Prepare data for bulk insert
             embeddings_to_insert = []
@@ -164,6 +189,16 @@ def generate_embeddings_for_document(
             continue
 
     print(f"✅ Total embeddings created: {total_embeddings}")
+
+    # The module's cached vector index no longer matches the database
+    if total_embeddings:
+        document = db.query(Document.module_id).filter(Document.id == document_id).first()
+        if document:
+            invalidate_module_index(document.module_id)
+            # Imported here: chat_answer_cache depends on this module
+            from app.services.chat_answer_cache import invalidate_module_answers
+            invalidate_module_answers(db, document.module_id)
+
     return total_embeddings
 
 
@@ -195,71 +230,78 @@ def search_similar_chunks(
     query_text: str,
     document_id: Optional[str] = None,
     limit: int = 5,
-    model: str = None
+    model: str = None,
+    module_id: Optional[str] = None,
+    document_ids: Optional[List[str]] = None,
+    query_vector: Optional[List[float]] = None,
+    min_similarity: Optional[float] = None
 ) -> List[Dict[str, Any]]:
     """
     Search for chunks similar to a query text
 
+    Uses the in-memory module vector index (see app.services.vector_index), so
+    repeated searches in the same module don't reload embeddings from the database.
+    With PGVECTOR_ENABLED the ranking runs in Postgres instead
+    (see app.crud.document_embedding.similarity_search).
+
     Args:
         db: Database session
         query_text: The search query
         document_id: Optional document ID to limit search scope
         limit: Number of results to return
         model: Embedding model to use (default: from EMBED_MODEL config)
+        module_id: Optional module ID to search within (looked up from document_id if omitted)
+        document_ids: Optional list of document IDs to limit search scope (within module_id)
+        query_vector: Pre-computed query embedding (skips the embedding API call)
+        min_similarity: Optional similarity floor applied before taking the top results
 
     Returns:
-        List of dicts with 'chunk', 'similarity', 'text'
+        List of dicts with 'chunk_id', 'document_id', 'document_title', 'similarity',
+        'text', 'chunk_index', 'metadata'
     """
     if model is None:
         model = EMBED_MODEL
 
-    # Generate embedding for query
-    query_embedding_info = generate_embedding(query_text, model=model)
-    query_vector = query_embedding_info['embedding']
-
-    # Get all embeddings (optionally filtered by document)
-    from app.models.document_embedding import DocumentEmbedding
+    if module_id is None and document_id:
+        document = db.query(Document.module_id).filter(Document.id == document_id).first()
+        if not document:
+            print(f"⚠️ Document {document_id} not found")
+            return []
+        module_id = document.module_id
 
-    query = db.query(DocumentEmbedding).join(DocumentChunk)
+    # Generate embedding for query (unless the caller already has one)
+    if query_vector is None:
+        query_embedding_info = generate_embedding(query_text, model=model)
+        query_vector = query_embedding_info['embedding']
 
     if document_id:
-        query = query.filter(DocumentEmbedding.document_id == document_id)
+        document_ids = [document_id]
+
+    if PGVECTOR_ENABLED:
+        results = similarity_search(
+            db,
+            query_vector,
+            limit=limit,
+            module_id=module_id,
+            document_ids=document_ids
+        )
+        if min_similarity is not None:
+            results = [r for r in results if r['similarity'] >= min_similarity]
+        return results
 
-    embeddings = query.all()
+    if module_id is not None:
+        index = get_module_index(db, module_id)
+    else:
+        # No scope given - search everything without caching the index
+        index = build_index_from_rows("*", load_embedding_rows(db))
 
-    if not embeddings:
+    if len(index) == 0:
         print("⚠️ No embeddings found")
         return []
 
-    # Calculate similarity scores
-    results = []
-    for embedding in embeddings:
-        similarity = cosine_similarity(query_vector, embedding.embedding_vector)
-        results.append({
-            'chunk_id': embedding.chunk_id,
-            'document_id': embedding.document_id,
-            'similarity': similarity,
-            'embedding': embedding
-        })
-
-    # Sort by similarity (highest first)
-    results.sort(key=lambda x: x['similarity'], reverse=True)
-
-    # Get top N results with chunk text
-    top_results = []
-    for result in results[:limit]:
-        chunk = db.query(DocumentChunk).filter(
-            DocumentChunk.id == result['chunk_id']
-        ).first()
-
-        if chunk:
-            top_results.append({
-                'chunk_id': result['chunk_id'],
-                'document_id': result['document_id'],
-                'similarity': result['similarity'],
-                'text': chunk.chunk_text,
-                'chunk_index': chunk.chunk_index,
-                'metadata': chunk.chunk_metadata or {}  # Include metadata (page, slide, section info)
-            })
-
-    return top_results
+    return index.search(
+        query_vector,
+        limit=limit,
+        document_ids=document_ids,
+        min_similarity=min_similarity
+    )
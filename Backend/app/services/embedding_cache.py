@@ -0,0 +1,183 @@
+"""
+Two-tier cache for query embeddings
+Tier 1 is an in-process LRU, tier 2 is the embedding_cache table, so repeated
+texts cost neither an OpenAI round trip nor API tokens
+"""
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_DB_ENABLED,
+    EMBEDDING_CACHE_MAX_ENTRIES
+)
+from app.database import SessionLocal
+from app.models.embedding_cache import EmbeddingCache
+from app.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Vectors are kept as float64 arrays (~12KB each) rather than Python lists (~50KB each)
+_memory_cache = LRUCache(max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+
+_counters_lock = threading.Lock()
+_counters = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'db_errors': 0
+}
+
+
+def _count(name: str, amount: int = 1) -> None:
+    if amount:
+        with _counters_lock:
+            _counters[name] += amount
+
+
+def hash_text(text: str) -> str:
+    """sha256 hex digest used as the cache key for a text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_result(entry: tuple) -> Dict[str, Any]:
+    vector, tokens = entry
+    return {
+        'embedding': vector.tolist(),
+        'dimensions': int(vector.shape[0]),
+        'tokens': tokens,
+        'cached': True
+    }
+
+
+def get_cached_embeddings(model: str, texts: List[str]) -> Dict[int, Dict[str, Any]]:
+    """
+    Look up embeddings for texts in the memory tier, then the database tier
+
+    Args:
+        model: Embedding model the vectors must come from
+        texts: Texts to look up
+
+    Returns:
+        Dict mapping position in texts -> embedding dict ('embedding',
+        'dimensions', 'tokens', 'cached') for every text that was found
+    """
+    if not EMBEDDING_CACHE_ENABLED or not texts:
+        return {}
+
+    found: Dict[int, Dict[str, Any]] = {}
+    missing: Dict[str, List[int]] = {}
+
+    for position, text in enumerate(texts):
+        text_hash = hash_text(text)
+        entry = _memory_cache.get((model, text_hash))
+        if entry is not None:
+            found[position] = _to_result(entry)
+        else:
+            missing.setdefault(text_hash, []).append(position)
+
+    _count('memory_hits', len(found))
+
+    if missing and EMBEDDING_CACHE_DB_ENABLED:
+        db = SessionLocal()
+        try:
+            rows = db.query(EmbeddingCache).filter(
+                EmbeddingCache.embedding_model == model,
+                EmbeddingCache.text_hash.in_(list(missing.keys()))
+            ).all()
+
+            for row in rows:
+                entry = (np.asarray(row.embedding_vector, dtype=np.float64), row.token_count or 0)
+                _memory_cache.set((model, row.text_hash), entry)
+                positions = missing.pop(row.text_hash)
+                for position in positions:
+                    found[position] = _to_result(entry)
+                _count('db_hits', len(positions))
+        except Exception as e:
+            _count('db_errors')
+            logger.warning(f"⚠️ Embedding cache lookup failed: {str(e)}")
+        finally:
+            db.close()
+
+    _count('misses', sum(len(positions) for positions in missing.values()))
+    return found
+
+
+def store_embeddings(model: str, texts: List[str], results: List[Dict[str, Any]]) -> None:
+    """
+    Save freshly generated embeddings to both cache tiers
+
+    Args:
+        model: Embedding model that produced the vectors
+        texts: Texts that were embedded
+        results: Embedding dicts from the API, in the same order as texts
+    """
+    if not EMBEDDING_CACHE_ENABLED or not texts:
+        return
+
+    rows = {}
+    for text, result in zip(texts, results):
+        text_hash = hash_text(text)
+        vector = np.asarray(result['embedding'], dtype=np.float64)
+        _memory_cache.set((model, text_hash), (vector, result.get('tokens', 0)))
+        rows[text_hash] = {
+            'embedding_model': model,
+            'text_hash': text_hash,
+            'embedding_vector': result['embedding'],
+            'embedding_dimensions': result['dimensions'],
+            'token_count': result.get('tokens')
+        }
+
+    _count('stores', len(rows))
+
+    if not EMBEDDING_CACHE_DB_ENABLED:
+        return
+
+    db = SessionLocal()
+    try:
+        # Another worker may have cached the same text in the meantime
+        statement = insert(EmbeddingCache).values(list(rows.values())).on_conflict_do_nothing(
+            index_elements=['embedding_model', 'text_hash']
+        )
+        db.execute(statement)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        _count('db_errors')
+        logger.warning(f"⚠️ Embedding cache write failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def clear_memory_cache() -> None:
+    """Empty the in-process tier (the database tier is left alone)"""
+    _memory_cache.clear()
+
+
+def get_embedding_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters for both tiers
+
+    Returns:
+        Dict with per-tier hits, misses, stores, db_errors, overall hit_rate
+        and the memory LRU's own stats
+    """
+    with _counters_lock:
+        counters = dict(_counters)
+
+    lookups = counters['memory_hits'] + counters['db_hits'] + counters['misses']
+    hits = counters['memory_hits'] + counters['db_hits']
+
+    return {
+        'enabled': EMBEDDING_CACHE_ENABLED,
+        'db_enabled': EMBEDDING_CACHE_DB_ENABLED,
+        **counters,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        'memory': _memory_cache.stats()
+    }
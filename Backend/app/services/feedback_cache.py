@@ -0,0 +1,277 @@
+"""
+Cross-student feedback cache
+Builds cache keys for reusable feedback and wraps the feedback_cache table so
+a cache failure never fails feedback generation
+
+Option answers (mcq / mcq_multiple) are keyed by their normalized selection,
+short/long answers by their normalized text, so "Photosynthesis." and
+"photosynthesis" share one generation. Concurrent generations of the same
+key in a process are coalesced through feedback_flights.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from sqlalchemy.orm import Session
+
+from app.core.config import TEXT_FEEDBACK_DEDUP_ENABLED, FEEDBACK_CACHE_HIT_FLUSH_SECONDS
+from app.models.question import Question
+from app.crud.feedback_cache import get_cached_feedback, store_cached_feedback, add_cached_feedback_hits
+from app.database import SessionLocal
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_counters_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+# Hits not yet written to feedback_cache.hit_count: cache_key -> [count, latest hit]
+_pending_hits: Dict[str, list] = {}
+_pending_hits_lock = threading.Lock()
+_last_hit_flush = time.monotonic()
+
+TEXT_QUESTION_TYPES = ('short', 'long')
+
+# Stripped from text answers; signs, decimal points and brackets can carry meaning
+_LEADING_PUNCTUATION = " \"'`\u201c\u2018"
+_TRAILING_PUNCTUATION = " .,;:!?\"'`\u201d\u2019"
+
+# Cacheable feedback generations in progress in this process, by cache key
+feedback_flights = SingleFlight()
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _sha256(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def hash_rubric(rubric: Optional[Dict[str, Any]]) -> str:
+    """Stable hash of a (merged) rubric config"""
+    return _sha256(rubric or {})
+
+
+def hash_question_content(question: Question) -> str:
+    """Hash of everything about a question that feeds the feedback prompt or grading"""
+    return _sha256([
+        question.type,
+        question.text,
+        question.options,
+        question.correct_option_id,
+        question.correct_answer,
+        question.extended_config,
+        question.points
+    ])
+
+
+def hash_rag_context(rag_context: Optional[Dict[str, Any]]) -> str:
+    """Hash of the course material injected into the prompt ('' when there is none)"""
+    if not rag_context or not rag_context.get('has_context'):
+        return ""
+    return _sha256(rag_context.get('formatted_context', ''))
+
+
+def normalize_mcq_option(student_answer: str, options: Optional[Dict[str, str]]) -> str:
+    """
+    Normalize a selected MCQ option to its letter
+
+    Legacy answers sometimes store the option text instead of the letter,
+    so map the text back to its key when it matches an option.
+    """
+    answer = (student_answer or "").strip()
+    if options:
+        for key, value in options.items():
+            if answer.upper() == str(key).upper():
+                return str(key).upper()
+        for key, value in options.items():
+            if answer.lower() == str(value).strip().lower():
+                return str(key).upper()
+    return answer.upper()
+
+
+def normalize_mcq_selection(selected_options: Optional[List[str]]) -> str:
+    """Normalize an mcq_multiple selection to a sorted, de-duplicated letter list ("A,C")"""
+    return ",".join(sorted({str(option).strip().upper() for option in (selected_options or []) if str(option).strip()}))
+
+
+def normalize_text_answer(student_answer: str) -> str:
+    """
+    Normalize a short/long answer for de-duplication
+
+    NFKC, case folded, whitespace collapsed and leading/trailing punctuation
+    dropped ("Photosynthesis." -> "photosynthesis"). Inner punctuation is
+    kept, since it can change what an answer means.
+    """
+    text = unicodedata.normalize("NFKC", student_answer or "").casefold()
+    text = " ".join(text.split())
+    return text.lstrip(_LEADING_PUNCTUATION).rstrip(_TRAILING_PUNCTUATION).strip()
+
+
+def text_dedup_enabled(question_type: str) -> bool:
+    return TEXT_FEEDBACK_DEDUP_ENABLED and question_type in TEXT_QUESTION_TYPES
+
+
+def build_option_cache_key(
+    kind: str,
+    question: Question,
+    variant: str,
+    rubric: Dict[str, Any],
+    ai_model: str,
+    rag_context: Optional[Dict[str, Any]]
+) -> str:
+    """
+    Cache key for option-based feedback (mcq / mcq_multiple)
+
+    Covers (question, normalized selection, rubric, model, context, question content),
+    so any edit to the question or rubric simply produces a different key.
+    """
+    return _sha256([
+        kind,
+        str(question.id),
+        variant,
+        hash_rubric(rubric),
+        ai_model,
+        hash_rag_context(rag_context),
+        hash_question_content(question)
+    ])
+
+
+def build_text_cache_key(
+    question: Question,
+    normalized_answer: str,
+    rubric: Dict[str, Any],
+    ai_model: str,
+    rag_context: Optional[Dict[str, Any]]
+) -> str:
+    """Cache key for short/long answer feedback (same coverage as build_option_cache_key)"""
+    return build_option_cache_key(
+        question.type, question, hashlib.sha256(normalized_answer.encode("utf-8")).hexdigest(),
+        rubric, ai_model, rag_context
+    )
+
+
+def lookup_feedback(db: Session, cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached feedback dict for a key, or None on miss or error
+
+    Hits are counted in memory, so a popular entry isn't rewritten on every
+    read; flush_feedback_hits() writes them every FEEDBACK_CACHE_HIT_FLUSH_SECONDS.
+    """
+    try:
+        payload = get_cached_feedback(db, cache_key)
+    except Exception as e:
+        db.rollback()
+        _count('errors')
+        logger.warning(f"⚠️ Feedback cache lookup failed: {str(e)}")
+        return None
+
+    _count('hits' if payload is not None else 'misses')
+    if payload is None:
+        return None
+
+    with _pending_hits_lock:
+        pending = _pending_hits.setdefault(cache_key, [0, None])
+        pending[0] += 1
+        pending[1] = datetime.utcnow()
+    flush_feedback_hits(db)
+    return dict(payload)
+
+
+def flush_feedback_hits(db: Optional[Session] = None, force: bool = False) -> int:
+    """
+    Write hits counted since the last flush, if FEEDBACK_CACHE_HIT_FLUSH_SECONDS have passed
+
+    Without a session one is opened (used with force=True at shutdown).
+    Never raises; on failure the hits are kept for the next flush.
+
+    Returns:
+        Number of cache entries updated
+    """
+    global _last_hit_flush
+    with _pending_hits_lock:
+        if not _pending_hits or (not force and time.monotonic() - _last_hit_flush < FEEDBACK_CACHE_HIT_FLUSH_SECONDS):
+            return 0
+        hits = {key: (count, last_hit_at) for key, (count, last_hit_at) in _pending_hits.items()}
+        _pending_hits.clear()
+        _last_hit_flush = time.monotonic()
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        return add_cached_feedback_hits(db, hits)
+    except Exception as e:
+        db.rollback()
+        _count('errors')
+        logger.warning(f"⚠️ Failed to record {sum(count for count, _ in hits.values())} feedback cache hits: {str(e)}")
+        with _pending_hits_lock:
+            for key, (count, last_hit_at) in hits.items():
+                pending = _pending_hits.setdefault(key, [0, last_hit_at])
+                pending[0] += count
+                pending[1] = max(pending[1] or last_hit_at, last_hit_at)
+        return 0
+    finally:
+        if own_session:
+            db.close()
+
+
+def save_feedback(
+    db: Session,
+    cache_key: str,
+    question: Question,
+    kind: str,
+    variant: Optional[str],
+    ai_model: str,
+    feedback: Dict[str, Any],
+    commit: bool = True
+) -> None:
+    """
+    Store generated feedback for reuse. Fallback feedback is never cached.
+
+    With commit=False the entry joins the caller's transaction (in a savepoint,
+    so a failed write doesn't abort it).
+    """
+    if feedback.get("fallback") or feedback.get("error"):
+        return
+
+    try:
+        store_cached_feedback(
+            db,
+            cache_key=cache_key,
+            module_id=question.module_id,
+            question_id=question.id,
+            kind=kind,
+            variant=variant,
+            ai_model=ai_model,
+            payload=feedback,
+            commit=commit
+        )
+        _count('stores')
+    except Exception as e:
+        if commit:
+            db.rollback()
+        _count('errors')
+        logger.warning(f"⚠️ Feedback cache write failed: {str(e)}")
+
+
+def get_feedback_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for this process"""
+    with _counters_lock:
+        counters = dict(_counters)
+    lookups = counters['hits'] + counters['misses']
+    with _pending_hits_lock:
+        unflushed = sum(count for count, _ in _pending_hits.values())
+    return {
+        **counters,
+        'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+        'unflushed_hits': unflushed,
+        'single_flight': feedback_flights.stats()
+    }
@@ -0,0 +1,325 @@
+"""
+Async batch feedback engine
+Generates feedback for many answers at once in four phases:
+  1. a short DB read phase - answers, questions, rubrics and existing
+     feedback - that marks the rows 'generating' and stores the algorithmic
+     grade of objective answers (stage 'graded')
+  2. RAG context and cached feedback, retrieved concurrently per distinct
+     question, each in its own short session
+  3. every LLM call, concurrently on the event loop under a semaphore; no DB
+     connection is held while waiting on OpenAI
+  4. a short DB write phase that stores all results in one transaction
+so a whole test submission takes about one LLM round trip instead of one per question.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import UUID
+
+from app.core.config import OPENAI_API_KEY, LLM_MODEL, FEEDBACK_LLM_CONCURRENCY, FEEDBACK_CONTEXT_CONCURRENCY
+from app.crud.ai_feedback import (
+    get_feedback_by_answers,
+    start_feedback_generation_batch,
+    finish_feedback_generation_batch,
+    save_feedback_grades
+)
+from app.database import SessionLocal
+from app.models.question import Question
+from app.models.student_answer import StudentAnswer
+from app.services.ai_feedback import AIFeedbackService, OBJECTIVE_QUESTION_TYPES
+from app.services.feedback_cache import lookup_feedback, save_feedback, feedback_flights
+from app.services.feedback_events import publish_answer_status
+from app.services.openai_client import AsyncOpenAIClientWithRetry, arun_chat_steps
+from app.services.rubric import get_module_rubric
+from app.services.text_pregrade import pregrade_enabled, provisional_event
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _FeedbackWork:
+    """Everything needed to generate and store one answer's feedback without a DB session"""
+    answer_id: UUID
+    answer_data: Any
+    student_id: str
+    module_id: UUID
+    attempt: int
+    submitted_at: Any
+    question: Question  # Detached from its session
+    rubric: Dict[str, Any]
+    ai_model: str
+    rag_context: Optional[Dict[str, Any]] = None
+    cache_key: Optional[str] = None
+    variant: Optional[str] = None
+    feedback: Optional[Dict[str, Any]] = None
+    from_cache: bool = False
+    error: Optional[str] = None
+
+
+class FeedbackEngine:
+    """
+    Generates feedback for batches of answers on an asyncio event loop
+
+    Create it on the loop that will use it (the async OpenAI client is bound to it).
+    """
+
+    def __init__(self, max_concurrent_calls: int = FEEDBACK_LLM_CONCURRENCY):
+        self.service = AIFeedbackService()
+        self.client = AsyncOpenAIClientWithRetry(api_key=OPENAI_API_KEY, default_model=LLM_MODEL)
+        self.semaphore = asyncio.Semaphore(max_concurrent_calls)
+        self.context_semaphore = asyncio.Semaphore(max(1, FEEDBACK_CONTEXT_CONCURRENCY))
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def generate(self, answer_ids: List[UUID]) -> Dict[UUID, Dict[str, Any]]:
+        """
+        Generate feedback for a batch of answers
+
+        Args:
+            answer_ids: Answers to generate feedback for
+
+        Returns:
+            Dict mapping answer_id -> feedback dict (same shape as
+            AIFeedbackService.generate_instant_feedback; contains "error" on failure).
+            Answers that no longer exist are left out.
+        """
+        results, work = await asyncio.to_thread(self._read_phase, answer_ids)
+        if not work:
+            return results
+
+        by_question: Dict[UUID, List[_FeedbackWork]] = {}
+        for item in work:
+            by_question.setdefault(item.question.id, []).append(item)
+        await asyncio.gather(*(self._prepare(items) for items in by_question.values()))
+
+        # Answers in the batch with the same feedback cache key share one generation
+        leaders: Dict[str, _FeedbackWork] = {}
+        to_generate = []
+        for item in work:
+            if item.feedback is not None:
+                continue
+            if item.cache_key is None or item.cache_key not in leaders:
+                to_generate.append(item)
+                if item.cache_key is not None:
+                    leaders[item.cache_key] = item
+
+        logger.info(f"🚀 Generating feedback for {len(work)} answers with {len(to_generate)} LLM analyses")
+        await asyncio.gather(*(self._analyze(item) for item in to_generate))
+
+        for item in work:
+            leader = leaders.get(item.cache_key) if item.cache_key else None
+            if leader is not None and leader is not item and item.feedback is None:
+                item.feedback, item.error, item.from_cache = leader.feedback, leader.error, True
+
+        results.update(await asyncio.to_thread(self._write_phase, work))
+        return results
+
+    async def _prepare(self, items: List[_FeedbackWork]) -> None:
+        async with self.context_semaphore:
+            await asyncio.to_thread(self._context_phase, items)
+
+    async def _analyze(self, item: _FeedbackWork) -> None:
+        try:
+            if item.cache_key is not None:
+                # Same answer being generated by another batch or request thread: wait for that result
+                item.feedback, item.from_cache = await feedback_flights.ado(item.cache_key, lambda: self._generate(item))
+            else:
+                item.feedback = await self._generate(item)
+        except Exception as e:
+            logger.error(f"❌ Error generating feedback for answer {item.answer_id}: {str(e)}")
+            item.error = str(e)
+
+    async def _generate(self, item: _FeedbackWork) -> Dict[str, Any]:
+        pregrade = None
+        if pregrade_enabled(item.question.type):
+            pregrade = await asyncio.to_thread(self.service._pregrade, item.question, item.answer_data, item.rubric)
+            if pregrade is not None:
+                publish_answer_status(
+                    item.student_id, item.module_id, item.attempt, item.answer_id, item.question.id, 'generating',
+                    provisional=provisional_event(pregrade, item.question.points)
+                )
+
+        return await arun_chat_steps(
+            self.service._analysis_steps(item.question, item.answer_data, item.ai_model, item.rubric, item.rag_context, pregrade),
+            self.client,
+            self.semaphore
+        )
+
+    def _read_phase(self, answer_ids: List[UUID]) -> Tuple[Dict[UUID, Dict[str, Any]], List[_FeedbackWork]]:
+        """
+        Load the answers, questions and rubrics and mark the feedback rows 'generating'
+
+        Returns:
+            (results that need no generation, work items)
+        """
+        results: Dict[UUID, Dict[str, Any]] = {}
+        work: List[_FeedbackWork] = []
+
+        # Loaded objects must stay usable after the session closes
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            answers = db.query(StudentAnswer).filter(StudentAnswer.id.in_(answer_ids)).all()
+            existing = get_feedback_by_answers(db, [answer.id for answer in answers])
+
+            pending = []
+            for answer in answers:
+                feedback = existing.get(answer.id)
+                if feedback is not None and feedback.feedback_data and feedback.generation_status not in ('failed', 'timeout'):
+                    logger.info(f"✅ Returning existing feedback for answer {answer.id}")
+                    results[answer.id] = self.service._feedback_model_to_dict(feedback)
+                else:
+                    pending.append(answer)
+
+            if not pending:
+                return results, work
+
+            start_feedback_generation_batch(db, [answer.id for answer in pending])
+            for answer in pending:
+                publish_answer_status(answer.student_id, answer.module_id, answer.attempt, answer.id, answer.question_id, 'generating')
+
+            questions = {
+                question.id: question
+                for question in db.query(Question).filter(
+                    Question.id.in_({answer.question_id for answer in pending})
+                ).all()
+            }
+
+            rubrics: Dict[str, Optional[Dict[str, Any]]] = {}
+            failed: Dict[UUID, Tuple[str, str]] = {}
+            grades: Dict[UUID, Dict[str, Any]] = {}
+
+            for answer in pending:
+                module_id = str(answer.module_id)
+                question = questions.get(answer.question_id)
+                if module_id not in rubrics:
+                    try:
+                        rubrics[module_id] = get_module_rubric(db, module_id)
+                    except ValueError:
+                        rubrics[module_id] = None
+
+                if question is None or rubrics[module_id] is None:
+                    message = "Question not found" if question is None else "Module not found"
+                    failed[answer.id] = (message, "data_error")
+                    results[answer.id] = self.service._error_response(message)
+                    continue
+
+                rubric = rubrics[module_id]
+                ai_model = self.service._get_ai_model_from_rubric(rubric)
+
+                item = _FeedbackWork(
+                    answer_id=answer.id,
+                    answer_data=answer.answer,
+                    student_id=answer.student_id,
+                    module_id=answer.module_id,
+                    attempt=answer.attempt,
+                    submitted_at=answer.submitted_at,
+                    question=question,
+                    rubric=rubric,
+                    ai_model=ai_model
+                )
+
+                # Grade objective answers now so it's visible while the narrative is generated
+                feedback_row = existing.get(answer.id)
+                if question.type in OBJECTIVE_QUESTION_TYPES and (feedback_row is None or feedback_row.generation_stage != 'graded'):
+                    grade = self.service.deterministic_grade(question, answer.answer, rubric)
+                    if grade is not None:
+                        grades[answer.id] = grade
+
+                work.append(item)
+
+            if grades:
+                save_feedback_grades(db, grades)
+                for item in work:
+                    if item.answer_id in grades:
+                        publish_answer_status(
+                            item.student_id, item.module_id, item.attempt, item.answer_id, item.question.id,
+                            'generating', grade=grades[item.answer_id]
+                        )
+
+            if failed:
+                finish_feedback_generation_batch(db, {}, failed)
+                for answer in pending:
+                    if answer.id in failed:
+                        publish_answer_status(answer.student_id, answer.module_id, answer.attempt, answer.id, answer.question_id, 'failed')
+
+            return results, work
+        finally:
+            db.close()
+
+    def _context_phase(self, items: List[_FeedbackWork]) -> None:
+        """
+        Retrieve RAG context and look up cached feedback for one question's answers
+
+        The first answer pays for the question's retrieval (an embedding call on a
+        cold cache); the rest reuse it from the question-context cache.
+        """
+        db = SessionLocal()
+        try:
+            for item in items:
+                answer_text = self.service._extract_answer_text(item.answer_data)
+                item.rag_context = self.service._retrieve_rag_context(
+                    db, item.question, answer_text, str(item.module_id), item.rubric
+                )
+                item.cache_key, item.variant = self.service._feedback_cache_key(
+                    item.question, item.answer_data, item.ai_model, item.rubric, item.rag_context
+                )
+                if item.cache_key is not None:
+                    cached = lookup_feedback(db, item.cache_key)
+                    if cached is not None:
+                        item.feedback, item.from_cache = cached, True
+        finally:
+            db.close()
+
+    def _write_phase(self, work: List[_FeedbackWork]) -> Dict[UUID, Dict[str, Any]]:
+        """Store all generated feedback (and new cacheable option feedback) in one transaction"""
+        results: Dict[UUID, Dict[str, Any]] = {}
+        completed: Dict[UUID, Dict[str, Any]] = {}
+        failed: Dict[UUID, Tuple[str, str]] = {}
+
+        db = SessionLocal()
+        try:
+            for item in work:
+                if item.error is not None:
+                    failed[item.answer_id] = (item.error, "generation_error")
+                    results[item.answer_id] = self.service._error_response(f"Failed to generate feedback: {item.error}")
+                    continue
+
+                feedback = item.feedback
+                completed[item.answer_id] = {
+                    'feedback_data': self.service._build_feedback_data(feedback, item.ai_model, item.rag_context, item.from_cache),
+                    'is_correct': feedback.get("is_correct"),
+                    'score': feedback.get("correctness_score"),
+                    'points_earned': feedback.get("points_earned"),
+                    'points_possible': feedback.get("points_possible"),
+                    'criterion_scores': feedback.get("criterion_scores"),
+                    'confidence_level': feedback.get("confidence_level"),
+                    'ai_model': item.ai_model,
+                    'prompt_tokens': None if item.from_cache else feedback.get("prompt_tokens")
+                }
+                results[item.answer_id] = {
+                    **feedback,
+                    "feedback_id": str(item.answer_id),
+                    "question_id": str(item.question.id),
+                    "attempt_number": item.attempt,
+                    "generated_at": item.submitted_at.isoformat() if item.submitted_at else None,
+                    "model_used": item.ai_model
+                }
+
+                if item.cache_key and not item.from_cache:
+                    save_feedback(
+                        db, item.cache_key, item.question, item.question.type, item.variant, item.ai_model, feedback,
+                        commit=False
+                    )
+
+            finish_feedback_generation_batch(db, completed, failed)
+
+            for item in work:
+                publish_answer_status(
+                    item.student_id, item.module_id, item.attempt, item.answer_id, item.question.id,
+                    'failed' if item.answer_id in failed else 'completed'
+                )
+            return results
+        finally:
+            db.close()
@@ -0,0 +1,187 @@
+"""
+Feedback progress events
+In-process pub/sub of per-answer feedback status transitions, keyed by
+(student, module, attempt). The feedback pipeline (generate_instant_feedback,
+the async feedback engine, the job queue) publishes; the SSE endpoint
+GET /student/modules/{module_id}/feedback-events subscribes, so the frontend
+is pushed each transition instead of polling feedback-status.
+
+Events only reach subscribers in the publishing process. Feedback finished by
+a standalone worker (python worker.py) or another API instance reaches the
+stream through its periodic resync, which re-reads the attempt with one query.
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.crud.ai_feedback import get_attempt_feedback_status
+
+logger = logging.getLogger(__name__)
+
+AttemptKey = Tuple[str, str, int]
+
+# Events a subscriber may fall behind by before new ones are dropped (the resync catches up)
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def attempt_key(student_id: Any, module_id: Any, attempt: Any) -> AttemptKey:
+    return (str(student_id), str(module_id), int(attempt))
+
+
+class FeedbackEventBus:
+    """
+    Thread-safe publisher, asyncio subscribers
+
+    Publishers can be any thread (request handlers, the feedback worker);
+    each subscriber is an asyncio.Queue fed on its own event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[AttemptKey, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def subscribe(self, key: AttemptKey) -> asyncio.Queue:
+        """Start receiving an attempt's events (call from the event loop that will read them)"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(key, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, key: AttemptKey, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = [entry for entry in self._subscribers.get(key, []) if entry[1] is not queue]
+            if subscribers:
+                self._subscribers[key] = subscribers
+            else:
+                self._subscribers.pop(key, None)
+
+    def publish(self, key: AttemptKey, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Subscriber's loop already closed; it unsubscribes on its way out
+                pass
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._subscribers.values())
+
+
+def _grade_fields(grade: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "is_correct": grade.get("is_correct"),
+        "score": grade.get("correctness_score", grade.get("score")),
+        "points_earned": grade.get("points_earned"),
+        "points_possible": grade.get("points_possible")
+    }
+
+
+def _offer(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+    if not queue.full():
+        queue.put_nowait(event)
+
+
+feedback_events = FeedbackEventBus()
+
+
+def publish_answer_status(
+    student_id: Any,
+    module_id: Any,
+    attempt: int,
+    answer_id: Any,
+    question_id: Any,
+    status: str,
+    progress: Optional[int] = None,
+    provisional: Optional[Dict[str, Any]] = None,
+    grade: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Announce a feedback status transition for one answer
+
+    `provisional` carries an early score (app.services.text_pregrade) shown
+    while the full feedback is generated; `grade` the final algorithmic grade
+    of an objective answer whose narrative is still pending.
+
+    Never raises: progress events must not break feedback generation.
+    """
+    try:
+        event = {
+            "answer_id": str(answer_id),
+            "question_id": str(question_id) if question_id is not None else None,
+            "generation_status": status,
+            "is_completed": status == 'completed',
+            "progress": progress
+        }
+        if provisional is not None:
+            event["provisional"] = provisional
+        if grade is not None:
+            event["generation_stage"] = 'graded'
+            event["grade"] = _grade_fields(grade)
+        feedback_events.publish(attempt_key(student_id, module_id, attempt), event)
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to publish feedback event for answer {answer_id}: {str(e)}")
+
+
+def get_feedback_status_snapshot(
+    db: Session,
+    student_id: str,
+    module_id: Any,
+    attempt: int
+) -> Dict[str, Any]:
+    """
+    Feedback status of a test attempt (GET feedback-status payload), in one query
+    """
+    rows = get_attempt_feedback_status(db, student_id, module_id, attempt)
+
+    if not rows:
+        return {
+            "total_questions": 0,
+            "feedback_ready": 0,
+            "feedback_pending": 0,
+            "questions": [],
+            "all_complete": True
+        }
+
+    feedback_status = []
+    ready_count = 0
+
+    for row in rows:
+        # IMPORTANT: Only count as ready if generation_status is "completed"
+        # Don't count "pending", "generating", "failed", or "timeout" as ready
+        is_completed = row.generation_status == 'completed'
+        if is_completed:
+            ready_count += 1
+
+        feedback_status.append({
+            "question_id": str(row.question_id),
+            "answer_id": str(row.answer_id),
+            "has_feedback": row.feedback_id is not None,
+            "is_completed": is_completed,
+            "generation_status": row.generation_status,
+            "generation_stage": row.generation_stage,
+            # Correctness and points are known early for objective questions (stage 'graded')
+            "grade": _grade_fields({
+                "is_correct": row.is_correct,
+                "score": row.score,
+                "points_earned": row.points_earned,
+                "points_possible": row.points_possible
+            }) if row.generation_stage in ('graded', 'final') and row.points_earned is not None else None,
+            "feedback_id": str(row.feedback_id) if row.feedback_id else None
+        })
+
+    total = len(rows)
+    return {
+        "total_questions": total,
+        "feedback_ready": ready_count,
+        "feedback_pending": total - ready_count,
+        "progress_percentage": int((ready_count / total) * 100) if total > 0 else 0,
+        "all_complete": ready_count == total,
+        "questions": feedback_status
+    }
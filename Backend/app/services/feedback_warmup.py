@@ -0,0 +1,149 @@
+"""
+Feedback warm-up for option-based questions
+Pre-generates the cached feedback for every option of approved mcq / mcq_multiple
+questions so submissions are served from the feedback cache instead of the LLM
+"""
+import concurrent.futures
+import itertools
+import logging
+from typing import List, Dict, Any, Iterator, Tuple
+
+from app.core.config import FEEDBACK_WARMUP_CONCURRENCY, MCQ_MULTIPLE_WARMUP_MAX_SUBSETS
+from app.database import SessionLocal
+from app.models.question import Question, QuestionStatus
+from app.services.rubric import get_module_rubric
+from app.services.openai_scheduler import openai_priority, OpenAIPriority
+
+logger = logging.getLogger(__name__)
+
+WARMABLE_QUESTION_TYPES = ('mcq', 'mcq_multiple')
+
+
+def _selections_by_distance(correct: List[str], wrong: List[str]) -> Iterator[List[str]]:
+    """
+    Non-empty option subsets in order of distance from the correct set
+
+    Distance d flips d options (adds wrong ones, drops correct ones); within a
+    distance smaller selections come first. Lazy, so a caller taking the first
+    few never enumerates all 2^n subsets.
+    """
+    for distance in range(len(correct) + len(wrong) + 1):
+        for added in range(max(0, distance - len(correct)), min(distance, len(wrong)) + 1):
+            for add in itertools.combinations(wrong, added):
+                for drop in itertools.combinations(correct, distance - added):
+                    selection = sorted(set(correct).difference(drop).union(add))
+                    if selection:
+                        yield selection
+
+
+def _mcq_multiple_selections(question: Question) -> List[List[str]]:
+    """
+    Selections to pre-generate for an mcq_multiple question
+
+    Non-empty option subsets, closest to the correct set first (the most
+    likely student answers), capped at MCQ_MULTIPLE_WARMUP_MAX_SUBSETS.
+    """
+    options = sorted((question.options or {}).keys())
+    correct_ids = set((question.extended_config or {}).get('correct_option_ids', []))
+    correct = [option for option in options if option in correct_ids]
+    wrong = [option for option in options if option not in correct_ids]
+
+    return list(itertools.islice(_selections_by_distance(correct, wrong), max(0, MCQ_MULTIPLE_WARMUP_MAX_SUBSETS)))
+
+
+def _answers_to_warm(question: Question) -> List[Dict[str, Any]]:
+    """Answer payloads (in StudentAnswer.answer format) to pre-generate feedback for"""
+    if question.type == 'mcq':
+        return [{"selected_option_id": key} for key in (question.options or {}).keys()]
+    return [{"selected_options": selection} for selection in _mcq_multiple_selections(question)]
+
+
+def _warm_answer(question_id: str, answer_data: Dict[str, Any]) -> bool:
+    """
+    Generate (or find) cached feedback for one answer to one question
+
+    Runs in a worker thread with its own session.
+
+    Returns:
+        True if the cache was already populated for this answer
+    """
+    from app.services.ai_feedback import AIFeedbackService
+
+    db = SessionLocal()
+    try:
+        question = db.query(Question).filter(Question.id == question_id).first()
+        if not question:
+            return False
+
+        service = AIFeedbackService()
+        rubric = get_module_rubric(db, str(question.module_id))
+        ai_model = service._get_ai_model_from_rubric(rubric)
+        answer_text = service._extract_answer_text(answer_data)
+        rag_context = service._retrieve_rag_context(db, question, answer_text, str(question.module_id), rubric)
+
+        with openai_priority(OpenAIPriority.BULK):
+            _, from_cache = service._generate_option_feedback(
+                db=db,
+                question=question,
+                answer_data=answer_data,
+                ai_model=ai_model,
+                rubric=rubric,
+                rag_context=rag_context
+            )
+        return from_cache
+    finally:
+        db.close()
+
+
+def warm_question_feedback(question_ids: List[str]) -> Dict[str, Any]:
+    """
+    Pre-generate option feedback for approved mcq / mcq_multiple questions
+
+    Other question types and questions that are not active are skipped.
+    Safe to run repeatedly: answers already in the cache are not regenerated.
+
+    Args:
+        question_ids: Questions to warm (typically the ones just approved)
+
+    Returns:
+        Dict with questions, generated, already_cached and failed counts
+    """
+    db = SessionLocal()
+    try:
+        questions = db.query(Question).filter(
+            Question.id.in_(question_ids),
+            Question.type.in_(WARMABLE_QUESTION_TYPES),
+            Question.status == QuestionStatus.ACTIVE
+        ).all()
+        work: List[Tuple[str, Dict[str, Any]]] = [
+            (str(question.id), answer_data)
+            for question in questions
+            for answer_data in _answers_to_warm(question)
+        ]
+    finally:
+        db.close()
+
+    summary = {'questions': len(questions), 'generated': 0, 'already_cached': 0, 'failed': 0}
+    if not work:
+        return summary
+
+    logger.info(f"🔥 Warming feedback cache: {len(work)} answers across {len(questions)} question(s)")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FEEDBACK_WARMUP_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(_warm_answer, question_id, answer_data): (question_id, answer_data)
+            for question_id, answer_data in work
+        }
+        for future in concurrent.futures.as_completed(futures):
+            question_id, answer_data = futures[future]
+            try:
+                if future.result():
+                    summary['already_cached'] += 1
+                else:
+                    summary['generated'] += 1
+            except Exception as e:
+                summary['failed'] += 1
+                logger.error(f"❌ Feedback warm-up failed for question {question_id}, answer {answer_data}: {str(e)}")
+
+    logger.info(f"✅ Feedback warm-up complete: {summary}")
+    return summary
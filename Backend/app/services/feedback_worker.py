@@ -0,0 +1,345 @@
+"""
+Feedback job worker
+Drains the feedback_jobs queue: claims jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+runs each claimed batch through the async FeedbackEngine, keeps the leases alive
+with a heartbeat while they run, and updates the test submission score once
+every job of an attempt has finished.
+
+Run standalone with `python worker.py`, or inside the API process via
+start_embedded_worker() (FEEDBACK_EMBEDDED_WORKER).
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, Any, List, Optional
+
+from app.core.config import (
+    FEEDBACK_WORKER_CONCURRENCY,
+    FEEDBACK_WORKER_POLL_SECONDS,
+    FEEDBACK_JOB_LEASE_SECONDS,
+    FEEDBACK_JOB_MAX_ATTEMPTS,
+    FEEDBACK_JOB_RETRY_DELAY_SECONDS,
+    FEEDBACK_GRADE_FIRST,
+    FEEDBACK_NARRATIVE_JOB_PRIORITY
+)
+from app.crud.ai_feedback import requeue_feedback_generation_batch
+from app.crud.feedback_job import (
+    enqueue_feedback_jobs,
+    claim_jobs,
+    heartbeat_jobs,
+    complete_job,
+    fail_job,
+    fail_abandoned_jobs,
+    count_live_attempt_jobs
+)
+from app.database import SessionLocal
+from app.models.feedback_job import FeedbackJobStatus
+from app.services.feedback_cache import flush_feedback_hits
+from app.services.feedback_events import publish_answer_status
+from app.services.openai_scheduler import openai_priority, OpenAIPriority
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_submission_feedback(
+    db,
+    student_id: str,
+    module_id,
+    attempt: int,
+    answers: List[Any]
+) -> List[str]:
+    """
+    Grade a submitted attempt's objective answers right away and queue the rest of its feedback
+
+    Answers graded here only wait for their narrative, so their jobs are queued
+    behind answers that have nothing to show yet (FEEDBACK_NARRATIVE_JOB_PRIORITY).
+
+    Returns:
+        IDs of the answers graded immediately
+    """
+    graded = []
+    if FEEDBACK_GRADE_FIRST:
+        from app.services.ai_feedback import AIFeedbackService
+        try:
+            graded = [str(answer_id) for answer_id in AIFeedbackService().store_deterministic_grades(db, answers)]
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Failed to store deterministic grades, queueing full feedback only: {str(e)}")
+
+    graded_set = set(graded)
+    ungraded = [str(answer.id) for answer in answers if str(answer.id) not in graded_set]
+    if ungraded:
+        enqueue_answer_feedback(db, student_id, module_id, attempt, ungraded)
+    if graded:
+        enqueue_answer_feedback(db, student_id, module_id, attempt, graded, priority=FEEDBACK_NARRATIVE_JOB_PRIORITY)
+    return graded
+
+
+def enqueue_answer_feedback(
+    db,
+    student_id: str,
+    module_id,
+    attempt: int,
+    answer_ids: List[str],
+    priority: int = 100
+) -> int:
+    """
+    Queue feedback generation for a test attempt's answers
+
+    Returns:
+        Number of jobs queued (answers with a live job already are skipped)
+    """
+    queued = enqueue_feedback_jobs(
+        db,
+        student_id=student_id,
+        module_id=module_id,
+        attempt=attempt,
+        answer_ids=answer_ids,
+        priority=priority,
+        max_attempts=FEEDBACK_JOB_MAX_ATTEMPTS
+    )
+    logger.info(f"📥 Queued {queued}/{len(answer_ids)} feedback jobs (student={student_id}, module={module_id}, attempt={attempt})")
+
+    for answer_id in answer_ids:
+        publish_answer_status(student_id, module_id, attempt, answer_id, None, 'pending')
+    return queued
+
+
+class FeedbackWorker:
+    """
+    Claims feedback jobs in batches and runs them on an asyncio event loop
+
+    Up to `concurrency` jobs are in flight at once. Database work happens in
+    short phases on worker threads, so a worker only holds a connection while
+    claiming, heartbeating, or reading/writing a batch - never while waiting
+    on OpenAI.
+    """
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        concurrency: int = FEEDBACK_WORKER_CONCURRENCY,
+        poll_seconds: float = FEEDBACK_WORKER_POLL_SECONDS,
+        lease_seconds: int = FEEDBACK_JOB_LEASE_SECONDS
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._running_lock = threading.Lock()
+        self._running: Dict[Any, Dict[str, Any]] = {}
+
+    def stop(self) -> None:
+        """Ask the worker to stop claiming; jobs already running are finished first"""
+        self._stop.set()
+
+    def run(self) -> None:
+        """Claim and run jobs until stop() is called (blocking)"""
+        logger.info(f"👷 Feedback worker {self.worker_id} started (concurrency={self.concurrency}, lease={self.lease_seconds}s)")
+
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="feedback-worker-heartbeat", daemon=True)
+        heartbeat.start()
+
+        try:
+            # Queued feedback yields API budget to requests a student is waiting on
+            with openai_priority(OpenAIPriority.FEEDBACK):
+                asyncio.run(self._run_loop())
+        finally:
+            self._done.set()
+            flush_feedback_hits(force=True)
+        logger.info(f"🛑 Feedback worker {self.worker_id} stopped")
+
+    async def _run_loop(self) -> None:
+        from app.services.feedback_engine import FeedbackEngine
+
+        engine = FeedbackEngine()
+        batches = set()
+        try:
+            while not self._stop.is_set():
+                batches = {batch for batch in batches if not batch.done()}
+                with self._running_lock:
+                    free_slots = self.concurrency - len(self._running)
+
+                if free_slots <= 0:
+                    if batches:
+                        await asyncio.wait(batches, timeout=self.poll_seconds, return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        await asyncio.sleep(self.poll_seconds)
+                    continue
+
+                jobs = await asyncio.to_thread(self._claim, free_slots)
+                if jobs:
+                    batches.add(asyncio.create_task(self._run_batch(engine, jobs)))
+
+                if len(jobs) < free_slots:
+                    await asyncio.sleep(self.poll_seconds)
+
+            if batches:
+                await asyncio.gather(*batches, return_exceptions=True)
+        finally:
+            await engine.close()
+
+    def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            abandoned = fail_abandoned_jobs(db)
+            if abandoned:
+                logger.warning(f"⚠️ Marked {abandoned} abandoned feedback job(s) as failed")
+
+            jobs = claim_jobs(db, self.worker_id, limit, self.lease_seconds)
+            if jobs:
+                with self._running_lock:
+                    for job in jobs:
+                        self._running[job['id']] = job
+                logger.info(f"📤 Worker {self.worker_id} claimed {len(jobs)} feedback job(s)")
+            return jobs
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Failed to claim feedback jobs: {str(e)}")
+            return []
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self) -> None:
+        """Extend the leases of running jobs every third of the lease period until run() exits"""
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self._done.wait(interval):
+            with self._running_lock:
+                job_ids = list(self._running.keys())
+            if not job_ids:
+                continue
+
+            db = SessionLocal()
+            try:
+                extended = heartbeat_jobs(db, self.worker_id, job_ids, self.lease_seconds)
+                if extended < len(job_ids):
+                    logger.warning(f"⚠️ Worker {self.worker_id} lost the lease on {len(job_ids) - extended} job(s)")
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ Feedback job heartbeat failed: {str(e)}")
+            finally:
+                db.close()
+
+    async def _run_batch(self, engine, jobs: List[Dict[str, Any]]) -> None:
+        """Generate feedback for a batch of claimed jobs, then record the outcome of each"""
+        try:
+            results = await engine.generate([job['answer_id'] for job in jobs])
+            batch_error = None
+        except Exception as e:
+            logger.error(f"❌ Feedback batch of {len(jobs)} job(s) crashed: {str(e)}")
+            results, batch_error = {}, str(e)
+
+        await asyncio.to_thread(self._finish_batch, jobs, results, batch_error)
+
+    def _finish_batch(
+        self,
+        jobs: List[Dict[str, Any]],
+        results: Dict[Any, Dict[str, Any]],
+        batch_error: Optional[str]
+    ) -> None:
+        db = SessionLocal()
+        requeued = []
+        try:
+            for job in jobs:
+                result = results.get(job['answer_id'])
+                if batch_error is not None:
+                    error = batch_error
+                elif result is not None and result.get("error"):
+                    error = result.get("message") or "Feedback generation failed"
+                else:
+                    # Answers deleted since the job was queued are simply done
+                    error = None
+
+                try:
+                    if error is None:
+                        if complete_job(db, job['id'], self.worker_id):
+                            logger.info(f"✅ Feedback job {job['id']} completed (answer {job['answer_id']})")
+                        else:
+                            logger.warning(f"⚠️ Worker {self.worker_id} lost the lease on feedback job {job['id']} before completing it")
+                    else:
+                        status = fail_job(db, job['id'], self.worker_id, error, FEEDBACK_JOB_RETRY_DELAY_SECONDS)
+                        if status is None:
+                            logger.warning(f"⚠️ Worker {self.worker_id} lost the lease on feedback job {job['id']} before failing it: {error}")
+                        else:
+                            logger.warning(f"⚠️ Feedback job {job['id']} failed (attempt {job['attempts']}/{job['max_attempts']}, now {status}): {error}")
+                        if status == FeedbackJobStatus.QUEUED:
+                            requeued.append(job)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"❌ Failed to record outcome of feedback job {job['id']}: {str(e)}")
+
+            self._requeue_feedback(db, requeued)
+
+        finally:
+            with self._running_lock:
+                for job in jobs:
+                    self._running.pop(job['id'], None)
+
+        try:
+            attempts = {(job['student_id'], job['module_id'], job['attempt']): job for job in jobs}
+            for job in attempts.values():
+                self._finish_attempt_if_done(db, job)
+        finally:
+            db.close()
+
+    def _requeue_feedback(self, db, jobs: List[Dict[str, Any]]) -> None:
+        """
+        Show retried answers as pending again
+
+        The engine already stored and published 'failed' for them, which would
+        read as final for the whole retry backoff.
+        """
+        if not jobs:
+            return
+        try:
+            requeue_feedback_generation_batch(db, [job['answer_id'] for job in jobs])
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Failed to reset feedback of {len(jobs)} requeued job(s): {str(e)}")
+            return
+
+        for job in jobs:
+            publish_answer_status(job['student_id'], job['module_id'], job['attempt'], job['answer_id'], None, 'pending')
+
+    def _finish_attempt_if_done(self, db, job: Dict[str, Any]) -> None:
+        """Update the submission score once the last job of an attempt is done"""
+        from app.crud.test_submission import update_submission_score
+
+        try:
+            if count_live_attempt_jobs(db, job['student_id'], job['module_id'], job['attempt']) > 0:
+                return
+            submission = update_submission_score(db, job['student_id'], job['module_id'], job['attempt'])
+            if submission:
+                logger.info(
+                    f"✅ Test score updated for attempt {job['attempt']}: "
+                    f"{submission.total_points_earned}/{submission.total_points_possible} points ({submission.percentage_score:.1f}%)"
+                )
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Failed to calculate total score: {str(e)}")
+
+
+_embedded_worker: Optional[FeedbackWorker] = None
+
+
+def start_embedded_worker() -> FeedbackWorker:
+    """Run a feedback worker in a daemon thread of the current (API) process"""
+    global _embedded_worker
+    if _embedded_worker is None:
+        _embedded_worker = FeedbackWorker()
+        threading.Thread(target=_embedded_worker.run, name="feedback-worker", daemon=True).start()
+    return _embedded_worker
+
+
+def stop_embedded_worker() -> None:
+    """Stop claiming new jobs in this process (unfinished jobs are re-claimed after their lease expires)"""
+    global _embedded_worker
+    if _embedded_worker is not None:
+        _embedded_worker.stop()
+        _embedded_worker = None
@@ -5,13 +5,28 @@ This module provides a robust wrapper around OpenAI API calls with:
 - Automatic retry with exponential backoff
 - Timeout handling
 - Rate limit detection
+- Shared RPM/TPM scheduling (app.services.openai_scheduler)
+- One keep-alive HTTP connection pool per process (get_openai_client)
+- Prompt-cache usage (cached prompt tokens) logged and counted per call
 - Comprehensive error logging
+
+Feedback analyzers are written as generators that yield ChatCompletionRequest
+objects instead of calling the API themselves; run_chat_steps (blocking) and
+arun_chat_steps (asyncio) drive them with a sync or async client.
 """
 
+import asyncio
+import contextlib
+import contextvars
+import importlib.util
+import json
+import threading
+import httpx
 import openai
-import time
 import logging
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, List, Generator, Iterator, Optional, Union, Tuple
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -20,8 +35,127 @@ from tenacity import (
     before_sleep_log
 )
 
+from app.core.config import (
+    OPENAI_API_KEY,
+    LLM_MODEL,
+    OPENAI_HTTP_MAX_CONNECTIONS,
+    OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_HTTP_KEEPALIVE_SECONDS,
+    OPENAI_HTTP2,
+    GRADING_FANOUT_CONCURRENCY
+)
+from app.services.openai_scheduler import get_scheduler, estimate_chat_tokens, estimate_tokens
+
 logger = logging.getLogger(__name__)
 
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError
+)
+
+
+def _rate_limit_wait(error: openai.RateLimitError) -> int:
+    """Seconds to wait before retrying a rate-limited request (Retry-After, default 20)"""
+    if hasattr(error, 'response') and error.response:
+        return int(error.response.headers.get('Retry-After', '20'))
+    return 20
+
+
+def _used_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, 'usage', None)
+    return usage.total_tokens if usage else None
+
+
+_prompt_cache_lock = threading.Lock()
+_prompt_cache_counters = {'calls': 0, 'calls_with_cached_tokens': 0, 'prompt_tokens': 0, 'cached_tokens': 0}
+
+
+def _record_prompt_usage(usage: Any) -> None:
+    """Log and count how much of a chat call's prompt the provider served from its prompt cache"""
+    if usage is None:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = (getattr(details, 'cached_tokens', None) or 0) if details is not None else 0
+    prompt_tokens = usage.prompt_tokens or 0
+
+    with _prompt_cache_lock:
+        _prompt_cache_counters['calls'] += 1
+        _prompt_cache_counters['calls_with_cached_tokens'] += 1 if cached_tokens else 0
+        _prompt_cache_counters['prompt_tokens'] += prompt_tokens
+        _prompt_cache_counters['cached_tokens'] += cached_tokens
+    logger.info(f"🧊 Prompt tokens: {prompt_tokens} ({cached_tokens} cached), completion tokens: {usage.completion_tokens}")
+
+
+def get_prompt_cache_stats() -> Dict[str, Any]:
+    """Provider prompt-cache usage of this process's chat calls"""
+    with _prompt_cache_lock:
+        counters = dict(_prompt_cache_counters)
+    return {
+        **counters,
+        'cached_token_ratio': round(counters['cached_tokens'] / counters['prompt_tokens'], 4) if counters['prompt_tokens'] else 0.0
+    }
+
+
+# ============================================================
+# Shared HTTP connection pool
+# ============================================================
+
+def _http_pool_options() -> Dict[str, Any]:
+    """httpx options for OpenAI clients: long keep-alive, HTTP/2 when h2 is installed"""
+    return {
+        'limits': httpx.Limits(
+            max_connections=OPENAI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_HTTP_KEEPALIVE_SECONDS
+        ),
+        'http2': OPENAI_HTTP2 and importlib.util.find_spec('h2') is not None
+    }
+
+
+_pooled_clients: Dict[str, openai.OpenAI] = {}
+_pooled_clients_lock = threading.Lock()
+
+
+def get_pooled_openai(api_key: str) -> openai.OpenAI:
+    """
+    Process-wide openai.OpenAI for an API key
+
+    Every caller shares its connection pool, so TLS handshakes and connection
+    setup happen once per connection instead of once per client.
+    """
+    with _pooled_clients_lock:
+        client = _pooled_clients.get(api_key)
+        if client is None:
+            options = _http_pool_options()
+            client = openai.OpenAI(
+                api_key=api_key,
+                timeout=90.0,  # 90 second timeout per request
+                max_retries=0,  # We handle retries ourselves for better control
+                http_client=openai.DefaultHttpxClient(**options)
+            )
+            _pooled_clients[api_key] = client
+            logger.info(f"🔗 OpenAI connection pool created (http2={options['http2']}, keepalive={OPENAI_HTTP_KEEPALIVE_SECONDS}s)")
+        return client
+
+
+def close_pooled_clients() -> None:
+    """Close every pooled connection (app shutdown)"""
+    with _pooled_clients_lock:
+        for client in _pooled_clients.values():
+            client.close()
+        _pooled_clients.clear()
+        _retry_clients.clear()
+
+
+@dataclass
+class ChatCompletionRequest:
+    """A chat completion an analyzer needs, yielded instead of calling the API directly"""
+    messages: List[Dict[str, str]]
+    model: Optional[str] = None
+    temperature: float = 0.3
+    max_tokens: int = 800
+
 
 class OpenAIClientWithRetry:
     """
@@ -36,21 +170,14 @@ class OpenAIClientWithRetry:
             api_key: OpenAI API key
             default_model: Default model to use (default: gpt-4)
         """
-        self.client = openai.OpenAI(
-            api_key=api_key,
-            timeout=90.0,  # 90 second timeout per request
-            max_retries=0   # We handle retries ourselves for better control
-        )
+        # Borrow the process-wide connection pool for this key
+        self.client = get_pooled_openai(api_key)
         self.default_model = default_model
 
     @retry(
         stop=stop_after_attempt(3),  # Try up to 3 times
         wait=wait_exponential(multiplier=1, min=2, max=10),  # 2s, 4s, 8s delays
-        retry=retry_if_exception_type((
-            openai.APITimeoutError,
-            openai.APIConnectionError,
-            openai.RateLimitError
-        )),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
         before_sleep=before_sleep_log(logger, logging.WARNING)
     )
     def create_chat_completion(
@@ -58,17 +185,21 @@ class OpenAIClientWithRetry:
         messages: List[Dict[str, str]],
         model: str = None,
         temperature: float = 0.3,
-        max_tokens: int = 800,
+        max_tokens: Optional[int] = 800,
+        timeout: float = 90.0,
         **kwargs
     ) -> Any:
         """
         Create a chat completion with automatic retry logic.
 
+        Each attempt first waits for room in the shared chat scheduler.
+
         Args:
             messages: List of message dicts with 'role' and 'content'
             model: Model to use (default: self.default_model)
             temperature: Sampling temperature (default: 0.3)
-            max_tokens: Maximum tokens to generate (default: 800)
+            max_tokens: Maximum tokens to generate (default: 800, None for the model's limit)
+            timeout: Request timeout in seconds (default: 90)
             **kwargs: Additional arguments to pass to the API
 
         Returns:
@@ -80,6 +211,11 @@ class OpenAIClientWithRetry:
             openai.APIError: If API returns an error after retries
         """
         model = model or self.default_model
+        if max_tokens is not None:
+            kwargs['max_tokens'] = max_tokens
+
+        scheduler = get_scheduler('chat')
+        reserved = scheduler.acquire(estimate_chat_tokens(messages, max_tokens))
 
         logger.info(f"🤖 OpenAI API call starting: model={model}, temp={temperature}, max_tokens={max_tokens}")
 
@@ -88,29 +224,24 @@ class OpenAIClientWithRetry:
                 model=model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens,
-                timeout=90.0,  # Explicit timeout
+                timeout=timeout,  # Explicit timeout
                 **kwargs
             )
 
+            scheduler.settle(reserved, _used_tokens(response))
+            _record_prompt_usage(getattr(response, 'usage', None))
             logger.info(f"✅ OpenAI API call successful")
             return response
 
         except openai.APITimeoutError as e:
-            logger.error(f"⏱️ OpenAI API timeout after 90s: {e}")
+            logger.error(f"⏱️ OpenAI API timeout after {timeout}s: {e}")
             raise  # Will trigger retry via tenacity
 
         except openai.RateLimitError as e:
             logger.error(f"🚫 OpenAI rate limit hit: {e}")
-            # Extract retry-after header if available
-            if hasattr(e, 'response') and e.response:
-                retry_after = e.response.headers.get('Retry-After', '20')
-                wait_time = int(retry_after)
-                logger.warning(f"⏳ Waiting {wait_time}s before retry...")
-                time.sleep(wait_time)
-            else:
-                time.sleep(20)  # Default wait
-            raise  # Will trigger retry via tenacity
+            # Hold every caller in the process (not just this thread) for Retry-After
+            scheduler.pause(_rate_limit_wait(e))
+            raise  # Will trigger retry via tenacity, which waits in the scheduler
 
         except openai.APIConnectionError as e:
             logger.error(f"🔌 OpenAI connection error: {e}")
@@ -132,6 +263,112 @@ class OpenAIClientWithRetry:
             logger.error(f"💥 Unexpected error in OpenAI call: {type(e).__name__}: {e}")
             raise
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        before_sleep=before_sleep_log(logger, logging.WARNING)
+    )
+    def _open_chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        **kwargs
+    ) -> Tuple[Any, int]:
+        """Start a streamed completion (retried until the first response arrives); returns (stream, reserved tokens)"""
+        scheduler = get_scheduler('chat')
+        reserved = scheduler.acquire(estimate_chat_tokens(messages, max_tokens))
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=90.0,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+            return stream, reserved
+        except openai.RateLimitError as e:
+            logger.error(f"🚫 OpenAI rate limit hit: {e}")
+            scheduler.pause(_rate_limit_wait(e))
+            raise
+
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.3,
+        max_tokens: int = 800,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a chat completion as text deltas.
+
+        Opening the stream is retried like create_chat_completion; once tokens
+        have been yielded an error is raised to the caller instead.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Model to use (default: self.default_model)
+            temperature: Sampling temperature (default: 0.3)
+            max_tokens: Maximum tokens to generate (default: 800)
+            **kwargs: Additional arguments to pass to the API
+
+        Yields:
+            Content deltas in order
+        """
+        model = model or self.default_model
+
+        logger.info(f"🤖 OpenAI streaming call starting: model={model}, temp={temperature}, max_tokens={max_tokens}")
+        stream, reserved = self._open_chat_stream(messages, model, temperature, max_tokens, **kwargs)
+
+        used_tokens = None
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    used_tokens = chunk.usage.total_tokens
+                    _record_prompt_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            logger.info(f"✅ OpenAI stream finished")
+        finally:
+            stream.close()
+            get_scheduler('chat').settle(reserved, used_tokens)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        before_sleep=before_sleep_log(logger, logging.WARNING)
+    )
+    def create_embeddings(self, input: List[str], model: str) -> Any:
+        """
+        Create embeddings with the same retry policy, scheduled on the shared embeddings budget
+
+        Args:
+            input: Texts to embed
+            model: Embedding model
+
+        Returns:
+            OpenAI embeddings response
+        """
+        scheduler = get_scheduler('embeddings')
+        reserved = scheduler.acquire(sum(estimate_tokens(text) for text in input))
+
+        try:
+            response = self.client.embeddings.create(input=input, model=model)
+            scheduler.settle(reserved, _used_tokens(response))
+            return response
+        except openai.RateLimitError as e:
+            logger.error(f"🚫 OpenAI embeddings rate limit hit: {e}")
+            scheduler.pause(_rate_limit_wait(e))
+            raise
+
     def create_completion_with_fallback(
         self,
         messages: List[Dict[str, str]],
@@ -174,3 +411,214 @@ class OpenAIClientWithRetry:
                 return fallback_response, True
             else:
                 raise
+
+
+_retry_clients: Dict[str, OpenAIClientWithRetry] = {}
+
+
+def get_openai_client(default_model: str = LLM_MODEL) -> OpenAIClientWithRetry:
+    """Shared OpenAIClientWithRetry for the configured API key (use this in services)"""
+    with _pooled_clients_lock:
+        client = _retry_clients.get(default_model)
+    if client is None:
+        client = OpenAIClientWithRetry(api_key=OPENAI_API_KEY, default_model=default_model)
+        with _pooled_clients_lock:
+            client = _retry_clients.setdefault(default_model, client)
+    return client
+
+
+class AsyncOpenAIClientWithRetry:
+    """
+    asyncio counterpart of OpenAIClientWithRetry (same timeout and retry policy).
+
+    Many calls can be in flight at once on one event loop; create the client on
+    the loop that will use it (its connection pool is bound to that loop) and
+    keep it for the loop's lifetime.
+    """
+
+    def __init__(self, api_key: str, default_model: str = "gpt-4"):
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            timeout=90.0,
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(**_http_pool_options())
+        )
+        self.default_model = default_model
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        before_sleep=before_sleep_log(logger, logging.WARNING)
+    )
+    async def create_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.3,
+        max_tokens: int = 800,
+        **kwargs
+    ) -> Any:
+        """
+        Create a chat completion with automatic retry logic (async).
+
+        Each attempt first waits for room in the shared chat scheduler.
+
+        Args and errors are the same as OpenAIClientWithRetry.create_chat_completion.
+        """
+        model = model or self.default_model
+
+        scheduler = get_scheduler('chat')
+        reserved = await scheduler.aacquire(estimate_chat_tokens(messages, max_tokens))
+
+        logger.info(f"🤖 OpenAI API call starting (async): model={model}, temp={temperature}, max_tokens={max_tokens}")
+
+        try:
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=90.0,
+                **kwargs
+            )
+            scheduler.settle(reserved, _used_tokens(response))
+            _record_prompt_usage(getattr(response, 'usage', None))
+            logger.info(f"✅ OpenAI API call successful")
+            return response
+
+        except openai.RateLimitError as e:
+            logger.error(f"🚫 OpenAI rate limit hit: {e}")
+            scheduler.pause(_rate_limit_wait(e))
+            raise
+
+        except RETRYABLE_ERRORS as e:
+            logger.error(f"⏱️ OpenAI {type(e).__name__}: {e}")
+            raise
+
+        except Exception as e:
+            logger.error(f"⚠️ OpenAI API error: {type(e).__name__}: {e}")
+            raise
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+# ============================================================
+# Driving analyzer generators
+# ============================================================
+# An analyzer generator yields either one ChatCompletionRequest, and receives
+# the reply text (API errors are thrown into the generator at the yield, so
+# its own try/except fallback handles them), or a list of requests, and
+# receives a list of reply texts / Exception objects in the same order.
+# The generator's return value is the analyzer's result.
+
+ChatSteps = Generator[Union[ChatCompletionRequest, List[ChatCompletionRequest]], Any, Any]
+
+
+def _reply_text(response: Any) -> str:
+    return response.choices[0].message.content.strip()
+
+
+def parse_json_reply(reply_text: str) -> Dict[str, Any]:
+    """Parse a JSON reply, stripping a markdown code fence if the model added one"""
+    if reply_text.startswith("```"):
+        reply_text = reply_text.split("```")[1]
+        if reply_text.startswith("json"):
+            reply_text = reply_text[4:]
+        reply_text = reply_text.strip()
+    return json.loads(reply_text)
+
+
+def _advance(steps: ChatSteps, reply: Any, error: Optional[Exception]) -> Tuple[bool, Any]:
+    """Resume a generator; returns (finished, next request or result)"""
+    try:
+        if error is not None:
+            return False, steps.throw(error)
+        return False, steps.send(reply)
+    except StopIteration as done:
+        return True, done.value
+
+
+def _complete_all(complete, requests: List[ChatCompletionRequest]) -> List[Any]:
+    """Send a list of requests in parallel threads; replies / Exception objects in request order"""
+
+    def attempt(request: ChatCompletionRequest) -> Any:
+        try:
+            return complete(request)
+        except Exception as e:
+            return e
+
+    if len(requests) <= 1 or GRADING_FANOUT_CONCURRENCY <= 1:
+        return [attempt(request) for request in requests]
+
+    # Each thread gets a copy of the caller's context so the OpenAI priority carries over
+    with ThreadPoolExecutor(max_workers=min(len(requests), GRADING_FANOUT_CONCURRENCY)) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, attempt, request) for request in requests]
+        return [future.result() for future in futures]
+
+
+def run_chat_steps(steps: ChatSteps, client: OpenAIClientWithRetry) -> Any:
+    """Run an analyzer generator to completion with blocking API calls (a list of requests is sent in parallel)"""
+
+    def complete(request: ChatCompletionRequest) -> str:
+        return _reply_text(client.create_chat_completion(
+            messages=request.messages,
+            model=request.model,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens
+        ))
+
+    reply, error = None, None
+    while True:
+        finished, request = _advance(steps, reply, error)
+        if finished:
+            return request
+
+        reply, error = None, None
+        if isinstance(request, list):
+            reply = _complete_all(complete, request)
+        else:
+            try:
+                reply = complete(request)
+            except Exception as e:
+                error = e
+
+
+async def arun_chat_steps(
+    steps: ChatSteps,
+    client: AsyncOpenAIClientWithRetry,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Any:
+    """
+    Run an analyzer generator to completion on the event loop
+
+    The generator's own code (prompt building, grading, parsing) runs in a
+    worker thread so any blocking work in it never stalls the loop. API calls
+    are awaited under `semaphore`, which bounds concurrent calls per process;
+    a list of requests is sent concurrently.
+    """
+
+    async def complete(request: ChatCompletionRequest) -> str:
+        async with (semaphore or contextlib.nullcontext()):
+            return _reply_text(await client.create_chat_completion(
+                messages=request.messages,
+                model=request.model,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            ))
+
+    reply, error = None, None
+    while True:
+        finished, request = await asyncio.to_thread(_advance, steps, reply, error)
+        if finished:
+            return request
+
+        reply, error = None, None
+        if isinstance(request, list):
+            reply = list(await asyncio.gather(*(complete(item) for item in request), return_exceptions=True))
+        else:
+            try:
+                reply = await complete(request)
+            except Exception as e:
+                error = e
@@ -0,0 +1,324 @@
+"""
+Process-wide OpenAI request scheduler
+Every OpenAI call in the process waits here for room in a shared
+requests-per-minute and tokens-per-minute budget before it is sent, so a
+deadline burst queues up locally instead of hammering the API into 429s.
+
+- Prompt tokens are estimated before dispatch (tiktoken when available) and
+  the estimate is corrected with the real usage once the response arrives
+- Waiting calls are served by priority: live student requests first, then
+  queued feedback jobs, then bulk work (warm-up, question generation, document
+  embedding). Callers set it with `with openai_priority(OpenAIPriority.BULK):`
+- A 429 pauses the whole scheduler for Retry-After instead of sleeping in
+  the one thread that hit it
+
+Chat completions and embeddings have separate OpenAI limits and so separate
+schedulers (get_scheduler('chat') / get_scheduler('embeddings')).
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import (
+    OPENAI_CHAT_RPM,
+    OPENAI_CHAT_TPM,
+    OPENAI_EMBEDDING_RPM,
+    OPENAI_EMBEDDING_TPM
+)
+
+logger = logging.getLogger(__name__)
+
+# Completion tokens assumed when a call sets no max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 4096
+
+# Longest a waiter sleeps before re-checking (async waiters aren't notified)
+_MAX_WAIT_SECONDS = 1.0
+_ASYNC_POLL_SECONDS = 0.05
+
+
+class OpenAIPriority:
+    """Scheduling priority of an OpenAI call (lower is served first)"""
+    INTERACTIVE = 0   # A user is waiting on the HTTP response (instant feedback, tutor chat)
+    FEEDBACK = 10     # Submission feedback from the job queue
+    BULK = 20         # Warm-up, question generation, document embedding
+
+
+_current_priority: ContextVar[int] = ContextVar("openai_priority", default=OpenAIPriority.INTERACTIVE)
+
+
+@contextlib.contextmanager
+def openai_priority(priority: int):
+    """Run the OpenAI calls made inside the block (including asyncio tasks / to_thread calls it starts) at `priority`"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+
+# ============================================================
+# Token estimation
+# ============================================================
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """tiktoken encoder, or None if tiktoken (or its encoding file) is unavailable"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _encoder_lock:
+            if not _encoder_loaded:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"⚠️ tiktoken unavailable, estimating tokens from length: {e}")
+                    _encoder = None
+                _encoder_loaded = True
+    return _encoder
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text"""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text that is at most max_tokens tokens"""
+    if max_tokens <= 0 or not text:
+        return ""
+    encoder = _get_encoder()
+    if encoder is None:
+        return text[:max_tokens * 4]
+    tokens = encoder.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
+
+
+def estimate_chat_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> int:
+    """
+    Tokens a chat completion counts against the TPM limit before it runs
+
+    OpenAI reserves prompt tokens plus max_tokens, so that's what is budgeted.
+    """
+    prompt_tokens = 2
+    for message in messages:
+        content = message.get("content")
+        prompt_tokens += 4 + estimate_tokens(content if isinstance(content, str) else str(content or ""))
+    return prompt_tokens + (max_tokens if max_tokens is not None else DEFAULT_COMPLETION_ESTIMATE)
+
+
+# ============================================================
+# Scheduler
+# ============================================================
+
+class _TokenBucket:
+    """Per-minute budget refilled continuously (capacity <= 0 means unlimited)"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (requests larger than the whole budget wait for a full bucket)"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Take (positive) or return (negative) budget; may go into debt"""
+        if self.capacity <= 0:
+            return
+        self.available = min(self.capacity, self.available - amount)
+
+
+class OpenAIScheduler:
+    """
+    Shared RPM/TPM budget with a priority queue of waiting calls
+
+    Usable from threads (acquire) and from asyncio (aacquire). Waiters are
+    granted strictly in (priority, arrival) order.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._requests = _TokenBucket(requests_per_minute)
+        self._tokens = _TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._waiting: List[Tuple[int, int]] = []  # Heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+        self._granted = 0
+        self._waited = 0
+        self._wait_seconds = 0.0
+        self._rate_limited = 0
+
+    def _try_grant(self, ticket: Tuple[int, int], tokens: int) -> float:
+        """Grant the ticket if it's first in line and the budget allows (lock held); returns 0 or seconds to wait"""
+        if self._waiting[0] != ticket:
+            return _MAX_WAIT_SECONDS
+
+        now = time.monotonic()
+        wait = max(
+            self._paused_until - now,
+            self._requests.wait_time(1, now),
+            self._tokens.wait_time(tokens, now)
+        )
+        if wait > 0:
+            return wait
+
+        heapq.heappop(self._waiting)
+        self._requests.adjust(1)
+        self._tokens.adjust(tokens)
+        self._changed.notify_all()
+        return 0.0
+
+    def _drop(self, ticket: Tuple[int, int]) -> None:
+        """Remove an abandoned waiter (lock held)"""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._changed.notify_all()
+
+    def _record_grant(self, waited_seconds: float) -> None:
+        with self._lock:
+            self._granted += 1
+            if waited_seconds >= 0.01:
+                self._waited += 1
+                self._wait_seconds += waited_seconds
+
+    def acquire(self, tokens: int, priority: Optional[int] = None) -> int:
+        """
+        Block until a call estimated at `tokens` may be sent
+
+        Returns:
+            The reserved token count (pass it to settle() with the real usage)
+        """
+        ticket = (current_priority() if priority is None else priority, next(self._sequence))
+        started = time.monotonic()
+
+        with self._changed:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = self._try_grant(ticket, tokens)
+                    if wait == 0:
+                        break
+                    self._changed.wait(min(wait, _MAX_WAIT_SECONDS))
+            except BaseException:
+                self._drop(ticket)
+                raise
+
+        self._record_grant(time.monotonic() - started)
+        return tokens
+
+    async def aacquire(self, tokens: int, priority: Optional[int] = None) -> int:
+        """asyncio version of acquire() (polls instead of blocking the loop)"""
+        ticket = (current_priority() if priority is None else priority, next(self._sequence))
+        started = time.monotonic()
+
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_grant(ticket, tokens)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, _ASYNC_POLL_SECONDS))
+        except BaseException:
+            with self._lock:
+                self._drop(ticket)
+            raise
+
+        self._record_grant(time.monotonic() - started)
+        return tokens
+
+    def settle(self, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        """Correct the TPM budget once the real usage of a call is known"""
+        if used_tokens is None:
+            return
+        with self._changed:
+            self._tokens.adjust(used_tokens - reserved_tokens)
+            self._changed.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every waiting call for `seconds` (after a 429)"""
+        with self._changed:
+            self._rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning(f"🚦 OpenAI {self.name} scheduler paused for {seconds}s after a rate limit")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            return {
+                'requests_per_minute': self.requests_per_minute,
+                'tokens_per_minute': self.tokens_per_minute,
+                'requests_available': int(self._requests.available) if self._requests.capacity > 0 else None,
+                'tokens_available': int(self._tokens.available) if self._tokens.capacity > 0 else None,
+                'waiting': len(self._waiting),
+                'paused_seconds': round(max(self._paused_until - now, 0.0), 1),
+                'granted': self._granted,
+                'waited': self._waited,
+                'avg_wait_seconds': round(self._wait_seconds / self._waited, 2) if self._waited else 0.0,
+                'rate_limited': self._rate_limited
+            }
+
+
+_SCHEDULER_LIMITS = {
+    'chat': (OPENAI_CHAT_RPM, OPENAI_CHAT_TPM),
+    'embeddings': (OPENAI_EMBEDDING_RPM, OPENAI_EMBEDDING_TPM)
+}
+_schedulers: Dict[str, OpenAIScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(kind: str = 'chat') -> OpenAIScheduler:
+    """Process-wide scheduler for 'chat' or 'embeddings' calls"""
+    with _schedulers_lock:
+        if kind not in _schedulers:
+            requests_per_minute, tokens_per_minute = _SCHEDULER_LIMITS[kind]
+            _schedulers[kind] = OpenAIScheduler(kind, requests_per_minute, tokens_per_minute)
+        return _schedulers[kind]
+
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    """Stats of every scheduler created so far"""
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {kind: scheduler.get_stats() for kind, scheduler in schedulers.items()}
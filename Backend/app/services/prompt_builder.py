@@ -1,64 +1,178 @@
 """
 Dynamic prompt builder for AI feedback
 Builds prompts based on rubric settings, question type, and RAG context
+
+Feedback prompts are split for provider-side prompt caching:
+- a system message with everything that is the same for every student
+  answering a question under a rubric (instructions, criteria, output format,
+  teacher instructions, the question itself), rendered once and memoized,
+  followed by the question's course material
+- a short user message with the student's answer
+so consecutive students share the longest possible identical prompt prefix.
 """
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, Optional, List
+
+from app.core.config import PROMPT_PREFIX_CACHE_MAX_ENTRIES
+from app.services.feedback_cache import hash_rubric
+from app.utils.lru_cache import LRUCache
+
+# Rendered static prompt prefixes, keyed by (prompt kind, question content, rubric hash, ...)
+_prefix_cache = LRUCache(max_entries=PROMPT_PREFIX_CACHE_MAX_ENTRIES)
+
+MCQ_TONE_GUIDANCE = {
+    "encouraging": "Keep explanations supportive and motivating. Focus on learning and growth.",
+    "neutral": "Keep explanations objective and factual. Focus on accuracy and understanding.",
+    "strict": "Keep explanations precise and rigorous. Maintain high standards for correctness."
+}
+
+TEXT_TONE_GUIDANCE = {
+    "encouraging": "Be constructive and supportive. Highlight both strengths and areas for growth. Focus on helping the student improve.",
+    "neutral": "Be objective and analytical. Provide balanced feedback focusing on accuracy and understanding.",
+    "strict": "Maintain high standards. Be specific about what's missing or incorrect. Reference exact requirements."
+}
+
+
+def _has_context(rag_context: Optional[Dict[str, Any]]) -> bool:
+    return bool(rag_context and rag_context.get("has_context"))
+
+
+def _memoized_prefix(key: tuple, render) -> str:
+    prefix = _prefix_cache.get(key)
+    if prefix is None:
+        prefix = render()
+        _prefix_cache.set(key, prefix)
+    return prefix
+
+
+def _system_message(prefix: str, rag_context: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Static prefix, then course material (shared per question, but may be reranked per answer)"""
+    if _has_context(rag_context):
+        return {"role": "system", "content": prefix + "\n\n" + rag_context["formatted_context"]}
+    return {"role": "system", "content": prefix}
 
 
-def build_mcq_feedback_prompt(
+def _criteria_lines(grading_criteria: Dict[str, Any]) -> List[str]:
+    if not grading_criteria:
+        return []
+    lines = ["Evaluate the response based on these criteria:"]
+    for criterion_name, criterion in grading_criteria.items():
+        weight = criterion.get("weight", 0)
+        description = criterion.get("description", "")
+        lines.append(f"- {criterion_name.title()} ({weight}%): {description}")
+    lines.append("")
+    return lines
+
+
+def _criterion_scores_format(grading_criteria: Dict[str, Any]) -> List[str]:
+    """criterion_scores part of the output JSON, built from the rubric's criteria"""
+    if not grading_criteria:
+        # Fallback if no rubric criteria (shouldn't happen but be safe)
+        return ['  "criterion_scores": {},']
+
+    lines = ['  "criterion_scores": {']
+    criteria_list = list(grading_criteria.items())
+    for idx, (criterion_name, criterion) in enumerate(criteria_list):
+        weight = criterion.get("weight", 0)
+        comma = "," if idx < len(criteria_list) - 1 else ""
+        lines.append(f'    "{criterion_name}": {{"score": score_out_of_{weight}, "out_of": {weight}, "reasoning": "Brief explanation for this criterion"}}{comma}')
+    lines.append('  },')
+    return lines
+
+
+def _custom_instruction_lines(custom_instructions: str) -> List[str]:
+    """Teacher's custom instructions (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)"""
+    if not custom_instructions:
+        return []
+
+    lines = [
+        "=" * 80,
+        "⚠️ CRITICAL: TEACHER'S CUSTOM INSTRUCTIONS - FOLLOW THESE EXACTLY",
+        "=" * 80,
+        custom_instructions,
+        ""
+    ]
+
+    # Detect harsh/strict language and reinforce it
+    instruction_lower = custom_instructions.lower()
+    harsh_keywords = ["harsh", "scold", "strict", "tough", "rigorous", "demanding", "critical"]
+    if any(keyword in instruction_lower for keyword in harsh_keywords):
+        lines.append("⚠️ IMPORTANT: The teacher explicitly wants a strict/harsh approach.")
+        lines.append("- DO NOT soften your language or be overly encouraging")
+        lines.append("- Point out mistakes directly and clearly")
+        lines.append("- Express disappointment or concern when appropriate")
+        lines.append("- Be demanding and set high expectations")
+        lines.append("- The goal is to push the student to do better through tough feedback")
+
+    lines.append("")
+    lines.append("REMINDER: Teacher's instructions above take ABSOLUTE PRIORITY over any previous tone settings.")
+    lines.append("=" * 80)
+    lines.append("")
+    return lines
+
+
+def _total_percentage_lines() -> List[str]:
+    return [
+        "IMPORTANT: Calculate total_percentage as the weighted sum of criterion scores:",
+        "total_percentage = sum((criterion_score / criterion_out_of) * criterion_weight for each criterion)",
+        ""
+    ]
+
+
+def build_mcq_feedback_prefix(
     question_text: str,
     options: Dict[str, str],
-    student_answer: str,
     correct_answer: str,
-    is_correct: Optional[bool],
     rubric: Dict[str, Any],
-    rag_context: Optional[Dict[str, Any]] = None
+    has_context: bool = False
 ) -> str:
     """
-    Build prompt for MCQ feedback generation
+    Static part of the MCQ feedback prompt (same for every student answering the question)
 
     Args:
         question_text: The question being answered
         options: Available options (dict of option_key -> option_text)
-        student_answer: Student's selected option
         correct_answer: Correct option key (can be empty string if not set)
-        is_correct: Whether the answer is correct (None if no correct answer set)
         rubric: Rubric configuration
-        rag_context: Retrieved course material context
+        has_context: Whether course material follows the prefix
 
     Returns:
-        Complete prompt string for AI
+        Prompt prefix string (memoized)
     """
+    key = ("mcq", question_text, json.dumps(options, sort_keys=True), correct_answer or "", has_context, hash_rubric(rubric))
+    return _memoized_prefix(key, lambda: _render_mcq_prefix(question_text, options, correct_answer, rubric, has_context))
+
+
+def _render_mcq_prefix(
+    question_text: str,
+    options: Dict[str, str],
+    correct_answer: str,
+    rubric: Dict[str, Any],
+    has_context: bool
+) -> str:
     # Extract rubric settings
     grading_criteria = rubric.get("grading_criteria", {})
     feedback_style = rubric.get("feedback_style", {})
     custom_instructions = rubric.get("custom_instructions", "")
-    mcq_settings = rubric.get("question_type_settings", {}).get("mcq", {})
+    include_doc_locations = rubric.get("rag_settings", {}).get("include_document_locations", True)
 
     tone = feedback_style.get("tone", "encouraging")
     detail_level = feedback_style.get("detail_level", "detailed")
     include_examples = feedback_style.get("include_examples", True)
+    has_correct_answer = bool(correct_answer)
 
-    # Build prompt sections
     prompt_parts = []
 
-    # 1. Base instruction
-    prompt_parts.append(f"Analyze this multiple choice question answer and provide {tone} educational feedback.")
+    # 1. Base instruction and tone
+    prompt_parts.append(f"You analyze students' answers to a multiple choice question and provide {tone} educational feedback.")
     prompt_parts.append(f"Detail level: {detail_level}.")
+    prompt_parts.append(MCQ_TONE_GUIDANCE.get(tone, MCQ_TONE_GUIDANCE["encouraging"]))
+    if include_examples:
+        prompt_parts.append("Include specific examples when helpful.")
     prompt_parts.append("")
 
-    # 2. Question context
-    prompt_parts.append("Question: " + question_text)
-    prompt_parts.append("")
-    prompt_parts.append("Options:")
-    for key, value in options.items():
-        prompt_parts.append(f"{key}. {value}")
-    prompt_parts.append("")
-    prompt_parts.append(f"Student Selected: {student_answer} - {options.get(student_answer, 'N/A')}")
-    prompt_parts.append("")
-
-    # Handle case where correct answer is not set
-    if is_correct is None:
+    # 2. Correctness handling (depends only on whether the question has a correct answer)
+    if not has_correct_answer:
         prompt_parts.append("⚠️ NOTE: No correct answer has been set for this question yet.")
         prompt_parts.append("Please provide general feedback on the student's response:")
         prompt_parts.append("- Analyze their reasoning based on the question context")
@@ -66,8 +180,6 @@ def build_mcq_feedback_prompt(
         prompt_parts.append("- Help them think critically about their choice")
         prompt_parts.append("- Since correctness cannot be determined, focus on learning and conceptual understanding")
     else:
-        prompt_parts.append(f"[INTERNAL - For AI only] Correct Answer: {correct_answer}. The student's answer is {'CORRECT' if is_correct else 'INCORRECT'}.")
-        prompt_parts.append("")
         prompt_parts.append("⚠️ IMPORTANT: NEVER reveal the correct answer directly in your feedback. Instead, provide:")
         prompt_parts.append("- Comprehensive hints that guide the student toward understanding")
         prompt_parts.append("- Conceptual explanations of the topic")
@@ -75,68 +187,25 @@ def build_mcq_feedback_prompt(
         prompt_parts.append("- Guidance to help them discover the answer through learning")
     prompt_parts.append("")
 
-    # 3. RAG context if available
-    if rag_context and rag_context.get("has_context"):
-        prompt_parts.append(rag_context["formatted_context"])
-        prompt_parts.append("")
-
-    # 4. Grading criteria
-    if grading_criteria:
-        prompt_parts.append("Evaluate the response based on these criteria:")
-        for criterion_name, criterion in grading_criteria.items():
-            weight = criterion.get("weight", 0)
-            description = criterion.get("description", "")
-            prompt_parts.append(f"- {criterion_name.title()} ({weight}%): {description}")
-        prompt_parts.append("")
-
-    # 5. MCQ-specific guidance
-    explain_correct = mcq_settings.get("explain_correct", True)
-    explain_incorrect = mcq_settings.get("explain_incorrect", True)
-    show_all_options = mcq_settings.get("show_all_options_analysis", False)
-
-    if is_correct is None:
-        prompt_parts.append("Provide thoughtful analysis of the student's choice and help them think about the concept being tested.")
-    elif show_all_options:
-        prompt_parts.append("Provide conceptual analysis to help the student understand the topic better, WITHOUT stating which option is correct.")
-    elif is_correct and explain_correct:
-        prompt_parts.append("Explain why the selected answer demonstrates good understanding and reinforce the key concepts.")
-    elif not is_correct and explain_incorrect:
-        prompt_parts.append("Help the student understand what they might have misunderstood. Provide hints and conceptual guidance WITHOUT revealing the correct answer.")
-
-    prompt_parts.append("")
-
-    # 6. Output format with PER-CRITERION SCORING
-    rag_settings = rubric.get("rag_settings", {})
-    include_doc_locations = rag_settings.get("include_document_locations", True)
+    # 3. Grading criteria
+    prompt_parts.extend(_criteria_lines(grading_criteria))
 
+    # 4. Output format with PER-CRITERION SCORING
     prompt_parts.append("⚠️ CRITICAL: You MUST provide per-criterion scores based on the rubric criteria above.")
     prompt_parts.append("Please provide feedback in this exact JSON format:")
     prompt_parts.append("{")
+    prompt_parts.extend(_criterion_scores_format(grading_criteria))
 
-    # Build criterion_scores format based on actual rubric criteria
-    if grading_criteria:
-        prompt_parts.append('  "criterion_scores": {')
-        criteria_list = list(grading_criteria.items())
-        for idx, (criterion_name, criterion) in enumerate(criteria_list):
-            weight = criterion.get("weight", 0)
-            comma = "," if idx < len(criteria_list) - 1 else ""
-            prompt_parts.append(f'    "{criterion_name}": {{"score": score_out_of_{weight}, "out_of": {weight}, "reasoning": "Brief explanation for this criterion"}}{comma}')
-        prompt_parts.append('  },')
-    else:
-        # Fallback if no rubric criteria (shouldn't happen but be safe)
-        prompt_parts.append('  "criterion_scores": {},')
-
-    # Handle is_correct and total_percentage based on whether we have a correct answer
-    if is_correct is None:
+    if not has_correct_answer:
         prompt_parts.append('  "total_percentage": null,')
         prompt_parts.append('  "is_correct": null,')
         prompt_parts.append('  "explanation": "Thoughtful analysis of the student\'s response (no correct answer available to compare)",')
     else:
         prompt_parts.append('  "total_percentage": calculated_percentage_0_to_100,')
-        prompt_parts.append(f'  "is_correct": {str(is_correct).lower()},')
+        prompt_parts.append('  "is_correct": true_or_false_as_stated_with_the_answer,')
         prompt_parts.append('  "explanation": "Clear explanation of why the answer is correct/incorrect",')
 
-    if rag_context and rag_context.get("has_context") and include_doc_locations:
+    if has_context and include_doc_locations:
         prompt_parts.append('  "improvement_hint": "Specific guidance with EXACT document reference (e.g., \'Review Lab 6, Page 3 on Earth\'s Processor\' or \'See Slide 5 in Lecture 2\')",')
     else:
         prompt_parts.append('  "improvement_hint": "Specific guidance for understanding the concept better",')
@@ -144,75 +213,114 @@ def build_mcq_feedback_prompt(
     prompt_parts.append('  "confidence": "high/medium/low based on clarity of the question and answer"')
     prompt_parts.append("}")
     prompt_parts.append("")
-    prompt_parts.append("IMPORTANT: Calculate total_percentage as the weighted sum of criterion scores:")
-    prompt_parts.append("total_percentage = sum((criterion_score / criterion_out_of) * criterion_weight for each criterion)")
+    prompt_parts.extend(_total_percentage_lines())
+
+    # 5. Custom teacher instructions
+    prompt_parts.extend(_custom_instruction_lines(custom_instructions))
+
+    # 6. The question
+    prompt_parts.append("Question: " + question_text)
     prompt_parts.append("")
+    prompt_parts.append("Options:")
+    for key, value in options.items():
+        prompt_parts.append(f"{key}. {value}")
+    if has_correct_answer:
+        prompt_parts.append("")
+        prompt_parts.append(f"[INTERNAL - For AI only] Correct Answer: {correct_answer}")
 
-    # 7. Base tone guidance (can be overridden by custom instructions)
-    tone_guidance = {
-        "encouraging": "Keep explanations supportive and motivating. Focus on learning and growth.",
-        "neutral": "Keep explanations objective and factual. Focus on accuracy and understanding.",
-        "strict": "Keep explanations precise and rigorous. Maintain high standards for correctness."
-    }
-    prompt_parts.append(tone_guidance.get(tone, tone_guidance["encouraging"]))
+    return "\n".join(prompt_parts)
 
-    if include_examples:
-        prompt_parts.append("Include specific examples when helpful.")
 
+def build_mcq_feedback_messages(
+    question_text: str,
+    options: Dict[str, str],
+    student_answer: str,
+    correct_answer: str,
+    is_correct: Optional[bool],
+    rubric: Dict[str, Any],
+    rag_context: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, str]]:
+    """
+    Build the messages for MCQ feedback generation
+
+    Args:
+        question_text: The question being answered
+        options: Available options (dict of option_key -> option_text)
+        student_answer: Student's selected option
+        correct_answer: Correct option key (can be empty string if not set)
+        is_correct: Whether the answer is correct (None if no correct answer set)
+        rubric: Rubric configuration
+        rag_context: Retrieved course material context
+
+    Returns:
+        [system message (static prefix + course material), user message (the student's answer)]
+    """
+    prefix = build_mcq_feedback_prefix(question_text, options, correct_answer, rubric, _has_context(rag_context))
+    mcq_settings = rubric.get("question_type_settings", {}).get("mcq", {})
+
+    prompt_parts = [f"Student Selected: {student_answer} - {options.get(student_answer, 'N/A')}"]
+    if is_correct is not None:
+        prompt_parts.append(f"[INTERNAL - For AI only] The student's answer is {'CORRECT' if is_correct else 'INCORRECT'}.")
     prompt_parts.append("")
 
-    # 8. CUSTOM TEACHER INSTRUCTIONS (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)
-    if custom_instructions:
-        prompt_parts.append("=" * 80)
-        prompt_parts.append("⚠️ CRITICAL: TEACHER'S CUSTOM INSTRUCTIONS - FOLLOW THESE EXACTLY")
-        prompt_parts.append("=" * 80)
-        prompt_parts.append(custom_instructions)
-        prompt_parts.append("")
+    # MCQ-specific guidance
+    explain_correct = mcq_settings.get("explain_correct", True)
+    explain_incorrect = mcq_settings.get("explain_incorrect", True)
+    show_all_options = mcq_settings.get("show_all_options_analysis", False)
 
-        # Detect harsh/strict language and reinforce it
-        instruction_lower = custom_instructions.lower()
-        harsh_keywords = ["harsh", "scold", "strict", "tough", "rigorous", "demanding", "critical"]
-        if any(keyword in instruction_lower for keyword in harsh_keywords):
-            prompt_parts.append("⚠️ IMPORTANT: The teacher explicitly wants a strict/harsh approach.")
-            prompt_parts.append("- DO NOT soften your language or be overly encouraging")
-            prompt_parts.append("- Point out mistakes directly and clearly")
-            prompt_parts.append("- Express disappointment or concern when appropriate")
-            prompt_parts.append("- Be demanding and set high expectations")
-            prompt_parts.append("- The goal is to push the student to do better through tough feedback")
+    if is_correct is None:
+        prompt_parts.append("Provide thoughtful analysis of the student's choice and help them think about the concept being tested.")
+    elif show_all_options:
+        prompt_parts.append("Provide conceptual analysis to help the student understand the topic better, WITHOUT stating which option is correct.")
+    elif is_correct and explain_correct:
+        prompt_parts.append("Explain why the selected answer demonstrates good understanding and reinforce the key concepts.")
+    elif not is_correct and explain_incorrect:
+        prompt_parts.append("Help the student understand what they might have misunderstood. Provide hints and conceptual guidance WITHOUT revealing the correct answer.")
 
-        prompt_parts.append("")
-        prompt_parts.append("REMINDER: Teacher's instructions above take ABSOLUTE PRIORITY over any previous tone settings.")
-        prompt_parts.append("=" * 80)
+    prompt_parts.append("Respond with the JSON format described above.")
 
-    return "\n".join(prompt_parts)
+    return [
+        _system_message(prefix, rag_context),
+        {"role": "user", "content": "\n".join(prompt_parts)}
+    ]
 
 
-def build_text_feedback_prompt(
+def build_text_feedback_prefix(
     question_text: str,
     question_type: str,
-    student_answer: str,
     reference_answer: str,
     rubric: Dict[str, Any],
-    rag_context: Optional[Dict[str, Any]] = None
+    has_context: bool = False
 ) -> str:
     """
-    Build prompt for text-based (short/essay) feedback generation
+    Static part of the text (short/essay) feedback prompt (same for every student answering the question)
 
     Args:
         question_text: The question being answered
         question_type: Type of question ('short' or 'essay')
-        student_answer: Student's text response
         reference_answer: Reference/expected answer
         rubric: Rubric configuration
-        rag_context: Retrieved course material context
+        has_context: Whether course material follows the prefix
 
     Returns:
-        Complete prompt string for AI
+        Prompt prefix string (memoized)
     """
+    key = ("text", question_type, question_text, reference_answer or "", has_context, hash_rubric(rubric))
+    return _memoized_prefix(key, lambda: _render_text_prefix(question_text, question_type, reference_answer, rubric, has_context))
+
+
+def _render_text_prefix(
+    question_text: str,
+    question_type: str,
+    reference_answer: str,
+    rubric: Dict[str, Any],
+    has_context: bool
+) -> str:
     # Extract rubric settings
     grading_criteria = rubric.get("grading_criteria", {})
     feedback_style = rubric.get("feedback_style", {})
     custom_instructions = rubric.get("custom_instructions", "")
+    include_doc_locations = rubric.get("rag_settings", {}).get("include_document_locations", True)
     type_settings = rubric.get("question_type_settings", {}).get(
         "short_answer" if question_type == "short" else "essay",
         {}
@@ -222,27 +330,19 @@ def build_text_feedback_prompt(
     detail_level = feedback_style.get("detail_level", "detailed")
     include_examples = feedback_style.get("include_examples", True)
 
-    # Build prompt sections
     prompt_parts = []
 
-    # 1. Base instruction
+    # 1. Base instruction and tone
     question_type_label = "short answer" if question_type == "short" else "essay"
-    prompt_parts.append(f"Analyze this {question_type_label} response and provide {tone}, {detail_level} educational feedback.")
-    prompt_parts.append("")
-
-    # 2. Question context
-    prompt_parts.append("Question: " + question_text)
-    prompt_parts.append("")
-    prompt_parts.append("Student Answer: " + student_answer)
+    prompt_parts.append(f"You analyze students' {question_type_label} responses and provide {tone}, {detail_level} educational feedback.")
+    prompt_parts.append(TEXT_TONE_GUIDANCE.get(tone, TEXT_TONE_GUIDANCE["encouraging"]))
+    if include_examples:
+        prompt_parts.append("Provide specific examples to illustrate your points.")
     prompt_parts.append("")
 
     # Handle case where no reference answer is available
     has_reference = reference_answer and reference_answer != "No reference answer provided"
-
-    if has_reference:
-        prompt_parts.append(f"[INTERNAL - For AI only] Reference Answer: {reference_answer}")
-        prompt_parts.append("")
-    else:
+    if not has_reference:
         prompt_parts.append("⚠️ NOTE: No reference answer has been set for this question.")
         prompt_parts.append("Provide feedback based on general educational standards, clarity, coherence, and demonstrated understanding.")
         prompt_parts.append("")
@@ -256,21 +356,10 @@ def build_text_feedback_prompt(
     prompt_parts.append("Your goal is to help the student LEARN and DISCOVER the answer themselves, not to give them the answer to copy.")
     prompt_parts.append("")
 
-    # 3. RAG context if available
-    if rag_context and rag_context.get("has_context"):
-        prompt_parts.append(rag_context["formatted_context"])
-        prompt_parts.append("")
+    # 2. Grading criteria
+    prompt_parts.extend(_criteria_lines(grading_criteria))
 
-    # 4. Grading criteria
-    if grading_criteria:
-        prompt_parts.append("Evaluate the response based on these criteria:")
-        for criterion_name, criterion in grading_criteria.items():
-            weight = criterion.get("weight", 0)
-            description = criterion.get("description", "")
-            prompt_parts.append(f"- {criterion_name.title()} ({weight}%): {description}")
-        prompt_parts.append("")
-
-    # 5. Question-type specific requirements
+    # 3. Question-type specific requirements
     min_length = type_settings.get("minimum_length", 0)
     check_grammar = type_settings.get("check_grammar", False)
     require_structure = type_settings.get("require_structure", False)
@@ -295,26 +384,11 @@ def build_text_feedback_prompt(
             prompt_parts.append(f"- {req}")
         prompt_parts.append("")
 
-    # 7. Output format with PER-CRITERION SCORING
-    rag_settings = rubric.get("rag_settings", {})
-    include_doc_locations = rag_settings.get("include_document_locations", True)
-
+    # 4. Output format with PER-CRITERION SCORING
     prompt_parts.append("⚠️ CRITICAL: You MUST provide per-criterion scores based on the rubric criteria above.")
     prompt_parts.append("Please provide detailed feedback in this exact JSON format:")
     prompt_parts.append("{")
-
-    # Build criterion_scores format based on actual rubric criteria
-    if grading_criteria:
-        prompt_parts.append('  "criterion_scores": {')
-        criteria_list = list(grading_criteria.items())
-        for idx, (criterion_name, criterion) in enumerate(criteria_list):
-            weight = criterion.get("weight", 0)
-            comma = "," if idx < len(criteria_list) - 1 else ""
-            prompt_parts.append(f'    "{criterion_name}": {{"score": score_out_of_{weight}, "out_of": {weight}, "reasoning": "Brief explanation for this criterion"}}{comma}')
-        prompt_parts.append('  },')
-    else:
-        # Fallback if no rubric criteria
-        prompt_parts.append('  "criterion_scores": {},')
+    prompt_parts.extend(_criterion_scores_format(grading_criteria))
 
     # Adjust correctness fields based on whether we have a reference answer
     if has_reference:
@@ -327,7 +401,7 @@ def build_text_feedback_prompt(
     prompt_parts.append('  "explanation": "Detailed analysis of the student\'s response",')
     prompt_parts.append('  "strengths": ["What the student got right - array of strings"],')
     prompt_parts.append('  "weaknesses": ["Areas for improvement - array of strings"],')
-    if rag_context and rag_context.get("has_context") and include_doc_locations:
+    if has_context and include_doc_locations:
         prompt_parts.append('  "improvement_hint": "Specific guidance with EXACT document references where to study (e.g., \'To understand this better, carefully review Lab 6, Page 3, the section on Earth\'s Processor\' or \'Study Slide 12-15 in Lecture 3 on Memory Management\')",')
     else:
         prompt_parts.append('  "improvement_hint": "Specific guidance for better understanding",')
@@ -336,47 +410,53 @@ def build_text_feedback_prompt(
     prompt_parts.append('  "confidence": "high/medium/low based on answer quality"')
     prompt_parts.append("}")
     prompt_parts.append("")
-    prompt_parts.append("IMPORTANT: Calculate total_percentage as the weighted sum of criterion scores:")
-    prompt_parts.append("total_percentage = sum((criterion_score / criterion_out_of) * criterion_weight for each criterion)")
-    prompt_parts.append("")
+    prompt_parts.extend(_total_percentage_lines())
 
-    # 8. Base tone guidance (can be overridden by custom instructions)
-    tone_guidance = {
-        "encouraging": "Be constructive and supportive. Highlight both strengths and areas for growth. Focus on helping the student improve.",
-        "neutral": "Be objective and analytical. Provide balanced feedback focusing on accuracy and understanding.",
-        "strict": "Maintain high standards. Be specific about what's missing or incorrect. Reference exact requirements."
-    }
-    prompt_parts.append(tone_guidance.get(tone, tone_guidance["encouraging"]))
+    # 5. Custom teacher instructions
+    prompt_parts.extend(_custom_instruction_lines(custom_instructions))
 
-    if include_examples:
-        prompt_parts.append("Provide specific examples to illustrate your points.")
+    # 6. The question
+    prompt_parts.append("Question: " + question_text)
+    if has_reference:
+        prompt_parts.append("")
+        prompt_parts.append(f"[INTERNAL - For AI only] Reference Answer: {reference_answer}")
 
-    prompt_parts.append("")
+    return "\n".join(prompt_parts)
 
-    # 9. CUSTOM TEACHER INSTRUCTIONS (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)
-    if custom_instructions:
-        prompt_parts.append("=" * 80)
-        prompt_parts.append("⚠️ CRITICAL: TEACHER'S CUSTOM INSTRUCTIONS - FOLLOW THESE EXACTLY")
-        prompt_parts.append("=" * 80)
-        prompt_parts.append(custom_instructions)
-        prompt_parts.append("")
 
-        # Detect harsh/strict language and reinforce it
-        instruction_lower = custom_instructions.lower()
-        harsh_keywords = ["harsh", "scold", "strict", "tough", "rigorous", "demanding", "critical"]
-        if any(keyword in instruction_lower for keyword in harsh_keywords):
-            prompt_parts.append("⚠️ IMPORTANT: The teacher explicitly wants a strict/harsh approach.")
-            prompt_parts.append("- DO NOT soften your language or be overly encouraging")
-            prompt_parts.append("- Point out mistakes directly and clearly")
-            prompt_parts.append("- Express disappointment or concern when appropriate")
-            prompt_parts.append("- Be demanding and set high expectations")
-            prompt_parts.append("- The goal is to push the student to do better through tough feedback")
+def build_text_feedback_messages(
+    question_text: str,
+    question_type: str,
+    student_answer: str,
+    reference_answer: str,
+    rubric: Dict[str, Any],
+    rag_context: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, str]]:
+    """
+    Build the messages for text-based (short/essay) feedback generation
 
-        prompt_parts.append("")
-        prompt_parts.append("REMINDER: Teacher's instructions above take ABSOLUTE PRIORITY over any previous tone settings.")
-        prompt_parts.append("=" * 80)
+    Args:
+        question_text: The question being answered
+        question_type: Type of question ('short' or 'essay')
+        student_answer: Student's text response
+        reference_answer: Reference/expected answer
+        rubric: Rubric configuration
+        rag_context: Retrieved course material context
 
-    return "\n".join(prompt_parts)
+    Returns:
+        [system message (static prefix + course material), user message (the student's answer)]
+    """
+    prefix = build_text_feedback_prefix(question_text, question_type, reference_answer, rubric, _has_context(rag_context))
+
+    return [
+        _system_message(prefix, rag_context),
+        {"role": "user", "content": "Student Answer: " + student_answer + "\n\nRespond with the JSON format described above."}
+    ]
+
+
+def get_prompt_prefix_cache_stats() -> Dict[str, Any]:
+    """Memoized prompt prefix counters for this process"""
+    return _prefix_cache.stats()
 
 
 def format_grading_criteria(criteria: Dict[str, Any]) -> str:
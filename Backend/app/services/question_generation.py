@@ -10,10 +10,12 @@ from sqlalchemy.orm import Session
 from uuid import UUID
 from datetime import datetime, timezone
 
-from app.core.config import OPENAI_API_KEY, LLM_MODEL
+from app.core.config import LLM_MODEL
 from app.models.document import Document
 from app.models.document_chunk import DocumentChunk
 from app.models.question import QuestionStatus
+from app.services.openai_client import get_openai_client
+from app.services.openai_scheduler import openai_priority, OpenAIPriority
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +24,7 @@ class QuestionGenerationService:
     """Service for generating questions from documents using AI"""
 
     def __init__(self):
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        self.client = get_openai_client()
         # Use models that support JSON mode: gpt-4o, gpt-4o-mini, gpt-4-turbo
         # Fallback to gpt-4o-mini if LLM_MODEL is not JSON-compatible
         json_compatible_models = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-3.5-turbo-1106"]
@@ -115,24 +117,28 @@ class QuestionGenerationService:
         # Call OpenAI API
         try:
             logger.info(f"Calling OpenAI API with model: {self.default_model}")
-            response = self.client.chat.completions.create(
-                model=self.default_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert educational assessment designer. You create high-quality, "
-                                 "pedagogically sound questions from educational materials. Questions should be "
-                                 "clear, unambiguous, and test genuine understanding rather than mere memorization. "
-                                 "Always respond with valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,  # Some creativity but mostly focused
-                response_format={"type": "json_object"}
-            )
+            # Bulk generation yields to live student requests for API budget
+            with openai_priority(OpenAIPriority.BULK):
+                response = self.client.create_chat_completion(
+                    model=self.default_model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert educational assessment designer. You create high-quality, "
+                                     "pedagogically sound questions from educational materials. Questions should be "
+                                     "clear, unambiguous, and test genuine understanding rather than mere memorization. "
+                                     "Always respond with valid JSON."
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    temperature=0.7,  # Some creativity but mostly focused
+                    max_tokens=None,  # No cap: a full question set is long
+                    timeout=300.0,
+                    response_format={"type": "json_object"}
+                )
 
             # Log the raw response from OpenAI
             raw_response = response.choices[0].message.content
@@ -2,9 +2,16 @@
 Question-specific grading logic for different question types
 """
 import logging
-from typing import Dict, Any, List, Optional
-import openai
-from app.core.config import OPENAI_API_KEY, LLM_MODEL
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import LLM_MODEL, GRADING_BATCH_ENABLED, FILL_BLANK_LOCAL_MATCHING
+from app.services.openai_client import (
+    get_openai_client,
+    ChatCompletionRequest,
+    ChatSteps,
+    run_chat_steps,
+    parse_json_reply
+)
+from app.utils.answer_matching import match_blank_answer
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +19,7 @@ class QuestionGradingService:
     """Service for grading different question types"""
 
     def __init__(self):
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        self.client = get_openai_client()
         self.default_model = LLM_MODEL
 
     def grade_fill_blank(
@@ -32,18 +39,37 @@ class QuestionGradingService:
         Returns:
             Dict with grading results including per-blank scores and total
         """
-        total_points = 0.0
-        earned_points = 0.0
-        blank_results = []
+        return run_chat_steps(
+            self.fill_blank_grading_steps(student_answers, blank_configs, use_ai_semantic_matching),
+            self.client
+        )
+
+    def fill_blank_grading_steps(
+        self,
+        student_answers: Dict[int, str],
+        blank_configs: List[Dict[str, Any]],
+        use_ai_semantic_matching: bool = True,
+        batched: bool = GRADING_BATCH_ENABLED
+    ) -> ChatSteps:
+        """
+        grade_fill_blank as an analyzer generator
+
+        Exact matches and answers the local matcher can decide (typos, plurals,
+        a leading article, numbers - app.utils.answer_matching) are graded without AI.
+        Every remaining blank is checked for semantic equivalence in one batched
+        request, or with one request per blank (sent together) when batching is off.
+
+        Returns (as the generator's value):
+            Same dict as grade_fill_blank
+        """
+        graded = []
+        pending = {}
 
         for blank_config in blank_configs:
             position = blank_config.get('position')
             correct_answers = blank_config.get('correct_answers', [])
-            points = blank_config.get('points', 1.0)
             case_sensitive = blank_config.get('case_sensitive', False)
 
-            total_points += points
-
             # Get student's answer for this blank
             student_answer = student_answers.get(position, "").strip()
 
@@ -53,14 +79,37 @@ class QuestionGradingService:
                 correct_answers,
                 case_sensitive
             )
+            match_type = "exact" if is_correct else None
+
+            # Then the local fuzzy matcher
+            if not is_correct and FILL_BLANK_LOCAL_MATCHING and student_answer:
+                verdict, tier = match_blank_answer(blank_config, student_answer)
+                if verdict is not None:
+                    is_correct, match_type = verdict, tier
+
+            graded.append((blank_config, student_answer, is_correct, match_type))
+
+            # If still undecided and AI semantic matching enabled, use AI
+            if not is_correct and match_type is None and use_ai_semantic_matching and student_answer:
+                pending[position] = (student_answer, correct_answers)
+
+        matches = {}
+        if pending:
+            matches = yield from self._semantic_match_steps(pending, batched)
+
+        total_points = 0.0
+        earned_points = 0.0
+        blank_results = []
+
+        for blank_config, student_answer, is_correct, match_type in graded:
+            position = blank_config.get('position')
+            points = blank_config.get('points', 1.0)
+            total_points += points
 
-            # If not exact match and AI semantic matching enabled, use AI
             semantic_match = False
-            if not is_correct and use_ai_semantic_matching and student_answer:
-                is_correct, semantic_match = self._check_ai_semantic_match(
-                    student_answer,
-                    correct_answers
-                )
+            if position in matches:
+                is_correct, semantic_match = matches[position]
+                match_type = "ai" if semantic_match else None
 
             # Award points if correct
             blank_earned = points if is_correct else 0.0
@@ -71,9 +120,10 @@ class QuestionGradingService:
                 "student_answer": student_answer,
                 "is_correct": is_correct,
                 "semantic_match": semantic_match,
+                "match_type": match_type,
                 "points_possible": points,
                 "points_earned": blank_earned,
-                "accepted_answers": correct_answers
+                "accepted_answers": blank_config.get('correct_answers', [])
             })
 
         # Calculate overall correctness
@@ -108,19 +158,61 @@ class QuestionGradingService:
 
         return False
 
-    def _check_ai_semantic_match(
+    def _semantic_match_steps(
         self,
-        student_answer: str,
-        correct_answers: List[str]
-    ) -> tuple[bool, bool]:
+        pending: Dict[Any, Tuple[str, List[str]]],
+        batched: bool
+    ) -> ChatSteps:
         """
-        Use AI to check if student answer is semantically equivalent to correct answers
+        Use AI to check if student answers are semantically equivalent to their accepted answers
 
-        Returns:
-            (is_correct, semantic_match_used)
+        Args:
+            pending: Dict mapping blank position to (student answer, accepted answers)
+            batched: Check every blank in one request (blanks missing from the
+                batched reply are retried one request per blank)
+
+        Returns (as the generator's value):
+            Dict mapping blank position to (is_correct, semantic_match_used)
         """
-        try:
-            prompt = f"""Determine if the student's answer is semantically equivalent to any of the accepted answers.
+        results = {}
+
+        if batched and len(pending) > 1:
+            logger.info(f"🤖 AI Semantic Check: {len(pending)} blanks in one request")
+            try:
+                reply = yield self._batch_semantic_match_request(pending)
+                verdicts = parse_json_reply(reply).get("matches", {})
+                for position in pending:
+                    verdict = verdicts.get(str(position))
+                    if isinstance(verdict, bool):
+                        results[position] = (verdict, True)
+            except Exception as e:
+                logger.error(f"Batched AI semantic matching failed: {str(e)}")
+
+        remaining = [position for position in pending if position not in results]
+        if not remaining:
+            return results
+
+        replies = yield [self._semantic_match_request(*pending[position]) for position in remaining]
+        for position, reply in zip(remaining, replies):
+            if isinstance(reply, Exception):
+                logger.error(f"AI semantic matching failed: {str(reply)}")
+                results[position] = (False, False)
+                continue
+
+            ai_response = reply.upper()
+            is_match = "YES" in ai_response
+            logger.info(f"🤖 AI Semantic Check: '{pending[position][0]}' vs {pending[position][1]} → {ai_response} (match: {is_match})")
+            results[position] = (is_match, True)
+
+        return results
+
+    def _semantic_match_request(
+        self,
+        student_answer: str,
+        correct_answers: List[str]
+    ) -> ChatCompletionRequest:
+        """YES/NO semantic equivalence check for one blank"""
+        prompt = f"""Determine if the student's answer is semantically equivalent to any of the accepted answers.
 
 Student's answer: "{student_answer}"
 
@@ -134,25 +226,148 @@ Consider:
 
 Response (YES or NO):"""
 
-            logger.info(f"🤖 AI Semantic Check: '{student_answer}' vs {correct_answers}")
+        return ChatCompletionRequest(
+            messages=[{"role": "user", "content": prompt}],
+            model=self.default_model,
+            temperature=0.1,
+            max_tokens=10
+        )
 
-            response = self.client.chat.completions.create(
-                model=self.default_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=10
-            )
+    def _batch_semantic_match_request(
+        self,
+        pending: Dict[Any, Tuple[str, List[str]]]
+    ) -> ChatCompletionRequest:
+        """Semantic equivalence check for several blanks, answered as one JSON object"""
+        blanks = "\n\n".join(
+            f"""Blank {position}:
+Student's answer: "{student_answer}"
+Accepted answers: {', '.join([f'"{ans}"' for ans in correct_answers])}"""
+            for position, (student_answer, correct_answers) in pending.items()
+        )
 
-            ai_response = response.choices[0].message.content.strip().upper()
-            is_match = "YES" in ai_response
+        prompt = f"""For each blank below, determine if the student's answer is semantically equivalent to any of that blank's accepted answers.
 
-            logger.info(f"   AI Response: {ai_response} → Match: {is_match}")
+{blanks}
 
-            return is_match, True
+Consider:
+- Synonyms (e.g., "happy" = "joyful")
+- Different word forms (e.g., "running" = "run")
+- Equivalent meanings (e.g., "2+2" = "four")
+
+Judge each blank only against its own accepted answers.
+
+Respond in JSON format with one entry per blank number:
+{{
+    "matches": {{"<blank number>": true/false}}
+}}"""
+
+        return ChatCompletionRequest(
+            messages=[{"role": "user", "content": prompt}],
+            model=self.default_model,
+            temperature=0.1,
+            max_tokens=20 + 10 * len(pending)
+        )
+
+    def text_sub_answer_grading_steps(
+        self,
+        sub_answers: Dict[str, Dict[str, str]],
+        model: Optional[str] = None,
+        batched: bool = GRADING_BATCH_ENABLED
+    ) -> ChatSteps:
+        """
+        Grade short/long sub-answers of a multi-part question against their correct answers (analyzer generator)
 
-        except Exception as e:
-            logger.error(f"AI semantic matching failed: {str(e)}")
-            return False, False
+        Args:
+            sub_answers: Dict mapping sub-question ID to {"question", "correct_answer", "student_answer"}
+            model: Model to grade with (defaults to LLM_MODEL)
+            batched: Grade every sub-answer in one request (sub-answers missing
+                from the batched reply are retried one request per sub-answer)
+
+        Returns (as the generator's value):
+            Dict mapping sub-question ID to {"is_correct", "similarity_score", "reasoning"},
+            or to the Exception if grading that sub-answer failed
+        """
+        model = model or self.default_model
+        results = {}
+
+        if batched and len(sub_answers) > 1:
+            try:
+                reply = yield self._batch_sub_answer_request(sub_answers, model)
+                graded = parse_json_reply(reply).get("results", {})
+                for sub_id in sub_answers:
+                    grade = graded.get(str(sub_id))
+                    if isinstance(grade, dict) and isinstance(grade.get("is_correct"), bool):
+                        results[sub_id] = grade
+            except Exception as e:
+                logger.error(f"Batched AI grading of {len(sub_answers)} sub-answers failed: {str(e)}")
+
+        remaining = [sub_id for sub_id in sub_answers if sub_id not in results]
+        if not remaining:
+            return results
+
+        replies = yield [self._sub_answer_request(sub_answers[sub_id], model) for sub_id in remaining]
+        for sub_id, reply in zip(remaining, replies):
+            try:
+                if isinstance(reply, Exception):
+                    raise reply
+                results[sub_id] = parse_json_reply(reply)
+            except Exception as e:
+                results[sub_id] = e
+
+        return results
+
+    def _sub_answer_request(self, sub_answer: Dict[str, str], model: str) -> ChatCompletionRequest:
+        prompt = f"""Compare the student's answer to the correct answer and determine correctness.
+
+Question: {sub_answer['question']}
+Correct Answer: {sub_answer['correct_answer']}
+Student Answer: {sub_answer['student_answer']}
+
+Respond in JSON format:
+{{
+    "is_correct": true/false,
+    "similarity_score": 0-100,
+    "reasoning": "brief explanation"
+}}"""
+
+        return ChatCompletionRequest(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            temperature=0.3,
+            max_tokens=300
+        )
+
+    def _batch_sub_answer_request(self, sub_answers: Dict[str, Dict[str, str]], model: str) -> ChatCompletionRequest:
+        parts = "\n\n".join(
+            f"""[{sub_id}]
+Question: {sub_answer['question']}
+Correct Answer: {sub_answer['correct_answer']}
+Student Answer: {sub_answer['student_answer']}"""
+            for sub_id, sub_answer in sub_answers.items()
+        )
+
+        prompt = f"""Compare each of the student's answers below to its correct answer and determine correctness.
+Grade every answer independently, only against its own correct answer.
+
+{parts}
+
+Respond in JSON format with one entry per answer ID (the ID in square brackets):
+{{
+    "results": {{
+        "<answer ID>": {{
+            "is_correct": true/false,
+            "similarity_score": 0-100,
+            "reasoning": "brief explanation"
+        }}
+    }}
+}}"""
+
+        return ChatCompletionRequest(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            temperature=0.3,
+            max_tokens=100 + 150 * len(sub_answers)
+        )
 
     def grade_mcq_multiple(
         self,
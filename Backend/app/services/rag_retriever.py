@@ -2,11 +2,156 @@
 RAG (Retrieval-Augmented Generation) retrieval service
 Fetches relevant course material context for AI feedback generation
 """
-from typing import List, Dict, Any, Optional
+import hashlib
+import json
+import re
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 
+from app.core.config import QUESTION_CONTEXT_CACHE_MAX_ENTRIES, QUESTION_CONTEXT_CACHE_TTL_SECONDS
 from app.models.document import Document
-from app.services.embedding import search_similar_chunks
+from app.services.embedding import search_similar_chunks, generate_embedding
+from app.services.vector_index import get_module_generation
+from app.utils.lru_cache import LRUCache
+
+
+# Question types where the student's wording says something about what they
+# misunderstood, so an answer-specific rerank is worth doing
+FREE_TEXT_QUESTION_TYPES = ('short', 'long', 'essay')
+
+# Retrieved candidates per question, shared by every student answering it
+_question_context_cache = LRUCache(
+    max_entries=QUESTION_CONTEXT_CACHE_MAX_ENTRIES,
+    ttl_seconds=QUESTION_CONTEXT_CACHE_TTL_SECONDS
+)
+
+_STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has have
+    this that with from they will would there their what when which who how
+    into than then them these those been being does did its also just more
+    some such only other about over very because between while where
+""".split())
+
+
+def _eligible_documents_query(db: Session, module_id: str):
+    return db.query(Document).filter(
+        Document.module_id == module_id,
+        Document.processing_status == "embedded",
+        Document.is_testbank == False  # Don't use testbank docs for context
+    )
+
+
+def _get_eligible_documents(db: Session, module_id: str) -> List[Document]:
+    """Embedded, non-testbank documents of a module (the ones RAG may quote)"""
+    documents = _eligible_documents_query(db, module_id).all()
+
+    print(f"RAG DEBUG: Looking for documents in module {module_id}")
+    print(f"   Found {len(documents)} embedded documents")
+
+    if not documents:
+        # Debug: Check what documents exist (regardless of status)
+        all_docs = db.query(Document).filter(Document.module_id == module_id).all()
+        print(f"   Total documents in module: {len(all_docs)}")
+        for doc in all_docs:
+            print(f"      - {doc.title}: status={doc.processing_status}, is_testbank={doc.is_testbank}")
+
+    return documents
+
+
+def _empty_context() -> Dict[str, Any]:
+    return {
+        'has_context': False,
+        'chunks': [],
+        'formatted_context': '',
+        'sources': []
+    }
+
+
+def _build_context(top_results: List[Dict[str, Any]], include_document_locations: bool) -> Dict[str, Any]:
+    """Wrap the final chunks in the context dict returned to callers"""
+    if not top_results:
+        return _empty_context()
+
+    # Format context for prompt
+    formatted_context = format_context_for_prompt(top_results, include_document_locations)
+
+    # Extract unique sources
+    sources = list(set([
+        chunk['document_title']
+        for chunk in top_results
+    ]))
+
+    return {
+        'has_context': True,
+        'chunks': top_results,
+        'formatted_context': formatted_context,
+        'sources': sources
+    }
+
+
+def _search_documents(
+    db: Session,
+    query: str,
+    module_id: str,
+    documents: List[Document],
+    limit: int,
+    similarity_threshold: float,
+    per_document_search: bool
+) -> List[Dict[str, Any]]:
+    """
+    Embed query once and return chunks above the threshold, highest similarity first
+
+    With per_document_search the top `limit` chunks are taken from each document,
+    otherwise from the whole module in one pass.
+    """
+    # Embed the query once and reuse it for every search below
+    try:
+        query_vector = generate_embedding(query)['embedding']
+    except Exception as e:
+        print(f"Error embedding RAG query: {str(e)}")
+        return []
+
+    document_ids = [str(doc.id) for doc in documents]
+
+    if per_document_search:
+        all_results = []
+        for doc_id in document_ids:
+            all_results.extend(search_similar_chunks(
+                db=db,
+                query_text=query,
+                module_id=module_id,
+                document_ids=[doc_id],
+                query_vector=query_vector,
+                limit=limit
+            ))
+    else:
+        all_results = search_similar_chunks(
+            db=db,
+            query_text=query,
+            module_id=module_id,
+            document_ids=document_ids,
+            query_vector=query_vector,
+            limit=limit
+        )
+
+    print(f"   Retrieved {len(all_results)} total chunks from {len(documents)} documents")
+
+    # Filter by similarity threshold
+    filtered_results = [
+        r for r in all_results
+        if r['similarity'] >= similarity_threshold
+    ]
+
+    print(f"   After filtering (threshold={similarity_threshold}): {len(filtered_results)} chunks")
+    if all_results and not filtered_results:
+        # Show top similarity scores to help debug threshold issues
+        top_3 = sorted(all_results, key=lambda x: x['similarity'], reverse=True)[:3]
+        top_scores = [f"{r['similarity']:.3f}" for r in top_3]
+        print(f"   Top 3 similarity scores: {top_scores}")
+
+    # Sort by similarity
+    filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
+    return filtered_results
 
 
 def get_context_for_feedback(
@@ -16,11 +161,15 @@ def get_context_for_feedback(
     module_id: str,
     max_chunks: int = 3,
     similarity_threshold: float = 0.7,
-    include_document_locations: bool = True
+    include_document_locations: bool = True,
+    per_document_search: bool = False
 ) -> Dict[str, Any]:
     """
     Retrieve relevant course material context for feedback generation
 
+    The query is embedded once and searched across all eligible module documents
+    in a single pass, so max_chunks and similarity_threshold apply module-wide.
+
     Args:
         db: Database session
         question_text: The question being answered
@@ -28,6 +177,9 @@ def get_context_for_feedback(
         module_id: Module ID to search within
         max_chunks: Maximum number of context chunks to retrieve
         similarity_threshold: Minimum similarity score (0-1)
+        include_document_locations: Ask the AI to cite page/slide locations
+        per_document_search: Take the top max_chunks from each document before
+            merging (legacy behaviour) instead of one module-wide search
 
     Returns:
         {
@@ -41,97 +193,146 @@ def get_context_for_feedback(
     query = f"Question: {question_text}\nAnswer: {student_answer}"
 
     # Get all embedded documents from the module
-    documents = db.query(Document).filter(
-        Document.module_id == module_id,
-        Document.processing_status == "embedded",
-        Document.is_testbank == False  # Don't use testbank docs for context
-    ).all()
+    documents = _get_eligible_documents(db, module_id)
+    if not documents:
+        return _empty_context()
 
-    print(f"RAG DEBUG: Looking for documents in module {module_id}")
-    print(f"   Found {len(documents)} embedded documents")
+    results = _search_documents(
+        db, query, module_id, documents, max_chunks, similarity_threshold, per_document_search
+    )
+    return _build_context(results[:max_chunks], include_document_locations)
 
-    if not documents:
-        # Debug: Check what documents exist (regardless of status)
-        all_docs = db.query(Document).filter(Document.module_id == module_id).all()
-        print(f"   Total documents in module: {len(all_docs)}")
-        for doc in all_docs:
-            print(f"      - {doc.title}: status={doc.processing_status}, is_testbank={doc.is_testbank}")
 
-        return {
-            'has_context': False,
-            'chunks': [],
-            'formatted_context': '',
-            'sources': []
-        }
+def _document_set_version(documents: List[Document]) -> str:
+    """
+    Fingerprint of the documents RAG can draw from
 
-    # Search across all module documents
-    all_results = []
-    for doc in documents:
-        try:
-            results = search_similar_chunks(
-                db=db,
-                query_text=query,
-                document_id=str(doc.id),
-                limit=max_chunks
-            )
-            # Add document info to each result
-            for result in results:
-                result['document_title'] = doc.title
-                result['document_id'] = str(doc.id)
-            all_results.extend(results)
-        except Exception as e:
-            print(f"Error searching document {doc.id}: {str(e)}")
-            continue
+    Changes when a document is added, removed or re-embedded (processing
+    metadata is rewritten on every run), so other instances stop serving
+    stale cached contexts even without an explicit invalidation.
+    """
+    fingerprint = sorted(
+        (str(doc.id), str(doc.uploaded_at), json.dumps(doc.processing_metadata or {}, sort_keys=True, default=str))
+        for doc in documents
+    )
+    return hashlib.sha1(json.dumps(fingerprint).encode("utf-8")).hexdigest()
 
-    print(f"   Retrieved {len(all_results)} total chunks from {len(documents)} documents")
 
-    # Filter by similarity threshold
-    filtered_results = [
-        r for r in all_results
-        if r['similarity'] >= similarity_threshold
-    ]
+def get_document_set_version(db: Session, module_id: str) -> str:
+    """Fingerprint of the documents RAG can draw from in a module (see _document_set_version)"""
+    return _document_set_version(_eligible_documents_query(db, module_id).all())
 
-    print(f"   After filtering (threshold={similarity_threshold}): {len(filtered_results)} chunks")
-    if all_results and not filtered_results:
-        # Show top similarity scores to help debug threshold issues
-        top_3 = sorted(all_results, key=lambda x: x['similarity'], reverse=True)[:3]
-        top_scores = [f"{r['similarity']:.3f}" for r in top_3]
-        print(f"   Top 3 similarity scores: {top_scores}")
 
-    # Sort by similarity and get top N
-    filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
-    top_results = filtered_results[:max_chunks]
+def _terms(text: str) -> frozenset:
+    """Lowercased content words used for the lexical answer rerank"""
+    return frozenset(
+        word for word in re.findall(r"[a-z0-9]+", (text or "").lower())
+        if len(word) > 2 and word not in _STOPWORDS
+    )
 
-    if not top_results:
-        return {
-            'has_context': False,
-            'chunks': [],
-            'formatted_context': '',
-            'sources': []
-        }
 
-    # Format context for prompt
-    formatted_context = format_context_for_prompt(top_results, include_document_locations)
+def _rerank_for_answer(
+    candidates: List[Tuple[Dict[str, Any], frozenset]],
+    student_answer: str,
+    weight: float
+) -> List[Dict[str, Any]]:
+    """
+    Re-order question-level candidates by blending in word overlap with the answer
 
-    # Extract unique sources
-    sources = list(set([
-        chunk['document_title']
-        for chunk in top_results
-    ]))
+    score = (1 - weight) * similarity + weight * (share of answer terms found in the chunk)
+    The chunk's reported 'similarity' is left unchanged.
+    """
+    answer_terms = _terms(student_answer)
+    if not answer_terms or weight <= 0:
+        return [chunk for chunk, _ in candidates]
 
-    return {
-        'has_context': True,
-        'chunks': top_results,
-        'formatted_context': formatted_context,
-        'sources': sources
-    }
+    def score(candidate):
+        chunk, chunk_terms = candidate
+        overlap = len(answer_terms & chunk_terms) / len(answer_terms)
+        return (1 - weight) * chunk['similarity'] + weight * overlap
 
+    return [chunk for chunk, _ in sorted(candidates, key=score, reverse=True)]
 
 
+def get_question_context(
+    db: Session,
+    question_id: str,
+    question_text: str,
+    student_answer: str,
+    module_id: str,
+    question_type: str,
+    max_chunks: int = 3,
+    similarity_threshold: float = 0.7,
+    include_document_locations: bool = True,
+    per_document_search: bool = False,
+    answer_rerank_weight: float = 0.2,
+    candidate_pool_size: int = 3
+) -> Dict[str, Any]:
+    """
+    Retrieve course material context for a question, shared across all students
+
+    Retrieval runs against the question text only and the candidates are cached
+    per (question, question text, document-set version, rag settings). Each
+    answer then only pays for an optional lexical rerank of those candidates.
 
+    Args:
+        db: Database session
+        question_id: Question the answer belongs to
+        question_text: The question being answered
+        student_answer: The student's response (used only for the rerank)
+        module_id: Module ID to search within
+        question_type: Question type - the rerank only applies to free-text types
+        max_chunks: Maximum number of context chunks to return
+        similarity_threshold: Minimum similarity score (0-1)
+        include_document_locations: Ask the AI to cite page/slide locations
+        per_document_search: See get_context_for_feedback
+        answer_rerank_weight: Weight (0-1) of answer word overlap in the rerank (0 disables it)
+        candidate_pool_size: Candidates retrieved per returned chunk when reranking
+
+    Returns:
+        Same shape as get_context_for_feedback()
+    """
+    documents = _get_eligible_documents(db, module_id)
+    if not documents:
+        return _empty_context()
+
+    rerank = question_type in FREE_TEXT_QUESTION_TYPES and answer_rerank_weight > 0
+    pool_limit = max_chunks * max(1, candidate_pool_size) if rerank else max_chunks
+
+    cache_key = (
+        str(question_id),
+        hashlib.sha1((question_text or "").encode("utf-8")).hexdigest(),
+        str(module_id),
+        _document_set_version(documents),
+        get_module_generation(module_id),
+        pool_limit,
+        similarity_threshold,
+        per_document_search
+    )
+
+    candidates = _question_context_cache.get(cache_key)
+    if candidates is None:
+        results = _search_documents(
+            db, f"Question: {question_text}", module_id, documents,
+            pool_limit, similarity_threshold, per_document_search
+        )
+        candidates = [(chunk, _terms(chunk['text'])) for chunk in results[:pool_limit]]
+        _question_context_cache.set(cache_key, candidates)
+    else:
+        print(f"RAG DEBUG: Using cached context for question {question_id} ({len(candidates)} candidates)")
+
+    if rerank:
+        ordered = _rerank_for_answer(candidates, student_answer, answer_rerank_weight)
+    else:
+        ordered = [chunk for chunk, _ in candidates]
 
+    # Copy so callers can't modify the cached chunks
+    return _build_context([dict(chunk) for chunk in ordered[:max_chunks]], include_document_locations)
 
 
+def get_question_context_cache_stats() -> Dict[str, Any]:
+    """Cache counters for monitoring"""
+    return _question_context_cache.stats()
 
 
 def format_context_for_prompt(chunks: List[Dict[str, Any]], include_document_locations: bool = True) -> str:
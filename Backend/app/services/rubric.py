@@ -8,6 +8,7 @@ from copy import deepcopy
 
 from app.models.module import Module
 from app.crud.module import get_module_by_id
+from app.crud.feedback_cache import delete_module_feedback_cache
 from app.config.feedback_templates import RUBRIC_TEMPLATES, get_template, list_templates
 
 
@@ -175,6 +176,9 @@ def update_module_rubric(
     db.commit()
     db.refresh(module)
 
+    # Cached feedback was generated with the old rubric
+    delete_module_feedback_cache(db, module_id)
+
     return module
 
 
@@ -239,6 +243,9 @@ def apply_template_to_module(
     db.commit()
     db.refresh(module)
 
+    # Cached feedback was generated with the old rubric
+    delete_module_feedback_cache(db, module_id)
+
     return module
 
 
@@ -308,6 +315,16 @@ def validate_rubric(rubric: Dict[str, Any]) -> List[str]:
             elif chunks < 1 or chunks > 10:
                 errors.append("Max context chunks must be between 1 and 10")
 
+        if "per_document_search" in rag and not isinstance(rag["per_document_search"], bool):
+            errors.append("Per-document search must be true or false")
+
+        if "answer_rerank_weight" in rag:
+            weight = rag["answer_rerank_weight"]
+            if not isinstance(weight, (int, float)):
+                errors.append("Answer rerank weight must be a number")
+            elif weight < 0.0 or weight > 1.0:
+                errors.append("Answer rerank weight must be between 0.0 and 1.0")
+
     # Validate grading thresholds
     if "grading_thresholds" in rubric:
         thresholds = rubric["grading_thresholds"]
@@ -0,0 +1,123 @@
+"""
+Embedding pre-grader for short/long answers
+Compares the student's answer with the question's reference answer by
+embedding similarity, which takes one embeddings call (the reference answer's
+embedding is served from the embedding cache after the first student) instead
+of a full LLM analysis.
+
+The result is a provisional score pushed to the student over the feedback
+events stream while the narrative feedback is generated. In 'gate' mode a
+clearly correct short answer is finalized from the pre-grade alone; everything
+else (ambiguous or low similarity, long answers, rubrics with custom
+instructions) still gets the full LLM feedback.
+
+TEXT_PREGRADE_MODE: off | provisional | gate
+"""
+import logging
+from typing import Dict, Any, Optional
+
+from app.core.config import (
+    TEXT_PREGRADE_MODE,
+    TEXT_PREGRADE_HIGH_SIMILARITY,
+    TEXT_PREGRADE_LOW_SIMILARITY
+)
+from app.services.embedding import generate_embedding, cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+PREGRADE_QUESTION_TYPES = ('short', 'long')
+
+
+def pregrade_enabled(question_type: str) -> bool:
+    return TEXT_PREGRADE_MODE in ('provisional', 'gate') and question_type in PREGRADE_QUESTION_TYPES
+
+
+def _needs_full_feedback(question_type: str, band: str, rubric: Dict[str, Any]) -> Optional[str]:
+    """Why an answer must be escalated to the LLM, or None if the pre-grade can stand"""
+    if TEXT_PREGRADE_MODE != 'gate':
+        return "provisional mode"
+    if band != 'likely_correct':
+        return band
+    if question_type != 'short':
+        return "long answers are graded against the rubric"
+    if (rubric.get("custom_instructions") or "").strip():
+        return "rubric has custom instructions"
+    if rubric.get("question_type_settings", {}).get("short", {}).get("check_grammar"):
+        return "rubric checks grammar"
+    return None
+
+
+def pregrade_text_answer(
+    question_type: str,
+    reference_answer: Optional[str],
+    student_answer: str,
+    rubric: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Provisional score of a short/long answer from embedding similarity
+
+    Args:
+        question_type: 'short' or 'long'
+        reference_answer: The question's correct_answer
+        student_answer: The student's answer text
+        rubric: Module rubric (decides which answers need full feedback)
+
+    Returns:
+        {
+            'similarity': float,        # Cosine similarity to the reference answer
+            'provisional_score': int,   # 0-100
+            'band': str,                # likely_correct | ambiguous | likely_incorrect
+            'escalate': bool,           # Whether full LLM feedback is still needed
+            'escalation_reason': str | None
+        }
+        or None if pre-grading is off, not applicable, or the embedding call failed
+    """
+    if not pregrade_enabled(question_type):
+        return None
+    if not (reference_answer or "").strip() or not (student_answer or "").strip():
+        return None
+
+    try:
+        # The reference answer is embedded once and cached; student answers aren't stored
+        reference = generate_embedding(reference_answer)['embedding']
+        answer = generate_embedding(student_answer, use_cache=False)['embedding']
+    except Exception as e:
+        logger.warning(f"⚠️ Embedding pre-grade failed, using full feedback only: {str(e)}")
+        return None
+
+    similarity = cosine_similarity(reference, answer)
+
+    if similarity >= TEXT_PREGRADE_HIGH_SIMILARITY:
+        band = 'likely_correct'
+    elif similarity <= TEXT_PREGRADE_LOW_SIMILARITY:
+        band = 'likely_incorrect'
+    else:
+        band = 'ambiguous'
+
+    # Linear between the two thresholds
+    span = TEXT_PREGRADE_HIGH_SIMILARITY - TEXT_PREGRADE_LOW_SIMILARITY
+    fraction = (similarity - TEXT_PREGRADE_LOW_SIMILARITY) / span if span > 0 else float(band == 'likely_correct')
+    provisional_score = int(round(min(max(fraction, 0.0), 1.0) * 100))
+
+    reason = _needs_full_feedback(question_type, band, rubric)
+    logger.info(f"📏 Pre-grade: similarity={similarity:.3f} → {provisional_score}% ({band}), escalate={reason is not None}")
+
+    return {
+        'similarity': round(similarity, 4),
+        'provisional_score': provisional_score,
+        'band': band,
+        'escalate': reason is not None,
+        'escalation_reason': reason
+    }
+
+
+def provisional_event(pregrade: Optional[Dict[str, Any]], points_possible: float) -> Optional[Dict[str, Any]]:
+    """Student-facing part of a pre-grade, for the feedback events stream"""
+    if pregrade is None:
+        return None
+    return {
+        'score': pregrade['provisional_score'],
+        'points_earned': round(pregrade['provisional_score'] / 100.0 * (points_possible or 0), 2),
+        'points_possible': points_possible,
+        'final': not pregrade['escalate']
+    }
@@ -0,0 +1,217 @@
+"""
+In-process vector index for module-scoped RAG retrieval
+Keeps a pre-normalized float32 matrix of chunk embeddings per module so a search
+is a single matrix-vector product instead of a Python loop over every row
+"""
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import VECTOR_INDEX_MAX_MODULES, VECTOR_INDEX_TTL_SECONDS
+from app.models.document import Document
+from app.models.document_chunk import DocumentChunk
+from app.models.document_embedding import DocumentEmbedding
+from app.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class ModuleVectorIndex:
+    """
+    Embeddings for every chunk in a module, stored as parallel arrays
+
+    matrix[i] is the L2-normalized embedding of the chunk whose id, document,
+    text and metadata live at position i of the other arrays.
+    """
+
+    def __init__(
+        self,
+        module_id: str,
+        matrix: np.ndarray,
+        chunk_ids: List[Any],
+        document_ids: List[Any],
+        document_titles: List[str],
+        texts: List[str],
+        chunk_indices: List[int],
+        metadata: List[Dict[str, Any]]
+    ):
+        self.module_id = module_id
+        self.matrix = matrix
+        self.chunk_ids = chunk_ids
+        self.document_ids = np.array([str(doc_id) for doc_id in document_ids])
+        self.document_titles = document_titles
+        self.texts = texts
+        self.chunk_indices = chunk_indices
+        self.metadata = metadata
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        document_ids: Optional[Iterable[str]] = None,
+        min_similarity: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the top `limit` chunks by cosine similarity to query_vector
+
+        Args:
+            query_vector: Query embedding (does not need to be normalized)
+            limit: Maximum number of results
+            document_ids: Optional set of document IDs to restrict the search to
+            min_similarity: Optional similarity floor applied before ranking
+
+        Returns:
+            List of dicts with 'chunk_id', 'document_id', 'document_title',
+            'similarity', 'text', 'chunk_index', 'metadata' (highest first)
+        """
+        if len(self) == 0 or limit <= 0:
+            return []
+
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        if query.shape[0] != self.matrix.shape[1]:
+            logger.warning(
+                f"Query vector has {query.shape[0]} dims but module {self.module_id} index has {self.matrix.shape[1]}"
+            )
+            return []
+
+        scores = self.matrix @ query
+
+        # Exclude rows outside the requested documents / below the threshold
+        candidate_mask = np.ones(len(self), dtype=bool)
+        if document_ids is not None:
+            candidate_mask &= np.isin(self.document_ids, [str(doc_id) for doc_id in document_ids])
+        if min_similarity is not None:
+            candidate_mask &= scores >= min_similarity
+
+        candidates = np.flatnonzero(candidate_mask)
+        if candidates.size == 0:
+            return []
+
+        k = min(limit, candidates.size)
+        candidate_scores = scores[candidates]
+        if k < candidates.size:
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+        else:
+            top = np.arange(candidates.size)
+        top = top[np.argsort(-candidate_scores[top])]
+
+        results = []
+        for position in candidates[top]:
+            results.append({
+                'chunk_id': self.chunk_ids[position],
+                'document_id': str(self.document_ids[position]),
+                'document_title': self.document_titles[position],
+                'similarity': float(scores[position]),
+                'text': self.texts[position],
+                'chunk_index': self.chunk_indices[position],
+                'metadata': self.metadata[position] or {}
+            })
+        return results
+
+
+_index_cache = LRUCache(max_entries=VECTOR_INDEX_MAX_MODULES, ttl_seconds=VECTOR_INDEX_TTL_SECONDS)
+
+# Bumped on every invalidation so caches derived from a module's embeddings
+# (e.g. per-question RAG context) can include it in their keys
+_module_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize a vector or each row of a matrix (zero vectors stay zero)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def build_index_from_rows(module_id: str, rows: List[Any]) -> ModuleVectorIndex:
+    """
+    Build an index from query rows with embedding_vector, chunk_id, document_id,
+    title, chunk_text, chunk_index and chunk_metadata attributes
+    """
+    if rows:
+        matrix = _normalize(np.asarray([row.embedding_vector for row in rows], dtype=np.float32))
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+
+    return ModuleVectorIndex(
+        module_id=module_id,
+        matrix=matrix,
+        chunk_ids=[row.chunk_id for row in rows],
+        document_ids=[row.document_id for row in rows],
+        document_titles=[row.title for row in rows],
+        texts=[row.chunk_text for row in rows],
+        chunk_indices=[row.chunk_index for row in rows],
+        metadata=[row.chunk_metadata for row in rows]
+    )
+
+
+def load_embedding_rows(db: Session, module_id: Optional[str] = None) -> List[Any]:
+    """
+    Load embeddings together with their chunk text and document title in one query
+
+    Args:
+        db: Database session
+        module_id: Restrict to one module (None loads every embedding)
+    """
+    query = db.query(
+        DocumentEmbedding.embedding_vector,
+        DocumentEmbedding.chunk_id,
+        DocumentEmbedding.document_id,
+        Document.title,
+        DocumentChunk.chunk_text,
+        DocumentChunk.chunk_index,
+        DocumentChunk.chunk_metadata
+    ).join(
+        DocumentChunk, DocumentChunk.id == DocumentEmbedding.chunk_id
+    ).join(
+        Document, Document.id == DocumentEmbedding.document_id
+    )
+    if module_id is not None:
+        query = query.filter(Document.module_id == module_id)
+    return query.all()
+
+
+def get_module_index(db: Session, module_id: str) -> ModuleVectorIndex:
+    """
+    Get the vector index for a module, building it on first use
+
+    Indexes are kept in an LRU so only recently used modules stay in memory.
+    """
+    module_key = str(module_id)
+    index = _index_cache.get(module_key)
+    if index is not None:
+        return index
+
+    rows = load_embedding_rows(db, module_key)
+    index = build_index_from_rows(module_key, rows)
+    _index_cache.set(module_key, index)
+    logger.info(f"📐 Built vector index for module {module_key}: {len(index)} chunks")
+    return index
+
+
+def invalidate_module_index(module_id: Optional[str]) -> None:
+    """Drop the cached index for a module (call when its embeddings change)"""
+    if module_id is None:
+        return
+    with _generations_lock:
+        _module_generations[str(module_id)] = _module_generations.get(str(module_id), 0) + 1
+    if _index_cache.pop(str(module_id)) is not None:
+        logger.info(f"🧹 Invalidated vector index for module {module_id}")
+
+
+def get_module_generation(module_id: str) -> int:
+    """How many times this module's embeddings have changed in this process"""
+    with _generations_lock:
+        return _module_generations.get(str(module_id), 0)
+
+
+def get_index_cache_stats() -> Dict[str, Any]:
+    """Cache counters for monitoring"""
+    return _index_cache.stats()
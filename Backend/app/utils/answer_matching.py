@@ -0,0 +1,304 @@
+"""
+Local (non-AI) matching of fill-in-the-blank answers
+Decides slips of the keyboard, plurals, a leading article, punctuation and
+numerically equal answers deterministically, so only answers it can't decide
+are sent to the LLM semantic check.
+
+Matching tiers, tried against each of a blank's accepted answers:
+  1. normalized text - Unicode (NFKC, accents), case, punctuation, whitespace
+     and a leading article ("a", "an", "the") ignored; "Vitamin A" keeps its "a"
+  2. inflections - "cells" = "cell", "studies" = "study", "running" = "run";
+     only a plural, -ed or -ing ending on the longer word, so "plan" / "plane"
+     and "even" / "evening" go to the LLM
+  3. numbers - "1,000" = "1000", "0.5" = "1/2" = "50%"... within the blank's
+     numeric_tolerance; a number that doesn't match numeric-only accepted
+     answers is rejected without the LLM
+  4. typos - one word of 8+ letters with two adjacent letters swapped or a
+     doubled letter dropped / added ("mitochondira", "accomodate"), never in
+     the first letter. Any other near miss ("alkane" / "alkene", "nitrite" /
+     "nitrate") is a different word as often as a typo, so it goes to the LLM.
+     A blank can turn this tier off with typo_tolerance: false.
+
+Case-sensitive blanks only use tiers 1 (without case folding) and 3.
+"""
+import re
+import threading
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import FILL_BLANK_MATCHER_CACHE_MAX_ENTRIES
+from app.utils.lru_cache import LRUCache
+
+# Relative difference below which two numbers are equal when a blank sets no numeric_tolerance
+DEFAULT_RELATIVE_TOLERANCE = 1e-9
+
+_ARTICLES = frozenset(("a", "an", "the"))
+_VOWELS = "aeiou"
+
+# Shortest word the typo tier corrects; shorter slips too often make another word ("form" / "from")
+MIN_TYPO_WORD_LETTERS = 8
+
+_NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20,
+    "hundred": 100, "thousand": 1000, "million": 1000000
+}
+
+# At least one mantissa digit, so bare exponents ("E1", "e5") stay text
+_NUMBER_PATTERN = re.compile(r"^[+-]?((\d{1,3}(,\d{3})+|\d+)(\.\d+)?|\.\d+)([eE][+-]?\d+)?$")
+_FRACTION_PATTERN = re.compile(r"^([+-]?\d+)\s*/\s*(\d+)$")
+
+# Compiled matchers per blank configuration, shared by every student answering it
+_matcher_cache = LRUCache(max_entries=FILL_BLANK_MATCHER_CACHE_MAX_ENTRIES)
+
+_counters_lock = threading.Lock()
+_counters = {'accepted': 0, 'rejected': 0, 'undecided': 0}
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _is_inflection(word: str, base: str) -> bool:
+    """
+    Whether word is base with a plural, -ed or -ing ending ("cells" / "cell",
+    "studies" / "study", "running" / "run", "making" / "make")
+
+    A bare -ed / -ing counts only after a base ending in two consonants or in
+    w, x, y ("walked", "played"), where the spelling can't be another word's;
+    "evening" / "even" and "opening" / "open" go to the LLM.
+    """
+    if len(base) < 3 or len(word) <= len(base) or not (word.isalpha() and base.isalpha()):
+        return False
+
+    if word == base + "s":
+        return not base.endswith(("s", "u", "i"))
+    if word == base + "es":
+        return base.endswith(("s", "x", "z", "ch", "sh"))
+    if base.endswith("y") and word in (base[:-1] + "ies", base[:-1] + "ied"):
+        return True
+
+    for suffix in ("ing", "ed"):
+        if not word.endswith(suffix):
+            continue
+        stem = word[:-len(suffix)]
+        if stem == base:
+            return base[-1] in "wxy" or (base[-1] not in _VOWELS and base[-2] not in _VOWELS)
+        if stem + "e" == base:
+            return True
+        return stem[:-1] == base and stem[-1] == stem[-2] and stem[-1] not in _VOWELS + "wxy"
+    return False
+
+
+def _inflection_of(answer_words: List[str], accepted_words: List[str]) -> bool:
+    """Whether an answer is an accepted answer with words in another inflection (see _is_inflection)"""
+    return len(answer_words) == len(accepted_words) and all(
+        a == b or _is_inflection(a, b) or _is_inflection(b, a)
+        for a, b in zip(answer_words, accepted_words)
+    )
+
+
+def normalize_answer(text: str, case_sensitive: bool = False) -> str:
+    """
+    Canonical form of an answer for comparison
+
+    NFKC, accents stripped, punctuation turned into spaces (unless the whole
+    answer is a number), whitespace collapsed and a leading article dropped
+    ("the mitochondria" -> "mitochondria"). Later articles are kept, since a
+    trailing letter can be the answer ("Vitamin A", "Hepatitis A").
+    """
+    text = unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).replace("\u2212", "-").strip()
+    if not case_sensitive:
+        text = text.casefold()
+
+    if parse_number(text) is not None:
+        return text
+
+    words = re.sub(r"[^\w\s]|_", " ", text).split()
+    if len(words) > 1 and words[0].lower() in _ARTICLES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Numeric value of a normalized answer ("1,000", "2.5e3", "3/4", "50%", "four"), or None"""
+    if not text:
+        return None
+
+    text = text.replace(" ", "")
+    percent = text.endswith("%")
+    if percent:
+        text = text[:-1].strip()
+
+    value = None
+    if text.lower() in _NUMBER_WORDS:
+        value = float(_NUMBER_WORDS[text.lower()])
+    elif _NUMBER_PATTERN.match(text):
+        value = float(text.replace(",", ""))
+    else:
+        fraction = _FRACTION_PATTERN.match(text)
+        if fraction and int(fraction.group(2)) != 0:
+            value = int(fraction.group(1)) / int(fraction.group(2))
+
+    if value is None:
+        return None
+    return value / 100 if percent else value
+
+
+def is_typo(a: str, b: str) -> bool:
+    """
+    Whether two different words differ by one slip of the keyboard: two
+    adjacent letters swapped, or one letter of a double dropped / added
+    """
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return (
+            len(diff) == 2 and diff[1] == diff[0] + 1
+            and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        )
+
+    if abs(len(a) - len(b)) != 1:
+        return False
+    longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+    i = next((i for i in range(len(shorter)) if longer[i] != shorter[i]), len(shorter))
+    return longer[:i] + longer[i + 1:] == shorter and (
+        (i > 0 and longer[i] == longer[i - 1]) or (i + 1 < len(longer) and longer[i] == longer[i + 1])
+    )
+
+
+def _typo_of(answer_words: List[str], accepted_words: List[str]) -> bool:
+    """Whether an answer is an accepted answer with one typo in one long word (see is_typo)"""
+    if len(answer_words) != len(accepted_words):
+        return False
+    differing = [(a, b) for a, b in zip(answer_words, accepted_words) if a != b]
+    if len(differing) != 1:
+        return False
+    word, accepted = differing[0]
+    return (
+        min(len(word), len(accepted)) >= MIN_TYPO_WORD_LETTERS
+        and word[0] == accepted[0]
+        and is_typo(word, accepted)
+    )
+
+
+class BlankMatcher:
+    """A blank's accepted answers, precompiled for the local matching tiers"""
+
+    def __init__(
+        self,
+        correct_answers: List[str],
+        case_sensitive: bool = False,
+        numeric_tolerance: Optional[float] = None,
+        typo_tolerance: bool = True
+    ):
+        self.case_sensitive = case_sensitive
+        self.numeric_tolerance = numeric_tolerance
+
+        self.typo_tolerance = typo_tolerance
+
+        self.normalized = set()
+        self.numbers = []
+        self.text_words = []  # Words of accepted text answers, for the inflection and typo tiers
+        has_text_answers = False
+
+        for answer in correct_answers:
+            normalized = normalize_answer(answer, case_sensitive)
+            if not normalized:
+                continue
+            self.normalized.add(normalized)
+
+            number = parse_number(normalized)
+            if number is not None:
+                self.numbers.append(number)
+                continue
+
+            has_text_answers = True
+            if not case_sensitive:
+                self.text_words.append(normalized.split())
+
+        # Numbers that match none of the accepted numbers are wrong only if every accepted answer is a number
+        self.numeric_only = bool(self.numbers) and not has_text_answers
+
+    def _numbers_equal(self, a: float, b: float) -> bool:
+        if self.numeric_tolerance is not None:
+            return abs(a - b) <= self.numeric_tolerance
+        return abs(a - b) <= DEFAULT_RELATIVE_TOLERANCE * max(abs(a), abs(b), 1.0)
+
+    def match(self, student_answer: str) -> Tuple[Optional[bool], Optional[str]]:
+        """
+        Decide a student's answer locally
+
+        Returns:
+            (True, tier) if it matches an accepted answer, (False, tier) if it
+            is certainly wrong, (None, None) if the LLM has to decide
+        """
+        normalized = normalize_answer(student_answer, self.case_sensitive)
+        if not normalized:
+            return None, None
+
+        if normalized in self.normalized:
+            return True, "normalized"
+
+        number = parse_number(normalized)
+        if number is not None and self.numbers:
+            if any(self._numbers_equal(number, accepted) for accepted in self.numbers):
+                return True, "numeric"
+            if self.numeric_only:
+                return False, "numeric"
+            return None, None
+
+        if self.case_sensitive or number is not None:
+            return None, None
+
+        words = normalized.split()
+        if any(_inflection_of(words, accepted) for accepted in self.text_words):
+            return True, "stem"
+
+        if self.typo_tolerance and any(_typo_of(words, accepted) for accepted in self.text_words):
+            return True, "typo"
+
+        return None, None
+
+
+def get_blank_matcher(blank_config: Dict[str, Any]) -> BlankMatcher:
+    """Compiled matcher for a blank configuration (cached across students)"""
+    correct_answers = tuple(blank_config.get('correct_answers', []))
+    case_sensitive = bool(blank_config.get('case_sensitive', False))
+    numeric_tolerance = blank_config.get('numeric_tolerance')
+    typo_tolerance = bool(blank_config.get('typo_tolerance', True))
+
+    key = (correct_answers, case_sensitive, numeric_tolerance, typo_tolerance)
+    matcher = _matcher_cache.get(key)
+    if matcher is None:
+        matcher = BlankMatcher(list(correct_answers), case_sensitive, numeric_tolerance, typo_tolerance)
+        _matcher_cache.set(key, matcher)
+    return matcher
+
+
+def match_blank_answer(blank_config: Dict[str, Any], student_answer: str) -> Tuple[Optional[bool], Optional[str]]:
+    """
+    Local verdict on a blank the exact-match check rejected (see BlankMatcher.match)
+
+    Counts every verdict, so get_answer_matching_stats() shows how many LLM checks were avoided.
+    """
+    verdict, tier = get_blank_matcher(blank_config).match(student_answer)
+    _count('undecided' if verdict is None else 'accepted' if verdict else 'rejected')
+    return verdict, tier
+
+
+def get_answer_matching_stats() -> Dict[str, Any]:
+    """Local-tier counters for this process"""
+    with _counters_lock:
+        counters = dict(_counters)
+    decided = counters['accepted'] + counters['rejected']
+    checked = decided + counters['undecided']
+    return {
+        **counters,
+        'llm_checks_avoided': decided,
+        'hit_rate': round(decided / checked, 4) if checked else 0.0,
+        'matcher_cache': _matcher_cache.stats()
+    }
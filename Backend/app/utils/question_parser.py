@@ -1,9 +1,7 @@
 # app/utils/question_parser.py
 import re
 import json
-import os
 from uuid import UUID
-from openai import OpenAI
 
 def parse_testbank_text_to_questions(raw_text: str, module_id: UUID, document_id: UUID = None) -> list[dict]:
     questions = []
@@ -177,7 +175,8 @@ def parse_testbank_with_ai(raw_text: str, module_id: UUID, document_id: UUID = N
         List of question dictionaries
     """
     try:
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        from app.services.openai_client import get_openai_client
+        client = get_openai_client()
 
         prompt = f"""You are an expert at extracting multiple-choice questions from testbank documents.
 
@@ -214,13 +213,15 @@ Testbank Text:
 
 Return ONLY the JSON array, no additional text."""
 
-        response = client.chat.completions.create(
+        response = client.create_chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a precise testbank question extractor. Return only valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
+            max_tokens=None,  # Whole testbanks produce long output
+            timeout=300.0,
             response_format={"type": "json_object"}
         )
 
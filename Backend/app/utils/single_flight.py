@@ -0,0 +1,83 @@
+"""
+In-process single-flight (request coalescing)
+Concurrent calls with the same key share one execution: the first caller runs
+the work, the others wait for its result instead of repeating it. Works across
+threads and asyncio event loops alike, since waiters block on (or await) the
+same concurrent.futures.Future.
+
+Only coalesces within one process; results should also be stored somewhere
+shared (e.g. the feedback_cache table) for other processes and later requests.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent calls per key; nothing is kept once a call finishes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """(flight for key, whether the caller leads it)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.followers += 1
+                return flight, False
+            flight = Future()
+            self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def _land(self, key: Hashable, flight: Future) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless a call with the same key is already running (blocking)
+
+        Returns:
+            (result, whether it was shared from another caller's run).
+            An exception raised by the leader is raised in every waiter.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.result(), True
+
+        try:
+            flight.set_result(fn())
+        except BaseException as e:
+            flight.set_exception(e)
+        finally:
+            self._land(key, flight)
+        return flight.result(), False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of do(); fn is a coroutine function"""
+        flight, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(flight), True
+
+        try:
+            flight.set_result(await fn())
+        except BaseException as e:
+            flight.set_exception(e)
+        finally:
+            self._land(key, flight)
+        return flight.result(), False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'followers': self.followers
+            }
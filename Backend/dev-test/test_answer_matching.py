@@ -0,0 +1,80 @@
+"""
+Unit cases for local fill-in-the-blank matching (app.utils.answer_matching)
+Needs no database or API key. Run with pytest or directly:
+
+    python dev-test/test_answer_matching.py
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.answer_matching import match_blank_answer, parse_number
+
+
+def verdict(correct_answers, student_answer, **blank_config):
+    return match_blank_answer({'correct_answers': correct_answers, **blank_config}, student_answer)
+
+
+def test_bare_exponents_are_text():
+    for text in ("E1", "E2", "e1", "e5", "E+5", "e-3"):
+        assert parse_number(text) is None, text
+    assert verdict(['E1'], 'E2') == (None, None)
+    assert verdict(['SN1'], 'SN2') == (None, None)
+    assert verdict(['E1'], 'e1') == (True, 'normalized')
+
+
+def test_numbers():
+    assert parse_number("1e5") == 100000
+    assert parse_number(".5") == 0.5
+    assert parse_number("1,000.5") == 1000.5
+    assert parse_number("50%") == 0.5
+    assert verdict(['0.5'], '1/2') == (True, 'numeric')
+    assert verdict(['42'], '43') == (False, 'numeric')
+
+
+def test_inflections():
+    for accepted, answer in (
+        ("cell", "cells"), ("ion", "ions"), ("study", "studies"), ("box", "boxes"),
+        ("class", "classes"), ("run", "running"), ("stop", "stopped"),
+        ("make", "making"), ("walk", "walked"), ("play", "played")
+    ):
+        assert verdict([accepted], answer) == (True, 'stem'), answer
+        assert verdict([answer], accepted) == (True, 'stem'), accepted
+
+
+def test_different_words_are_not_inflections():
+    for accepted, answer in (
+        ("plan", "plane"), ("cub", "cube"), ("ton", "tone"), ("sit", "site"),
+        ("fin", "fine"), ("even", "evening"), ("open", "opening")
+    ):
+        assert verdict([accepted], answer) == (None, None), answer
+        assert verdict([answer], accepted) == (None, None), accepted
+
+
+def test_typos():
+    assert verdict(['mitochondria'], 'mitochondira') == (True, 'typo')
+    assert verdict(['accommodate'], 'accomodate') == (True, 'typo')
+    assert verdict(['accommodate'], 'accomodate', typo_tolerance=False) == (None, None)
+    for accepted, answer in (
+        ("alkane", "alkene"), ("ethane", "ethene"), ("nitrite", "nitrate"),
+        ("sulfite", "sulfate"), ("insulin", "inulin")
+    ):
+        assert verdict([accepted], answer) == (None, None), answer
+
+
+def test_articles():
+    assert verdict(['mitochondria'], 'the mitochondria') == (True, 'normalized')
+    assert verdict(['Vitamin A'], 'vitamin') == (None, None)
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in list(globals().items()) if name.startswith("test_")]
+    failed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+    sys.exit(1 if failed else 0)
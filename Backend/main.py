@@ -86,12 +86,30 @@ def on_startup():
         raise
 
     # ✅ Ensure all models are imported for table creation
-    from app.models import user, document, question, module, student_answer, student_enrollment, survey_response, question_queue, document_chunk, document_embedding, ai_feedback, chat_conversation, chat_message
+    from app.models import user, document, question, module, student_answer, student_enrollment, survey_response, question_queue, document_chunk, document_embedding, embedding_cache, ai_feedback, feedback_cache, feedback_job, chat_conversation, chat_message
     print("📊 Creating database tables...")
     Base.metadata.create_all(bind=engine)
     print("✅ All tables created successfully (including student_enrollments, survey_responses, ai_feedback and chat tables)")
+
+    # 👷 Feedback job worker (disable when running dedicated `python worker.py` processes)
+    from app.core.config import FEEDBACK_EMBEDDED_WORKER
+    if FEEDBACK_EMBEDDED_WORKER:
+        from app.services.feedback_worker import start_embedded_worker
+        start_embedded_worker()
+        print("👷 Embedded feedback worker started")
+
     print("🎉 Application startup complete!")
 
+
+@app.on_event("shutdown")
+def on_shutdown():
+    from app.services.feedback_worker import stop_embedded_worker
+    from app.services.feedback_cache import flush_feedback_hits
+    from app.services.openai_client import close_pooled_clients
+    stop_embedded_worker()
+    flush_feedback_hits(force=True)
+    close_pooled_clients()
+
 # 📎 Test route
 @app.get("/")
 def read_root():
@@ -0,0 +1,66 @@
+-- Migration: Add pgvector column and ANN index to document_embeddings
+-- Date: 2026-10-17
+-- Description: Store embeddings as vector(1536) so similarity search can rank
+--              top-k inside Postgres (used when PGVECTOR_ENABLED=true)
+-- Requires: pgvector >= 0.5.0 (HNSW). On Supabase enable "vector" under Database > Extensions.
+
+-- Enable the extension
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Add the vector column next to the existing float[] column
+-- embedding_vector stays the column the app writes; this one is kept in sync by the trigger below
+ALTER TABLE document_embeddings
+ADD COLUMN IF NOT EXISTS embedding vector(1536);
+
+-- Keep embedding in sync with embedding_vector on insert/update
+-- Rows whose dimensions don't match (e.g. a different embedding model) are left NULL
+CREATE OR REPLACE FUNCTION sync_document_embedding_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF array_length(NEW.embedding_vector, 1) = 1536 THEN
+        NEW.embedding := NEW.embedding_vector::vector(1536);
+    ELSE
+        NEW.embedding := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sync_document_embedding_vector ON document_embeddings;
+CREATE TRIGGER trg_sync_document_embedding_vector
+BEFORE INSERT OR UPDATE OF embedding_vector ON document_embeddings
+FOR EACH ROW EXECUTE FUNCTION sync_document_embedding_vector();
+
+-- Backfill existing rows
+UPDATE document_embeddings
+SET embedding = embedding_vector::vector(1536)
+WHERE embedding IS NULL
+AND array_length(embedding_vector, 1) = 1536;
+
+-- Approximate nearest neighbour index for cosine distance (<=>)
+-- For pgvector < 0.5.0 use IVFFlat instead (build after the backfill):
+-- CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_ivfflat
+--     ON document_embeddings USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_hnsw
+ON document_embeddings USING hnsw (embedding vector_cosine_ops);
+
+COMMENT ON COLUMN document_embeddings.embedding IS 'pgvector copy of embedding_vector (synced by trigger) for ANN search';
+
+-- Verify the column and backfill
+SELECT
+    COUNT(*) AS total_embeddings,
+    COUNT(embedding) AS vector_embeddings,
+    COUNT(*) - COUNT(embedding) AS missing_vectors
+FROM document_embeddings;
+
+-- Verify the index
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename = 'document_embeddings'
+AND indexname = 'idx_embeddings_embedding_hnsw';
+
+-- Rollback (if needed):
+-- DROP INDEX IF EXISTS idx_embeddings_embedding_hnsw;
+-- DROP TRIGGER IF EXISTS trg_sync_document_embedding_vector ON document_embeddings;
+-- DROP FUNCTION IF EXISTS sync_document_embedding_vector();
+-- ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding;
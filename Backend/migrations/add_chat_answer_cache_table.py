@@ -0,0 +1,48 @@
+"""
+Migration script to create chat_answer_cache table.
+Run this to let modules reuse tutor answers to near-duplicate first questions
+(opt-in via chatbot_feedback.answer_cache or CHAT_ANSWER_CACHE_ENABLED).
+
+Usage:
+    python migrations/add_chat_answer_cache_table.py
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, Base
+from app.models.chat_answer_cache import ChatAnswerCache
+
+def upgrade():
+    """Create the chat_answer_cache table"""
+    print("Creating chat_answer_cache table...")
+
+    # This will create the table if it doesn't exist
+    Base.metadata.create_all(bind=engine, tables=[ChatAnswerCache.__table__])
+
+    print("✅ chat_answer_cache table created successfully!")
+    print("\nTable structure:")
+    print("  - id: UUID (primary key)")
+    print("  - module_id: UUID (FK modules, cascade delete)")
+    print("  - module_version: String(64) (documents + instructions + models fingerprint)")
+    print("  - question: Text")
+    print("  - question_embedding: Float[]")
+    print("  - answer: Text")
+    print("  - context_used: JSONB")
+    print("  - generation_ms, hit_count: Integer")
+    print("  - created_at, last_hit_at: TIMESTAMP")
+
+def downgrade():
+    """Drop the chat_answer_cache table"""
+    print("Dropping chat_answer_cache table...")
+    ChatAnswerCache.__table__.drop(engine)
+    print("✅ chat_answer_cache table dropped successfully!")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,77 @@
+"""
+Migration script to add rolling summaries to the chat_conversations table.
+
+Adds:
+- summary                  - summary of the messages no longer sent verbatim
+- summarized_message_count - how many of the oldest messages the summary covers
+- summary_updated_at       - when the summary was last refreshed
+
+IMPORTANT: This migration is SAFE for existing data!
+- Existing conversations start without a summary (count 0) and get one
+  after their next message once they are long enough
+
+Usage:
+    python migrations/add_chat_conversation_summary.py
+
+    # Rollback (if needed)
+    python migrations/add_chat_conversation_summary.py down
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import SessionLocal
+
+def upgrade():
+    """Add summary columns to chat_conversations table"""
+    print("=" * 70)
+    print("🔄 Adding summary columns to chat_conversations table...")
+    print("=" * 70)
+
+    db = SessionLocal()
+
+    try:
+        db.execute(text("""
+            ALTER TABLE chat_conversations
+            ADD COLUMN IF NOT EXISTS summary TEXT,
+            ADD COLUMN IF NOT EXISTS summarized_message_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS summary_updated_at TIMESTAMP
+        """))
+        db.commit()
+
+        print("✅ summary, summarized_message_count, summary_updated_at added")
+        print("=" * 70)
+
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+def downgrade():
+    """Drop the summary columns"""
+    print("Dropping summary columns...")
+
+    db = SessionLocal()
+    try:
+        db.execute(text("""
+            ALTER TABLE chat_conversations
+            DROP COLUMN IF EXISTS summary,
+            DROP COLUMN IF EXISTS summarized_message_count,
+            DROP COLUMN IF EXISTS summary_updated_at
+        """))
+        db.commit()
+        print("✅ summary columns dropped")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,70 @@
+"""
+Migration script to index the chat tables for the conversation list.
+
+GET /chat/conversations now loads a page of conversations with their message
+count and last message in one query (LATERAL joins) and pages by
+(updated_at, id). Adds:
+- ix_chat_conversations_student_module_updated - (student_id, module_id, updated_at, id)
+- ix_chat_messages_conversation_created        - (conversation_id, created_at)
+
+Usage:
+    python migrations/add_chat_list_indexes.py
+
+    # Rollback (if needed)
+    python migrations/add_chat_list_indexes.py down
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import SessionLocal
+
+INDEXES = {
+    "ix_chat_conversations_student_module_updated": "chat_conversations (student_id, module_id, updated_at, id)",
+    "ix_chat_messages_conversation_created": "chat_messages (conversation_id, created_at)"
+}
+
+def upgrade():
+    """Create the chat list indexes"""
+    print("=" * 70)
+    print("🔄 Adding chat list indexes...")
+    print("=" * 70)
+
+    db = SessionLocal()
+
+    try:
+        for name, columns in INDEXES.items():
+            db.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}"))
+            print(f"✅ {name} created")
+        db.commit()
+        print("=" * 70)
+
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+def downgrade():
+    """Drop the chat list indexes"""
+    print("Dropping chat list indexes...")
+
+    db = SessionLocal()
+    try:
+        for name in INDEXES:
+            db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        db.commit()
+        print("✅ chat list indexes dropped")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,44 @@
+"""
+Migration script to create embedding_cache table.
+Run this to persist query embeddings across restarts and instances.
+
+Usage:
+    python migrations/add_embedding_cache_table.py
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, Base
+from app.models.embedding_cache import EmbeddingCache
+
+def upgrade():
+    """Create the embedding_cache table"""
+    print("Creating embedding_cache table...")
+
+    # This will create the table if it doesn't exist
+    Base.metadata.create_all(bind=engine, tables=[EmbeddingCache.__table__])
+
+    print("✅ embedding_cache table created successfully!")
+    print("\nTable structure:")
+    print("  - embedding_model: String (primary key)")
+    print("  - text_hash: String(64) (primary key, sha256 of the text)")
+    print("  - embedding_vector: Float[]")
+    print("  - embedding_dimensions: Integer")
+    print("  - token_count: Integer")
+    print("  - created_at: TIMESTAMP")
+
+def downgrade():
+    """Drop the embedding_cache table"""
+    print("Dropping embedding_cache table...")
+    EmbeddingCache.__table__.drop(engine)
+    print("✅ embedding_cache table dropped successfully!")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
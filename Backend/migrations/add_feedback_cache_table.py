@@ -0,0 +1,49 @@
+"""
+Migration script to create feedback_cache table.
+Run this to let students who give the same MCQ answer share generated feedback.
+
+Usage:
+    python migrations/add_feedback_cache_table.py
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, Base
+from app.models.feedback_cache import FeedbackCache
+
+def upgrade():
+    """Create the feedback_cache table"""
+    print("Creating feedback_cache table...")
+
+    # This will create the table if it doesn't exist
+    Base.metadata.create_all(bind=engine, tables=[FeedbackCache.__table__])
+
+    print("✅ feedback_cache table created successfully!")
+    print("\nTable structure:")
+    print("  - cache_key: String(64) (primary key, sha256)")
+    print("  - module_id: UUID (foreign key to modules, cascade)")
+    print("  - question_id: UUID (foreign key to questions, cascade)")
+    print("  - kind: String (mcq, mcq_multiple)")
+    print("  - variant: String (normalized selection, e.g. 'B' or 'A,C')")
+    print("  - ai_model: String")
+    print("  - payload: JSONB (generated feedback)")
+    print("  - hit_count: Integer")
+    print("  - created_at / last_hit_at: TIMESTAMP")
+    print("\nIndexes:")
+    print("  - (question_id), (module_id) for invalidation")
+
+def downgrade():
+    """Drop the feedback_cache table"""
+    print("Dropping feedback_cache table...")
+    FeedbackCache.__table__.drop(engine)
+    print("✅ feedback_cache table dropped successfully!")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,80 @@
+"""
+Migration script to add generation_stage to the ai_feedback table.
+
+Objective questions (mcq, mcq_multiple, fill_blank) get their grade stored at
+submission time, before the narrative feedback is generated. generation_stage
+records how far a row has got:
+- 'none'   - nothing generated yet
+- 'graded' - is_correct / score / points stored, narrative pending
+- 'final'  - full feedback stored
+
+IMPORTANT: This migration is SAFE for existing data!
+- Existing rows are marked 'final'
+- Rows still waiting for feedback are marked 'none'
+
+Usage:
+    python migrations/add_feedback_generation_stage.py
+
+    # Rollback (if needed)
+    python migrations/add_feedback_generation_stage.py down
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import SessionLocal
+
+def upgrade():
+    """Add generation_stage column to ai_feedback table"""
+    print("=" * 70)
+    print("🔄 Adding generation_stage to ai_feedback table...")
+    print("=" * 70)
+
+    db = SessionLocal()
+
+    try:
+        db.execute(text("""
+            ALTER TABLE ai_feedback
+            ADD COLUMN IF NOT EXISTS generation_stage VARCHAR(20) NOT NULL DEFAULT 'final'
+        """))
+
+        result = db.execute(text("""
+            UPDATE ai_feedback
+            SET generation_stage = 'none'
+            WHERE generation_status <> 'completed'
+            AND feedback_data IS NULL
+        """))
+        db.commit()
+
+        print("✅ generation_stage column added")
+        print(f"📊 {result.rowcount} unfinished feedback rows marked 'none', the rest 'final'")
+        print("=" * 70)
+
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+def downgrade():
+    """Drop the generation_stage column"""
+    print("Dropping generation_stage column...")
+
+    db = SessionLocal()
+    try:
+        db.execute(text("ALTER TABLE ai_feedback DROP COLUMN IF EXISTS generation_stage"))
+        db.commit()
+        print("✅ generation_stage column dropped")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,54 @@
+"""
+Migration script to create feedback_jobs table.
+Run this to move feedback generation onto the durable job queue
+(drained by `python worker.py` or the worker embedded in the API).
+
+Usage:
+    python migrations/add_feedback_jobs_table.py
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, Base
+from app.models.feedback_job import FeedbackJob
+
+def upgrade():
+    """Create the feedback_jobs table"""
+    print("Creating feedback_jobs table...")
+
+    # This will create the table if it doesn't exist
+    Base.metadata.create_all(bind=engine, tables=[FeedbackJob.__table__])
+
+    print("✅ feedback_jobs table created successfully!")
+    print("\nTable structure:")
+    print("  - id: UUID (primary key)")
+    print("  - job_type: String (answer_feedback)")
+    print("  - answer_id: UUID (foreign key to student_answers, cascade)")
+    print("  - student_id / module_id / attempt: the test attempt the job belongs to")
+    print("  - priority: Integer (lower runs first)")
+    print("  - status: String (queued, running, completed, failed)")
+    print("  - attempts / max_attempts: Integer (retries with exponential backoff)")
+    print("  - run_after: TIMESTAMPTZ (earliest time the job may run)")
+    print("  - locked_by / locked_until / heartbeat_at: worker lease")
+    print("  - last_error: Text, payload: JSONB")
+    print("  - created_at / started_at / finished_at: TIMESTAMPTZ")
+    print("\nIndexes:")
+    print("  - (status, priority, run_after) for claiming")
+    print("  - (student_id, module_id, attempt)")
+    print("  - unique (answer_id, job_type) WHERE status IN ('queued', 'running')")
+
+def downgrade():
+    """Drop the feedback_jobs table"""
+    print("Dropping feedback_jobs table...")
+    FeedbackJob.__table__.drop(engine)
+    print("✅ feedback_jobs table dropped successfully!")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,67 @@
+"""
+Migration script to record prompt sizes on generated feedback and tutor replies.
+
+Adds:
+- ai_feedback.prompt_tokens   - prompt size of the feedback call
+- chat_messages.prompt_tokens - prompt size of the call behind an assistant message
+
+Both are nullable; existing rows are left NULL.
+
+Usage:
+    python migrations/add_prompt_token_columns.py
+
+    # Rollback (if needed)
+    python migrations/add_prompt_token_columns.py down
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import SessionLocal
+
+TABLES = ("ai_feedback", "chat_messages")
+
+def upgrade():
+    """Add prompt_tokens columns"""
+    print("=" * 70)
+    print("🔄 Adding prompt_tokens to ai_feedback and chat_messages...")
+    print("=" * 70)
+
+    db = SessionLocal()
+
+    try:
+        for table in TABLES:
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER"))
+            print(f"✅ {table}.prompt_tokens added")
+        db.commit()
+        print("=" * 70)
+
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+def downgrade():
+    """Drop the prompt_tokens columns"""
+    print("Dropping prompt_tokens columns...")
+
+    db = SessionLocal()
+    try:
+        for table in TABLES:
+            db.execute(text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS prompt_tokens"))
+        db.commit()
+        print("✅ prompt_tokens columns dropped")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade()
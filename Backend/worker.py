@@ -0,0 +1,42 @@
+"""
+Standalone feedback worker
+Drains the feedback_jobs queue so feedback throughput scales with the number of
+worker processes instead of the API instances that accepted the submissions.
+
+Usage:
+    python worker.py
+
+Set FEEDBACK_EMBEDDED_WORKER=false on the API service when running dedicated workers.
+"""
+import logging
+import signal
+
+from app.core.config import validate_required_env_vars
+from app.services.feedback_worker import FeedbackWorker
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("feedback_worker")
+
+
+def main():
+    validate_required_env_vars()
+
+    # Make sure the table exists before the first claim
+    from app.database import engine
+    from app.models.feedback_job import FeedbackJob
+    FeedbackJob.__table__.create(bind=engine, checkfirst=True)
+
+    worker = FeedbackWorker()
+
+    def handle_signal(signum, frame):
+        logger.info(f"🛑 Received signal {signum}, finishing running jobs...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()